@@ -6,16 +6,26 @@ new Env('AnyRouter签到')
 """
 
 import os
-import time
 import random
-from datetime import datetime
+from typing import Optional
 import warnings
 warnings.filterwarnings("ignore")
 
 import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 
+import ql_accounts
+import ql_cache
+import ql_capture
+import ql_clock
+import ql_log
+import ql_net
+import ql_parse
+import ql_profile
+import ql_proxy
+import ql_result
+import ql_session
+
 # ---------------- 通知模块动态加载 ----------------
 hadsend = False
 send = None
@@ -29,11 +39,30 @@ except ImportError:
 # ---------------- 配置项 ----------------
 ANYROUTER_COOKIE = os.environ.get('ANYROUTER_COOKIE')
 ANYROUTER_NEW_API_USER = os.environ.get('ANYROUTER_NEW_API_USER')
+# 所有账号共享一个 keep-alive 连接池（Cookie 与 new-api-user 仍按账号隔离），设为 false 则每个账号独立建连
+ANYROUTER_SHARED_POOL = os.environ.get('ANYROUTER_SHARED_POOL', 'true').lower() != 'false'
+BASE_URL = os.environ.get('ANYROUTER_BASE', 'https://anyrouter.top').rstrip('/')
+# 账号很多时改用 JSON Lines 账号文件，每行 {"cookie": "...", "new_api_user": "..."} 或一行 Cookie
+ANYROUTER_ACCOUNTS_FILE = os.environ.get('ANYROUTER_ACCOUNTS_FILE')
+
+def new_api_user_for(index: int) -> Optional[str]:
+    """ANYROUTER_NEW_API_USER 可用 & 分隔并与 Cookie 一一对应；只填一个时所有账号共用"""
+    users = [u.strip() for u in (ANYROUTER_NEW_API_USER or '').split('&') if u.strip()]
+    if len(users) <= 1:
+        return users[0] if users else None
+    return users[index - 1] if index <= len(users) else None
+
+def parse_console(content: bytes, encoding: str) -> tuple[list[str], list[str]]:
+    """从控制台页面取前两个标题与内容；只依赖正文与编码，可在解析进程中执行"""
+    root = ql_parse.html_bytes(content, encoding)
+    return (ql_parse.class_texts(root, 'text-xs text-gray-500', 2),
+            ql_parse.class_texts(root, 'text-lg font-semibold', 2))
 
 class AnyRouterSigner:
     """AnyRouter 自动签到与信息提取工具"""
 
-    def __init__(self, cookie: str = "", index: int = 1) -> None:
+    def __init__(self, cookie: str = "", index: int = 1, session: Optional[requests.Session] = None,
+                 new_api_user: Optional[str] = None) -> None:
         self.cookie = cookie
         self.index = index
 
@@ -42,8 +71,8 @@ class AnyRouterSigner:
             'accept': 'application/json, text/plain, */*',
             'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'cache-control': 'no-store',
-            'origin': 'https://anyrouter.top',
-            'referer': 'https://anyrouter.top/console',
+            'origin': BASE_URL,
+            'referer': f'{BASE_URL}/console',
             'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Microsoft Edge";v="140"',
             'sec-ch-ua-mobile': '?0',
             'sec-ch-ua-platform': '"Windows"',
@@ -53,14 +82,23 @@ class AnyRouterSigner:
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0',
         }
 
-        self.session = requests.Session()
+        # 可传入已预热的会话，首个请求直接复用热连接；配置了代理池时走该账号固定的代理，开启抓包时记入该账号的缓冲
+        self.session = ql_capture.attach(
+            ql_proxy.bind(session or ql_session.configure(requests.Session()), cookie), 'anyrouter', cookie)
         self.session.headers.update(self.common_headers)
         # 可选 new-api-user 头
-        if ANYROUTER_NEW_API_USER:
-            self.session.headers['new-api-user'] = ANYROUTER_NEW_API_USER
+        new_api_user = new_api_user or new_api_user_for(index)
+        if new_api_user:
+            self.session.headers['new-api-user'] = new_api_user
+        # Cookie 串只解析一次
+        self._cookies = self._parse_cookie()
 
     def _cookie_dict(self) -> dict:
-        """将环境变量中的 Cookie 串解析为 dict 传给 requests.cookies"""
+        """返回解析好的 Cookie dict 传给 requests.cookies"""
+        return self._cookies
+
+    def _parse_cookie(self) -> dict:
+        """将环境变量中的 Cookie 串解析为 dict"""
         cookie_dict: dict[str, str] = {}
         if not self.cookie:
             return cookie_dict
@@ -75,38 +113,69 @@ class AnyRouterSigner:
     def _post_signin(self) -> tuple[bool, str]:
         """调用签到接口，返回(success, message)"""
         try:
-            url = 'https://anyrouter.top/api/user/sign_in'
-            resp = self.session.post(url, timeout=30, verify=False, cookies=self._cookie_dict())
+            url = f'{BASE_URL}/api/user/sign_in'
+            resp = ql_net.request(self.session, 'POST', url, timeout=30, verify=False, cookies=self._cookie_dict())
             if resp.status_code != 200:
                 return False, f"HTTP {resp.status_code}"
-            data = resp.json() if resp.content else {}
+            data = ql_parse.loads(resp) if resp.content else {}
             message = str(data.get('message', ''))
             success = bool(data.get('success', False))
             return success, message
+        except ql_net.DeferredError:
+            raise
         except Exception as e:
             return False, f"签到请求异常: {e}"
 
+    def check_session(self) -> tuple[Optional[bool], str]:
+        """预检：请求最轻的用户信息接口，确认 Cookie 是否仍然有效；返回 (是否有效, 原因)，无法判定时为 None"""
+        if not self.cookie.strip():
+            return False, "Cookie为空"
+        url = f'{BASE_URL}/api/user/self'
+        resp = ql_net.request(self.session, 'GET', url, timeout=15, verify=False, cookies=self._cookie_dict())
+        if resp.status_code == 401:
+            return False, "Cookie已失效（HTTP 401）"
+        if resp.status_code != 200:
+            return None, f"HTTP {resp.status_code}"
+        try:
+            data = ql_parse.loads(resp)
+        except ValueError:
+            return None, "响应不是 JSON"
+        if data.get('success') is False:
+            return False, f"Cookie已失效: {data.get('message') or '未登录'}"
+        return True, ""
+
     def _fetch_console_top2(self) -> tuple[list[str], list[str]]:
         """抓取控制台页面的前两个标题与内容"""
         titles: list[str] = []
         contents: list[str] = []
         try:
-            url = 'https://anyrouter.top/console'
-            resp = self.session.get(url, timeout=30, cookies=self._cookie_dict())
+            url = f'{BASE_URL}/console'
+            # 只读页面走条件请求缓存，按账号 Cookie 隔离
+            resp = ql_cache.get(self.session, url, account=self.cookie, timeout=30, cookies=self._cookie_dict(),
+                                 hedge=True)
             if resp.status_code != 200:
                 return titles, contents
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            title_divs = soup.select('div.text-xs.text-gray-500')
-            content_divs = soup.select('div.text-lg.font-semibold')
-            titles = [d.get_text(strip=True) for d in title_divs[:2]]
-            contents = [d.get_text(strip=True) for d in content_divs[:2]]
-            return titles, contents
+            # lxml 直接解析响应字节，不做字符集探测也不复制出整页字符串；开启 QL_PARSE_WORKERS 时在解析进程中进行
+            return ql_parse.offload(parse_console, resp.content, ql_parse.encoding_of(resp))
         except Exception:
             return titles, contents
 
-    def main(self) -> tuple[str, bool]:
+    def close(self) -> None:
+        """关闭会话；共享连接池里的连接不会断开，由 SharedPool.close() 统一释放，常驻进程保留的会话也不关闭"""
+        ql_session.release(self.session)
+
+    def __enter__(self) -> "AnyRouterSigner":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def main(self) -> ql_result.Result:
         """主执行函数"""
-        logger.info(f"==== AnyRouter账号{self.index} 开始签到 ====")
+        ql_log.verbose("==== AnyRouter账号{} 开始签到 ====", self.index)
+        account = f"账号{self.index}"
+        started = ql_clock.monotonic()
+        retries = ql_net.retries()
         
         if not self.cookie.strip():
             error_msg = """账号配置错误
@@ -118,7 +187,7 @@ class AnyRouterSigner:
 2. 确保Cookie格式正确"""
             
             logger.error(error_msg)
-            return error_msg, False
+            return ql_result.Result("AnyRouter", account, ql_result.INVALID, detail=error_msg)
 
         try:
             ok, msg = self._post_signin()
@@ -131,20 +200,21 @@ class AnyRouterSigner:
             for i in range(n):
                 info_messages.append(f'{titles[i]}：{contents[i]}')
 
-            # 组合结果消息
-            final_msg = f"""AnyRouter签到结果
-
-📝 签到: {sign_message}
-📊 信息: {" | ".join(info_messages) if info_messages else "无"}
-⏰ 时间: {datetime.now().strftime('%m-%d %H:%M')}"""
-            
+            # 结果消息在发送通知时才生成
             logger.info(f"{'任务完成' if ok else '任务失败'}")
-            return final_msg, ok
+            return ql_result.Result(
+                "AnyRouter", account, ql_result.SUCCESS if ok else ql_result.FAILED,
+                latency=ql_clock.monotonic() - started, attempts=1 + ql_net.retries() - retries, detail=sign_message,
+                fields=(("📝 签到", sign_message), ("📊 信息", " | ".join(info_messages) if info_messages else "无")),
+            )
             
+        except ql_net.DeferredError:
+            raise
         except Exception as e:
             error_msg = f"AnyRouter任务异常: {e}"
             logger.error(error_msg)
-            return error_msg, False
+            return ql_result.Result("AnyRouter", account, ql_result.FAILED, latency=ql_clock.monotonic() - started,
+                                    attempts=1 + ql_net.retries() - retries, detail=error_msg)
 
 def format_time_remaining(seconds):
     """格式化时间显示"""
@@ -169,100 +239,154 @@ def wait_with_countdown(delay_seconds, task_name):
         
     logger.info(f"{task_name} 需要等待 {format_time_remaining(delay_seconds)}")
     
-    time.sleep(delay_seconds)
+    ql_clock.sleep(delay_seconds, "启动延迟")
 
 def notify_user(title, content):
-    """统一通知函数"""
+    """统一通知函数；content 可以是返回正文的函数，只在确实要输出时才生成"""
     if hadsend:
         try:
-            send(title, content)
+            send(title, ql_result.text(content))
             logger.info(f"通知发送完成: {title}")
         except Exception as e:
             logger.error(f"通知发送失败: {e}")
     else:
-        logger.info(f"{title}\n{content}")
+        logger.opt(lazy=True).info("{}\n{}", lambda: title, lambda: ql_result.text(content))
 
 def main():
     """主程序入口"""
-    logger.info(f"==== AnyRouter签到开始 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    logger.info(f"==== AnyRouter签到开始 - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
     
+    # 利用随机延迟的空档预热：解析域名、完成两个连接池的握手、加载解析器（常驻进程里连接池跨运行保留）；
+    # 配置了代理池时请求都走账号分配到的代理，这时还不知道账号，直连预热用不上，只加载解析器
+    pool = ql_session.lease('anyrouter.pool', ql_session.SharedPool) if ANYROUTER_SHARED_POOL else None
+    warm_session = ql_session.lease('anyrouter.warm',
+                                    pool.session if pool else lambda: ql_session.configure(requests.Session()))
+    targets = [(f'{BASE_URL}/api/user/sign_in', False), f'{BASE_URL}/console'] if ql_proxy.get_pool() is None else []
+    warm = ql_session.prewarm(warm_session, targets, modules=('lxml.html',))
+
     # 随机延迟（整体延迟）
     delay_seconds = random.randint(1, 5)  # 固定1-10秒随机延迟
     if delay_seconds > 0:
         logger.info(f"随机延迟: {format_time_remaining(delay_seconds)}")
         wait_with_countdown(delay_seconds, "AnyRouter签到")
+    warm.wait()
     
-    # 获取Cookie配置
+    # 获取Cookie配置（账号文件按需逐行读取）
     cookies = ANYROUTER_COOKIE.split('&') if ANYROUTER_COOKIE else []
-    cookies = [c.strip() for c in cookies if c.strip()]
+    accounts = ql_accounts.source(ANYROUTER_ACCOUNTS_FILE, 'cookie', (c.strip() for c in cookies if c.strip()))
     
-    if not cookies:
+    if not len(accounts):
         error_msg = """未找到ANYROUTER_COOKIE环境变量
         
 🔧 配置方法:
-1. ANYROUTER_COOKIE: Cookie值"""
+1. ANYROUTER_COOKIE: Cookie值
+2. 或 ANYROUTER_ACCOUNTS_FILE: JSON Lines 账号文件路径"""
         
         logger.error(error_msg)
         notify_user("AnyRouter签到失败", error_msg)
         return
     
-    logger.info(f"共发现 {len(cookies)} 个账号")
+    logger.info(f"共发现 {len(accounts)} 个账号（来源: {accounts.describe()}）")
     
-    success_count = 0
-    total_count = len(cookies)
-    results = []
+    total_count = len(accounts)
+    # 逐个累计计数；账号不超过 5 个时汇总里列出每个账号的结果
+    summary = ql_result.Summary("AnyRouter", keep=5 if total_count <= 5 else 0)
+    host = ql_net.host_of(BASE_URL)
+    limiter = ql_net.get_limiter(host, initial=2, floor=0.5, ceiling=30)
+
+    history = ql_accounts.History("AnyRouter")
+
+    # 并发预检全部 Cookie，失效的账号直接报告，不再占用签到阶段的账号间等待
+    def check(index, account):
+        with AnyRouterSigner(account.get('cookie', ''), index + 1, session=pool.session() if pool else None,
+                             new_api_user=account.get('new_api_user')) as signer:
+            ok, reason = signer.check_session()
+        return ok, reason, None
+
+    checked = ql_accounts.preflight(accounts, check, "AnyRouter", limiter)
+    for index, account, reason in checked.invalid:
+        result = summary.add(ql_result.Result("AnyRouter", f"账号{index + 1}", ql_result.INVALID, detail=reason))
+        logger.error(f"账号{index + 1}: {reason}")
+        notify_user(f"AnyRouter账号{index + 1}签到失败", result.render)
+        ql_capture.flush(account.get('cookie', ''))
+        history.record(account.get('cookie', ''), result)
+    # 按历史耗时与失败情况安排顺序，上次失效的账号排在最后
+    checked = ql_accounts.order(checked, history, 'cookie', interval=limiter.interval)
     
-    for index, cookie in enumerate(cookies):
+    for index, account in checked:
+        ql_clock.begin(f"账号{index + 1}")
+        ql_log.begin("AnyRouter")
+        # 站点熔断或剩余运行时间不足时，剩余账号直接延后，不再逐个等待超时
+        reason = ql_net.defer_reason(host)
+        if reason:
+            logger.warning(f"账号{index + 1}: {reason}，延后到下次运行")
+            summary.add(ql_result.Result("AnyRouter", f"账号{index + 1}", ql_result.DEFERRED, detail=reason))
+            continue
+
         try:
-            # 账号间随机等待
-            if index > 0:
-                delay = random.uniform(1, 3)
+            # 账号间自适应等待
+            if index != checked.start:
+                delay = limiter.next_delay()
                 logger.info(f"随机等待 {delay:.1f} 秒后处理下一个账号...")
-                time.sleep(delay)
+                ql_clock.sleep(delay, "账号间等待")
             
             # 执行签到
-            signer = AnyRouterSigner(cookie, index + 1)
-            result_msg, is_success = signer.main()
-            
-            if is_success:
-                success_count += 1
-            
-            results.append({
-                'index': index + 1,
-                'success': is_success,
-                'message': result_msg
-            })
+            if pool:
+                session = pool.session()
+            else:
+                session = warm_session if index == checked.start else None
+            with AnyRouterSigner(account.get('cookie', ''), index + 1, session=session,
+                                 new_api_user=account.get('new_api_user')) as signer:
+                result = summary.add(signer.main())
+            history.record(account.get('cookie', ''), result)
             
             # 发送单个账号通知
-            status = "成功" if is_success else "失败"
+            status = "成功" if result.ok else "失败"
             title = f"AnyRouter账号{index + 1}签到{status}"
-            notify_user(title, result_msg)
+            notify_user(title, result.render)
+            if not result.ok:
+                ql_capture.flush(account.get('cookie', ''))
             
+        except ql_net.DeferredError as e:
+            logger.warning(f"账号{index + 1}: {e}，延后到下次运行")
+            summary.add(ql_result.Result("AnyRouter", f"账号{index + 1}", ql_result.DEFERRED, detail=str(e)))
         except Exception as e:
             error_msg = f"账号{index + 1}: 执行异常 - {str(e)}"
             logger.error(error_msg)
+            summary.add(ql_result.Result("AnyRouter", f"账号{index + 1}", ql_result.FAILED, detail=error_msg))
             notify_user(f"AnyRouter账号{index + 1}签到失败", error_msg)
     
     # 发送汇总通知
     if total_count > 1:
-        summary_msg = f"""AnyRouter签到汇总
+        def summary_msg() -> str:
+            # 账号文件中无法解析的行没有结果记录，按失败计
+            msg = f"""AnyRouter签到汇总
 
 📈 总计: {total_count}个账号
-✅ 成功: {success_count}个
-❌ 失败: {total_count - success_count}个
-📊 成功率: {success_count/total_count*100:.1f}%
-⏰ 完成时间: {datetime.now().strftime('%m-%d %H:%M')}"""
-        
-        # 添加详细结果（最多显示5个账号的详情）
-        if len(results) <= 5:
-            summary_msg += "\n\n详细结果:"
-            for result in results:
-                status_icon = "✅" if result['success'] else "❌"
-                summary_msg += f"\n{status_icon} 账号{result['index']}"
+✅ 成功: {summary.ok}个
+❌ 失败: {total_count - summary.ok - summary.deferred}个
+⏸️ 延后: {summary.deferred}个
+📊 成功率: {summary.ok/total_count*100:.1f}%
+⏰ 完成时间: {ql_clock.now().strftime('%m-%d %H:%M')}"""
+            
+            # 添加详细结果（最多显示5个账号的详情）
+            if summary.details:
+                msg += "\n\n详细结果:"
+                for result in summary.details:
+                    msg += f"\n{result.line()}"
+            return msg
         
         notify_user("AnyRouter签到汇总", summary_msg)
     
-    logger.info(f"==== AnyRouter签到完成 - 成功{success_count}/{total_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    accounts.close()
+    history.save()
+    ql_session.release(warm_session)
+    if pool:
+        pool.report("AnyRouter")
+        ql_session.release(pool)
+    summary.log()
+    logger.info(f"==== AnyRouter签到完成 - 成功{summary.ok}/{total_count} - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ql_log.setup()
+    ql_profile.run("anyrouter", main)
\ No newline at end of file
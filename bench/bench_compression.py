@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+压缩协商基准：在替身服务器上对比 identity / gzip / 自动协商（zstd、br）
+
+对 AnyRouter（签到 + 控制台）与 leaflow（首页 + 签到）流程各跑若干账号，
+输出每种模式下的传输字节数和每账号耗时。
+
+用法: python bench/bench_compression.py [--accounts 20] [--bandwidth 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import StandIn
+
+MODES = ("identity", "gzip", "")  # 空字符串表示按本机解码器自动协商
+
+
+def run_anyrouter(anyrouter, ql_session, accounts: int) -> None:
+    pool = ql_session.SharedPool()
+    for i in range(accounts):
+        signer = anyrouter.AnyRouterSigner(f"session=bench{i}", i + 1, session=pool.session())
+        assert signer.main().ok
+    pool.close()
+
+
+def run_leaflow(leaflow, accounts: int) -> None:
+    for i in range(accounts):
+        status, _, _ = leaflow.sign_once_impl(f"session=bench{i}")
+        assert status == "success", status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--bandwidth", type=float, default=1_000_000, help="模拟链路带宽（字节/秒），0 不限")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with StandIn(bandwidth=args.bandwidth) as server:
+        os.environ["ANYROUTER_BASE"] = server.base
+        os.environ["LEAFFLOW_BASE"] = server.base
+        import anyrouter
+        import leaflow
+        import ql_cache
+        import ql_session
+
+        ql_cache.HTTP_CACHE = False  # 304 会掩盖压缩差异
+
+        print(f"{'站点':<10}{'模式':<32}{'传输字节':>12}{'每账号字节':>12}{'每账号耗时(ms)':>16}")
+        for site in ("anyrouter", "leaflow"):
+            for mode in MODES:
+                ql_session.ACCEPT_ENCODING = mode
+                label = mode or f"auto({ql_session.accept_encoding()})"
+                server.stats.reset()
+                started = time.perf_counter()
+                if site == "anyrouter":
+                    run_anyrouter(anyrouter, ql_session, args.accounts)
+                else:
+                    run_leaflow(leaflow, args.accounts)
+                elapsed = time.perf_counter() - started
+                sent = server.stats.bytes_sent
+                print(f"{site:<10}{label:<32}{sent:>12}{sent // args.accounts:>12}"
+                      f"{elapsed / args.accounts * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+对冲基准：替身服务器的只读接口带长尾延迟，对比关闭/开启请求对冲时的耗时分布
+
+每个 GET 以 --tail 的概率额外停顿 --tail-delay 秒，其余请求约 --latency 秒返回。
+依次用同一会话串行请求 /user/csrf（对应雨云的 get_csrf_token），输出 p50/p95/p99/最大耗时、
+服务器实际收到的请求数，以及补发与胜出次数。
+
+用法: python bench/bench_hedge.py [--requests 500] [--tail 0.02] [--tail-delay 1.0] [--latency 0.02]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import Handler, StandIn
+
+
+class TailHandler(Handler):
+    """GET 请求按概率出现长尾"""
+
+    def do_GET(self) -> None:
+        delay = self.server.tail_delay if random.random() < self.server.tail else self.server.base_latency
+        time.sleep(delay)
+        super().do_GET()
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, int(len(ordered) * q / 100 + 0.5) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--tail", type=float, default=0.02, help="长尾请求占比")
+    parser.add_argument("--tail-delay", type=float, default=1.0, help="长尾请求的额外停顿（秒）")
+    parser.add_argument("--latency", type=float, default=0.02, help="普通请求的停顿（秒）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    os.environ["QL_STATE_DIR"] = tempfile.mkdtemp(prefix="ql-hedge-")
+    os.environ["QL_RUN_BUDGET"] = "0"
+
+    import requests
+
+    import ql_net
+
+    print(f"{'对冲':<6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'服务器请求':>12}{'补发':>8}{'胜出':>8}")
+    for enabled in (False, True):
+        random.seed(42)
+        ql_net.HEDGE = enabled
+        ql_net._windows.clear()
+        before = ql_net.hedge_stats()
+        with StandIn(handler=TailHandler) as server, requests.Session() as session:
+            server.server.tail = args.tail
+            server.server.tail_delay = args.tail_delay
+            server.server.base_latency = args.latency
+            samples = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                resp = ql_net.request(session, "GET", f"{server.base}/user/csrf", timeout=10, hedge=True)
+                samples.append(time.perf_counter() - started)
+                assert resp.status_code == 200
+            served = server.stats.requests
+        after = ql_net.hedge_stats()
+        print(f"{'开启' if enabled else '关闭':<6}"
+              + "".join(f"{percentile(samples, q) * 1000:>10.0f}" for q in (50, 95, 99))
+              + f"{max(samples) * 1000:>10.0f}{served:>12}"
+              + f"{after['sent'] - before['sent']:>8}{after['won'] - before['won']:>8}")
+
+
+if __name__ == "__main__":
+    main()
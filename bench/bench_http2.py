@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP/2 基准：多个雨云 API 密钥并发签到时，对比 HTTP/1.1 连接池与 HTTP/2 多路复用的连接数和耗时
+
+每个账号依次请求 /user/csrf、/user、GET /user/reward/tasks、POST /user/reward/tasks、/user（与 rainyun.py 相同），
+--concurrency 个账号同时进行，服务器对每个请求停顿 --latency 秒。三种方式：
+- HTTP/1.1：requests 连接池（每个主机最多 --concurrency 个连接），对 HTTPS 替身服务器；
+- HTTP/2：ql_session.mount_http2 挂载的 httpx 传输，对 asyncio + h2 实现的 HTTP/2 替身服务器；
+- 回退：同样挂载 HTTP/2 传输，但对只支持 HTTP/1.1 的 HTTPS 替身服务器（ALPN 协商为 http/1.1），
+  首批请求经 httpx 完成，之后改走与 HTTP/1.1 方式相同上限的 requests 连接池。
+输出总耗时、请求耗时 p50/p99、服务器收到的请求数与连接数，以及经 HTTP/2 完成的请求数。
+
+需要 httpx[http2] 和 openssl 命令行（生成自签名证书）。
+用法: python bench/bench_http2.py [--accounts 200] [--concurrency 32] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import StandIn
+
+ROUTES = {
+    ("GET", "/user/csrf"): {"code": 200, "data": "csrf-token"},
+    ("GET", "/user"): {"code": 200, "data": {"Points": 4200}},
+    ("GET", "/user/reward/tasks"): {"code": 200, "data": [{"Name": "每日签到", "Status": 1}]},
+    ("POST", "/user/reward/tasks"): {"code": 0, "msg": "ok"},
+}
+
+ACCOUNT_STEPS = [("GET", "/user/csrf"), ("GET", "/user"), ("GET", "/user/reward/tasks"),
+                 ("POST", "/user/reward/tasks"), ("GET", "/user")]
+
+
+class H2StandIn:
+    """只讲 HTTP/2 的 HTTPS 替身服务器（asyncio + h2），每个流独立停顿后应答，同一连接上的请求互不阻塞"""
+
+    def __init__(self, certfile: str, keyfile: str, latency: float) -> None:
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.writers: set = set()
+        self.tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.tls.load_cert_chain(certfile, keyfile)
+        self.tls.set_alpn_protocols(["h2"])
+        self.loop = asyncio.new_event_loop()
+        self.port = 0
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"https://127.0.0.1:{self.port}"
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._client, "127.0.0.1", 0, ssl=self.tls))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _stop(self) -> None:
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.wait(tasks, timeout=1) if tasks else None
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        self.connections += 1
+        self.writers.add(writer)
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        streams: dict[int, dict] = {}
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        streams[event.stream_id] = dict(event.headers)
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        headers = streams.pop(event.stream_id, {})
+                        asyncio.ensure_future(self._respond(conn, writer, event.stream_id, headers))
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(conn.data_to_send())
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, conn, writer: asyncio.StreamWriter, stream_id: int, headers: dict) -> None:
+        await asyncio.sleep(self.latency)
+        body = ROUTES.get((headers.get(":method"), headers.get(":path", "").split("?")[0]))
+        payload = json.dumps(body if body is not None else {"message": "not found"}, ensure_ascii=False).encode()
+        self.requests += 1
+        conn.send_headers(stream_id, [(":status", "200" if body is not None else "404"),
+                                      ("content-type", "application/json; charset=utf-8"),
+                                      ("content-length", str(len(payload)))])
+        conn.send_data(stream_id, payload, end_stream=True)
+        writer.write(conn.data_to_send())
+
+    def __enter__(self) -> "H2StandIn":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def make_cert(directory: str) -> tuple[str, str]:
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", keyfile, "-out", certfile, "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost"],
+                   check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, int(len(ordered) * q / 100 + 0.5) - 1)]
+
+
+def run(session, base: str, certfile: str, accounts: int, concurrency: int) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def account(_) -> None:
+        for method, path in ACCOUNT_STEPS:
+            started = time.perf_counter()
+            resp = session.request(method, f"{base}{path}", json={} if method == "POST" else None,
+                                   verify=certfile, timeout=30)
+            assert resp.status_code == 200 and resp.json()["code"] in (0, 200), resp.text
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(account, range(accounts)))
+    return time.perf_counter() - started, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器每个请求的停顿（秒）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    os.environ["QL_STATE_DIR"] = tempfile.mkdtemp(prefix="ql-http2-")
+
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    import ql_session
+
+    if not ql_session.http2_available():
+        sys.exit("需要先安装 httpx[http2]")
+    certfile, keyfile = make_cert(tempfile.mkdtemp(prefix="ql-http2-cert-"))
+    tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    tls.load_cert_chain(certfile, keyfile)
+
+    print(f"{'传输':<10}{'耗时(s)':>9}{'p50(ms)':>10}{'p99(ms)':>10}{'请求数':>8}{'连接数':>8}{'HTTP/2':>8}")
+    for name in ("HTTP/1.1", "HTTP/2", "回退"):
+        session = requests.Session()
+        if name == "HTTP/1.1":
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=args.concurrency))
+        else:
+            ql_session.mount_http2(session, args.concurrency)
+        adapter = session.get_adapter("https://")
+        server = H2StandIn(certfile, keyfile, args.latency) if name == "HTTP/2" else StandIn(args.latency, tls=tls)
+        with server:
+            elapsed, latencies = run(session, server.base, certfile, args.accounts, args.concurrency)
+            stats = server if name == "HTTP/2" else server.stats
+            http2 = getattr(adapter, "http2", 0)
+            session.close()
+        print(f"{name:<10}{elapsed:>9.2f}{percentile(latencies, 50) * 1000:>10.1f}"
+              f"{percentile(latencies, 99) * 1000:>10.1f}{stats.requests:>8}{stats.connections:>8}{http2:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+解析卸载基准：asyncio 并发处理大量账号时，对比在事件循环线程里直接解析与交给 ql_parse 解析进程池的事件循环延迟
+
+每个账号依次取 AnyRouter 控制台、leaflow 首页并提交签到表单（请求在 I/O 线程池中执行），
+再解析这三个响应：parse_console（lxml）、inspect_home 与 parse_page（正则）。
+同时有一个协程每 --tick 毫秒醒来一次，记录实际醒来时间比预期晚了多少（事件循环延迟）。
+输出两种方式的总耗时、吞吐、延迟 p50/p99/最大值，以及卸载时的解析任务数与批次数。
+
+用法: python bench/bench_offload.py [--accounts 300] [--concurrency 32] [--workers 2] [--tick 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import StandIn
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, int(len(ordered) * q / 100 + 0.5) - 1)]
+
+
+async def run(base: str, accounts: int, concurrency: int, offload: bool, tick: float) -> tuple[float, list[float]]:
+    import requests
+
+    import anyrouter
+    import leaflow
+    import ql_parse
+
+    local = threading.local()
+
+    def fetch(method: str, path: str):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        resp = session.request(method, f"{base}{path}", timeout=30)
+        return resp.content, ql_parse.encoding_of(resp)
+
+    loop = asyncio.get_running_loop()
+    io_pool = ThreadPoolExecutor(max_workers=concurrency)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def parse(fn, content: bytes, encoding: str):
+        if offload:
+            return await asyncio.wrap_future(ql_parse.submit(fn, content, encoding))
+        return fn(content, encoding)
+
+    async def account() -> None:
+        async with gate:
+            console = await loop.run_in_executor(io_pool, fetch, "GET", "/console")
+            home = await loop.run_in_executor(io_pool, fetch, "GET", "/")
+            page = await loop.run_in_executor(io_pool, fetch, "POST", "/index.php")
+            titles, contents = await parse(anyrouter.parse_console, *console)
+            logged_out, csrf = await parse(leaflow.inspect_home, *home)
+            status, _, amount = await parse(leaflow.parse_page, *page)
+            assert len(titles) == 2 and not logged_out and csrf and status == "success" and amount == 0.5
+
+    lags: list[float] = []
+    running = True
+
+    async def ticker() -> None:
+        while running:
+            expected = time.perf_counter() + tick
+            await asyncio.sleep(tick)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    probe = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(account() for _ in range(accounts)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await probe
+    io_pool.shutdown()
+    return elapsed, lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="解析进程数")
+    parser.add_argument("--tick", type=float, default=5, help="测量事件循环延迟的间隔（毫秒）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    os.environ["QL_STATE_DIR"] = tempfile.mkdtemp(prefix="ql-offload-")
+
+    import anyrouter
+    import ql_parse
+
+    print(f"{'解析方式':<8}{'耗时(s)':>10}{'账号/秒':>10}{'延迟p50(ms)':>13}{'延迟p99(ms)':>13}{'最大(ms)':>10}{'任务/批次':>12}")
+    with StandIn() as server:
+        for offload in (False, True):
+            ql_parse.PARSE_WORKERS = args.workers if offload else 0
+            if offload:
+                # 先启动解析进程并完成导入，不把进程启动时间计入对比
+                pool = ql_parse.executor()
+                warm = [pool.submit(anyrouter.parse_console, (b"<html></html>", "utf-8")) for _ in range(args.workers)]
+                for future in warm:
+                    future.result()
+                pool.jobs = pool.batches = 0
+            elapsed, lags = asyncio.run(run(server.base, args.accounts, args.concurrency, offload, args.tick / 1000))
+            batches = f"{pool.jobs}/{pool.batches}" if offload else "-"
+            print(f"{'进程池' if offload else '事件循环':<8}{elapsed:>10.2f}{args.accounts / elapsed:>10.1f}"
+                  f"{percentile(lags, 50) * 1000:>13.1f}{percentile(lags, 99) * 1000:>13.1f}"
+                  f"{max(lags) * 1000:>10.1f}{batches:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+节奏基准：在虚拟时钟下全速跑完 AnyRouter 与 leaflow 的 main()
+
+启动延迟、账号间自适应等待、重试退避都只推进虚拟时间，不真正休眠；
+输出每个站点的虚拟流程耗时、其中的等待时间、实际耗时，以及每账号的平均等待。
+
+用法: python bench/bench_pacing.py [--accounts 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import StandIn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=50)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with StandIn() as server:
+        cookies = "&".join(f"session=bench{i}" for i in range(args.accounts))
+        os.environ.update({
+            "ANYROUTER_BASE": server.base,
+            "ANYROUTER_COOKIE": cookies,
+            "ANYROUTER_NEW_API_USER": "1",
+            "LEAFFLOW_BASE": server.base,
+            "LEAFLOW_COOKIE": cookies,
+            "QL_HTTP_CACHE": "false",
+        })
+        import ql_clock
+        import anyrouter
+        import leaflow
+
+        print(f"{'站点':<10}{'账号':>6}{'虚拟耗时(s)':>14}{'等待(s)':>12}{'实际耗时(s)':>14}{'每账号等待(s)':>16}")
+        for site, module in (("anyrouter", anyrouter), ("leaflow", leaflow)):
+            clock = ql_clock.VirtualClock()
+            ql_clock.install(clock)
+            started = time.perf_counter()
+            module.main()
+            real = time.perf_counter() - started
+            waits = defaultdict(float)
+            for event in clock.timeline:
+                if event["account"]:
+                    waits[event["account"]] += event["duration"]
+            per_account = sum(waits.values()) / max(1, len(waits))
+            print(f"{site:<10}{args.accounts:>6}{clock.elapsed():>14.1f}{clock.skipped:>12.1f}"
+                  f"{real:>14.2f}{per_account:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
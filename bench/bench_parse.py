@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+解析基准：对比 resp.text 路径与 ql_parse 的字节路径
+
+用替身服务器的页面构造响应对象（不联网），分别测量每个响应的 CPU 时间和 tracemalloc 峰值分配：
+- AnyRouter 控制台：BeautifulSoup(resp.text) + select  对比  lxml 解析字节 + XPath
+- leaflow 首页：resp.text  对比  ql_parse.text
+- JSON 接口：resp.json()  对比  ql_parse.loads
+每种都分“未声明 charset”（requests 会做字符集探测）和“声明 charset=utf-8”两种响应头。
+
+用法: python bench/bench_parse.py [--rounds 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import ql_parse
+from standin import CONSOLE_HTML, LEAFLOW_HTML
+
+API_JSON = json.dumps({"success": True, "message": "签到成功", "data": [{"Name": f"任务{i}", "Status": i % 2}
+                                                                     for i in range(200)]}, ensure_ascii=False)
+
+
+def make_response(body: str, content_type) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body.encode("utf-8")
+    if content_type:
+        resp.headers["Content-Type"] = content_type
+    # 与 HTTPAdapter.build_response 一致：只按响应头取编码，未声明时为 None，访问 text 时才探测
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+
+def old_console(resp):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(resp.text, "html.parser")
+    return ([d.get_text(strip=True) for d in soup.select("div.text-xs.text-gray-500")[:2]],
+            [d.get_text(strip=True) for d in soup.select("div.text-lg.font-semibold")[:2]])
+
+
+def new_console(resp):
+    root = ql_parse.html(resp)
+    return (ql_parse.class_texts(root, "text-xs text-gray-500", 2),
+            ql_parse.class_texts(root, "text-lg font-semibold", 2))
+
+
+CASES = (
+    ("控制台", CONSOLE_HTML, "text/html; charset=utf-8", old_console, new_console),
+    ("控制台", CONSOLE_HTML, None, old_console, new_console),
+    ("leaflow首页", LEAFLOW_HTML, "text/html; charset=utf-8", lambda r: r.text, ql_parse.text),
+    ("leaflow首页", LEAFLOW_HTML, None, lambda r: r.text, ql_parse.text),
+    ("JSON", API_JSON, "application/json", lambda r: r.json(), ql_parse.loads),
+    ("JSON", API_JSON, None, lambda r: r.json(), ql_parse.loads),
+)
+
+
+def measure(body: str, content_type, fn, rounds: int) -> tuple[float, float]:
+    """返回 (每响应 CPU 毫秒, 每响应峰值分配 KB)"""
+    fn(make_response(body, content_type))  # 预热导入与缓存
+    cpu = 0.0
+    for _ in range(rounds):
+        resp = make_response(body, content_type)
+        started = time.process_time()
+        fn(resp)
+        cpu += time.process_time() - started
+    peak = 0
+    for _ in range(3):
+        resp = make_response(body, content_type)
+        tracemalloc.start()
+        fn(resp)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu / rounds * 1000, peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    # 先确认两条路径结果一致
+    for name, body, content_type, old, new in CASES:
+        assert old(make_response(body, content_type)) == new(make_response(body, content_type)), name
+
+    print(f"{'页面':<12}{'charset':<10}{'text CPU(ms)':>14}{'字节 CPU(ms)':>14}{'text 分配(KB)':>15}{'字节 分配(KB)':>15}")
+    for name, body, content_type, old, new in CASES:
+        old_cpu, old_mem = measure(body, content_type, old, args.rounds)
+        new_cpu, new_mem = measure(body, content_type, new, args.rounds)
+        label = "声明" if content_type else "未声明"
+        print(f"{name:<12}{label:<10}{old_cpu:>14.2f}{new_cpu:>14.2f}{old_mem:>15.0f}{new_mem:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
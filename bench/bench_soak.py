@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+内存浸泡基准：用大量合成账号跑 AnyRouter 与 ikuuu 的 main()，检查内存不随账号数增长
+
+账号从临时 JSON Lines 账号文件读取，等待走虚拟时钟；每处理 --every 个账号用 tracemalloc
+采样一次，以热身后的采样为基线，输出最终增长量。增长超过 --max-growth-kb 时退出码为 1。
+
+用法: python bench/bench_soak.py [--accounts 10000] [--every 1000] [--max-growth-kb 512]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from standin import Handler, StandIn
+
+
+class SoakHandler(Handler):
+    """控制台换成小页面：浸泡关注的是每账号的残留内存，不是解析大页面的耗时"""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] == "/console":
+            self._reply(200, '<div class="text-xs text-gray-500">余额</div>'
+                             '<div class="text-lg font-semibold">$1.00</div>', "text/html; charset=utf-8")
+        else:
+            super().do_GET()
+
+
+def soak_clock(every: int):
+    import ql_clock
+
+    class SoakClock(ql_clock.VirtualClock):
+        """不记录时间线（否则时间线本身随账号增长），每 every 个账号采样一次内存"""
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.accounts = 0
+            self.samples: list[tuple[int, int]] = []
+
+        def _record(self, event: str, duration: float = 0.0) -> None:
+            pass
+
+        def begin(self, account: str) -> None:
+            if self.accounts % every == 0:
+                gc.collect()
+                self.samples.append((self.accounts, tracemalloc.get_traced_memory()[0]))
+            self.accounts += 1
+
+    return SoakClock()
+
+
+def write_accounts(path: str, site: str, accounts: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(accounts):
+            entry = {"email": f"soak{i}@example.com", "passwd": "x"} if site == "ikuuu" else {"cookie": f"session=soak{i}"}
+            f.write(json.dumps(entry) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--every", type=int, default=1000, help="每多少个账号采样一次")
+    parser.add_argument("--max-growth-kb", type=float, default=512)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    workdir = tempfile.mkdtemp(prefix="ql-soak-")
+    with StandIn(handler=SoakHandler) as server:
+        os.environ.update({
+            "ANYROUTER_BASE": server.base,
+            "ANYROUTER_NEW_API_USER": "1",
+            "ANYROUTER_ACCOUNTS_FILE": os.path.join(workdir, "anyrouter.jsonl"),
+            "IKUUU_ACCOUNTS_FILE": os.path.join(workdir, "ikuuu.jsonl"),
+            "IKUUU_MIRRORS": server.base,
+            "QL_HTTP_CACHE": "false",
+            "QL_RUN_BUDGET": "0",
+            "QL_STATE_DIR": os.path.join(workdir, "state"),
+        })
+        for site in ("anyrouter", "ikuuu"):
+            write_accounts(os.environ[f"{site.upper()}_ACCOUNTS_FILE"], site, args.accounts)
+
+        import ql_clock
+        import anyrouter
+        import ikuuu
+
+        failed = False
+        print(f"{'站点':<10}{'账号':>8}{'实际耗时(s)':>14}{'基线(KB)':>12}{'结束(KB)':>12}{'增长(KB)':>12}")
+        for site, module in (("anyrouter", anyrouter), ("ikuuu", ikuuu)):
+            clock = soak_clock(args.every)
+            ql_clock.install(clock)
+            tracemalloc.start()
+            started = time.perf_counter()
+            module.main()
+            real = time.perf_counter() - started
+            gc.collect()
+            clock.samples.append((clock.accounts, tracemalloc.get_traced_memory()[0]))
+            tracemalloc.stop()
+
+            # 第一个采样点之后才算热身完成（连接池、解析器、限速器等一次性开销）
+            baseline = clock.samples[1][1] if len(clock.samples) > 2 else clock.samples[0][1]
+            final = clock.samples[-1][1]
+            growth = (final - baseline) / 1024
+            failed |= growth > args.max_growth_kb
+            print(f"{site:<10}{clock.accounts:>8}{real:>14.1f}{baseline / 1024:>12.0f}{final / 1024:>12.0f}{growth:>12.1f}")
+
+    print("内存增长超出上限" if failed else "内存保持平稳")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
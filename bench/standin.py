@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+本地替身服务器：模拟五个站点的接口，供基准测试离线使用
+
+一个进程内的 HTTP/1.1 keep-alive 服务器同时提供各站点用到的路径：
+- AnyRouter: POST /api/user/sign_in, GET /console, GET /api/user/self
+- ikuuu:     GET|POST /auth/login, POST /user/checkin
+- leaflow:   GET|HEAD /, POST /index.php
+- nodeseek:  POST /api/attendance
+- rainyun:   GET /user/csrf, GET /user, GET|POST /user/reward/tasks
+
+响应按 Accept-Encoding 协商 zstd / br / gzip 压缩，GET 响应带 ETag 并支持 304，
+并统计请求数、连接数和发送字节数。Cookie 带 expired 或密码带 wrong 的请求按凭据失效应答。
+传入 tls（服务端 SSLContext）时改为 HTTPS。
+"""
+
+import gzip
+import hashlib
+import json
+import ssl
+import threading
+import time
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 控制台/首页大小与真实站点相当（约 100KB 的重复标记）
+CONSOLE_HTML = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>控制台</title></head><body>"
+    + "".join(
+        f'<div class="card"><div class="text-xs text-gray-500">标题{i}</div>'
+        f'<div class="text-lg font-semibold">${i}.00</div></div>'
+        for i in range(1200)
+    )
+    + "</body></html>"
+)
+
+LEAFLOW_HTML = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Leaflow</title>"
+    "<style>.x{color:red}</style><script>var a = 1;</script></head><body>"
+    '<form method="post"><input type="hidden" name="_token" value="abc123">'
+    '<input type="hidden" name="uid" value="42"><button name="checkin">签到</button></form>'
+    + "".join(f'<div class="row"><span>第{i}天</span><span>说明文字</span></div>' for i in range(2000))
+    + "</body></html>"
+)
+
+LEAFLOW_RESULT = "<html><body><div class=\"alert\">签到成功，获得 0.5 元</div></body></html>"
+
+
+def compress(body: bytes, accept: str) -> tuple[bytes, str]:
+    accept = accept.lower()
+    if "zstd" in accept and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(body), "zstd"
+    if "br" in accept and brotli is not None:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in accept:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, ""
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.not_modified = 0
+        self.paths: dict[str, int] = {}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = self.connections = self.bytes_sent = self.not_modified = 0
+            self.paths.clear()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "standin"
+    disable_nagle_algorithm = True  # 响应头与正文分两次写出，避免与延迟确认叠加出 40ms 停顿
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.stats.lock:
+            self.server.stats.connections += 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body, content_type: str = "application/json; charset=utf-8",
+               headers: Optional[dict] = None) -> None:
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        headers = dict(headers or {})
+        if self.command == "GET" and status == 200:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+                with self.server.stats.lock:
+                    self.server.stats.not_modified += 1
+        payload, encoding = compress(body, self.headers.get("Accept-Encoding", "")) if body else (b"", "")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.server.bandwidth:
+            time.sleep(len(payload) / self.server.bandwidth)  # 模拟链路带宽
+        self.wfile.write(payload)
+        stats = self.server.stats
+        with stats.lock:
+            stats.requests += 1
+            stats.bytes_sent += len(payload)
+            path = self.path.split("?")[0]
+            stats.paths[path] = stats.paths.get(path, 0) + 1
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _expired(self) -> bool:
+        """Cookie 中带 expired 的请求按凭据失效处理，用于演示预检"""
+        return "expired" in (self.headers.get("Cookie") or "")
+
+    def _to_login(self) -> None:
+        self.send_response(302)
+        self.send_header("Location", "/auth/login")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/" and self._expired():
+            self._to_login()
+        elif path == "/api/user/self":
+            if self._expired():
+                self._reply(401, {"success": False, "message": "未登录且未提供 access token"})
+            else:
+                self._reply(200, {"success": True, "data": {"id": 1, "username": "standin"}})
+        elif path == "/console":
+            self._reply(200, CONSOLE_HTML, "text/html; charset=utf-8")
+        elif path == "/":
+            self._reply(200, LEAFLOW_HTML, "text/html; charset=utf-8")
+        elif path == "/user/csrf":
+            self._reply(200, {"code": 200, "data": "csrf-token"})
+        elif path == "/user":
+            self._reply(200, {"code": 200, "data": {"Points": 4200}})
+        elif path == "/user/reward/tasks":
+            self._reply(200, {"code": 200, "data": [{"Name": "每日签到", "Status": 1}]})
+        elif path == "/auth/login":
+            self._reply(200, '<form action="/auth/login"></form>', "text/html; charset=utf-8")
+        else:
+            self._reply(404, {"message": "not found"})
+
+    def do_HEAD(self) -> None:
+        if self.path.split("?")[0] == "/" and self._expired():
+            self._to_login()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        body = self._body()
+        path = self.path.split("?")[0]
+        if path == "/api/user/sign_in":
+            self._reply(200, {"success": True, "message": "签到成功"})
+        elif path == "/index.php":
+            self._reply(200, LEAFLOW_RESULT, "text/html; charset=utf-8")
+        elif path == "/auth/login":
+            # 密码里带 wrong 时按密码错误处理
+            if b"wrong" in body:
+                self._reply(200, {"ret": 0, "msg": "邮箱或者密码错误"})
+            else:
+                self._reply(200, {"ret": 1, "msg": "登录成功"})
+        elif path == "/user/checkin":
+            self._reply(200, {"ret": 1, "msg": "你获得了 512MB 流量"})
+        elif path == "/api/attendance":
+            self._reply(200, {"success": True, "message": "签到收益 5 个鸡腿"})
+        elif path == "/user/reward/tasks":
+            self._reply(200, {"code": 0, "msg": "ok"})
+        else:
+            self._reply(404, {"message": "not found"})
+
+
+class StandIn:
+    """在后台线程运行的替身服务器，可用 with 语句管理生命周期"""
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0, handler=Handler,
+                 tls: Optional[ssl.SSLContext] = None) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.tls = tls
+        if tls is not None:
+            self.server.socket = tls.wrap_socket(self.server.socket, server_side=True)
+        self.server.daemon_threads = True
+        self.server.stats = Stats()
+        self.server.latency = latency
+        self.server.bandwidth = bandwidth  # 字节/秒，0 表示不限
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"{'https' if self.tls else 'http'}://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def stats(self) -> Stats:
+        return self.server.stats
+
+    def __enter__(self) -> "StandIn":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -15,8 +15,19 @@ from loguru import logger
 import json
 import re
 import random
-import time
-from datetime import datetime, timedelta
+import threading
+
+import ql_accounts
+import ql_capture
+import ql_clock
+import ql_log
+import ql_net
+import ql_parse
+import ql_profile
+import ql_proxy
+import ql_result
+import ql_session
+import ql_state
 
 # ---------------- 统一通知模块加载 ----------------
 hadsend = False
@@ -31,9 +42,18 @@ except ImportError:
 # 配置项
 IKUUU_EMAIL = os.environ.get('IKUUU_EMAIL')
 IKUUU_PASSWD = os.environ.get('IKUUU_PASSWD')
+# 账号很多时改用 JSON Lines 账号文件，每行 {"email": "...", "passwd": "..."}
+IKUUU_ACCOUNTS_FILE = os.environ.get('IKUUU_ACCOUNTS_FILE')
+
+# 域名配置：IKUUU_MIRRORS 可填多个镜像地址（英文逗号分隔），启动时竞速选出最快的可用地址
+IKUUU_MIRRORS = [u.strip().rstrip('/') for u in os.environ.get('IKUUU_MIRRORS', 'https://ikuuu.de').split(',')
+                 if u.strip()] or ['https://ikuuu.de']
+# 竞速胜出的地址缓存多久（秒），期间直接使用，不再探测
+IKUUU_MIRROR_TTL = float(os.environ.get('IKUUU_MIRROR_TTL', '21600'))
+MIRROR_PROBE_TIMEOUT = 5  # 单个镜像探测超时（秒）
+MIRROR_STAGGER = 0.25  # 竞速时相邻两个探测的启动间隔（秒）
 
-# ikuuu.de 域名配置
-BASE_URL = 'https://ikuuu.de'
+BASE_URL = IKUUU_MIRRORS[0]
 LOGIN_URL = f'{BASE_URL}/auth/login'
 CHECK_URL = f'{BASE_URL}/user/checkin'
 
@@ -47,6 +67,58 @@ HEADER = {
     'x-requested-with': 'XMLHttpRequest'
 }
 
+def use_mirror(base: str) -> None:
+    """切换本次运行使用的域名，之后新建的签到器都使用它"""
+    global BASE_URL, LOGIN_URL, CHECK_URL
+    BASE_URL = base
+    LOGIN_URL = f'{base}/auth/login'
+    CHECK_URL = f'{base}/user/checkin'
+    HEADER['origin'] = base
+    HEADER['referer'] = f'{base}/user'
+
+
+def probe_mirror(base: str) -> bool:
+    """探测镜像：登录页能在超时内正常返回即视为可用（不跟随跳转）"""
+    with ql_session.configure(requests.Session()) as session:
+        resp = session.get(f'{base}/auth/login', timeout=MIRROR_PROBE_TIMEOUT, allow_redirects=False,
+                           stream=True, headers={'user-agent': HEADER['user-agent']})
+        resp.close()
+    return 200 <= resp.status_code < 400
+
+
+def select_mirror(exclude=()) -> bool:
+    """选出本次使用的域名：缓存的胜者未过期时直接使用，否则竞速；返回域名是否有变化"""
+    candidates = [m for m in IKUUU_MIRRORS if m not in exclude]
+    if not candidates:
+        return False
+    cached = ql_state.load('ikuuu_mirror', {})
+    if cached.get('base') in candidates and ql_clock.time_() - cached.get('updated', 0) < IKUUU_MIRROR_TTL:
+        winner = cached['base']
+    elif len(candidates) == 1:
+        winner = candidates[0]
+    else:
+        won = ql_net.race(candidates, probe_mirror, stagger=MIRROR_STAGGER)
+        if won is None:
+            logger.warning(f"所有镜像探测失败，使用 {candidates[0]}")
+            winner = candidates[0]
+        else:
+            winner = won[0]
+            logger.info(f"镜像竞速: {winner} 最先可用（{won[1] * 1000:.0f}ms）")
+            ql_state.save('ikuuu_mirror', {'base': winner, 'updated': int(ql_clock.time_())})
+    changed = winner != BASE_URL
+    use_mirror(winner)
+    return changed
+
+
+def failover(failed: set) -> bool:
+    """当前域名连接失败或熔断时切换到其它可用镜像；没有可切换的返回 False"""
+    failed.add(BASE_URL)
+    if len(IKUUU_MIRRORS) <= 1 or not select_mirror(exclude=failed):
+        return False
+    logger.warning(f"域名故障，切换到 {BASE_URL}")
+    return True
+
+
 def format_time_remaining(seconds):
     """格式化时间显示"""
     if seconds <= 0:
@@ -65,18 +137,18 @@ def wait_with_countdown(delay_seconds, task_name):
     if delay_seconds <= 0:
         return
     logger.info(f"{task_name} 需要等待 {format_time_remaining(delay_seconds)}")
-    time.sleep(delay_seconds)
+    ql_clock.sleep(delay_seconds, "启动延迟")
 
 def notify_user(title, content):
-    """统一通知函数"""
+    """统一通知函数；content 可以是返回正文的函数，只在确实要输出时才生成"""
     if hadsend:
         try:
-            send(title, content)
+            send(title, ql_result.text(content))
             logger.info(f"通知发送完成: {title}")
         except Exception as e:
             logger.error(f"通知发送失败: {e}")
     else:
-        logger.info(f"{title}\n{content}")
+        logger.opt(lazy=True).info("{}\n{}", lambda: title, lambda: ql_result.text(content))
 
 class IkuuuSigner:
     name = "ikuuu"
@@ -85,22 +157,37 @@ class IkuuuSigner:
         self.email = email
         self.passwd = passwd
         self.index = index
-        self.session = requests.Session()
+        # 常驻进程里按邮箱保留会话，下次运行复用连接和 Cookie 罐；配置了代理池时走该账号固定的代理，开启抓包时记入该账号的缓冲
+        self.session = ql_capture.attach(ql_proxy.bind(
+            ql_session.lease(f"ikuuu:{email}", lambda: ql_session.configure(requests.Session())), email), "ikuuu", email)
         self.session.headers.update(HEADER)
+        self.network_error = False  # 连接失败或超时，主流程据此切换镜像
+        self.logged_in = False  # 预检阶段已登录时签到阶段不再重复登录
+        self.rejected = False  # 站点明确拒绝了邮箱或密码
+
+    def close(self) -> None:
+        """关闭会话，释放连接（常驻进程保留的会话不关闭）"""
+        ql_session.release(self.session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
     def login(self):
         """用户登录"""
         try:
-            logger.info(f"正在登录账号: {self.email}")
-            logger.info(f"使用域名: {BASE_URL}")
+            ql_log.verbose("正在登录账号: {}", self.email)
+            ql_log.verbose("使用域名: {}", BASE_URL)
             
             data = {
                 'email': self.email,
                 'passwd': self.passwd
             }
             
-            response = self.session.post(
-                url=LOGIN_URL, 
+            response = ql_net.request(
+                self.session, 'POST', LOGIN_URL,
                 data=data, 
                 timeout=15
             )
@@ -109,19 +196,21 @@ class IkuuuSigner:
             
             if response.status_code == 200:
                 try:
-                    result = response.json()
-                    logger.info(f"登录响应: {result}")
+                    result = ql_parse.loads(response)
+                    ql_log.verbose("登录响应: {}", result)
                     
                     if result.get('ret') == 1:
                         logger.info(f"登录成功: {result.get('msg', '登录成功')}")
+                        self.logged_in = True
                         return True, "登录成功"
                     else:
+                        self.rejected = True
                         error_msg = result.get('msg', '登录失败')
                         logger.error(f"登录失败: {error_msg}")
                         return False, f"登录失败: {error_msg}"
                         
                 except json.JSONDecodeError:
-                    logger.error(f"登录响应格式错误: {response.text[:200]}")
+                    logger.error(f"登录响应格式错误: {ql_parse.text(response)[:200]}")
                     return False, "登录响应格式错误"
             else:
                 error_msg = f"登录请求失败，状态码: {response.status_code}"
@@ -129,13 +218,17 @@ class IkuuuSigner:
                 return False, error_msg
                 
         except requests.exceptions.Timeout:
+            self.network_error = True
             error_msg = "登录请求超时"
             logger.error(error_msg)
             return False, error_msg
         except requests.exceptions.ConnectionError:
+            self.network_error = True
             error_msg = "网络连接错误，请检查域名是否正确"
             logger.error(error_msg)
             return False, error_msg
+        except ql_net.DeferredError:
+            raise
         except Exception as e:
             error_msg = f"登录异常: {str(e)}"
             logger.error(error_msg)
@@ -146,8 +239,8 @@ class IkuuuSigner:
         try:
             logger.info("正在执行签到...")
             
-            response = self.session.post(
-                url=CHECK_URL, 
+            response = ql_net.request(
+                self.session, 'POST', CHECK_URL,
                 timeout=15
             )
             
@@ -155,8 +248,8 @@ class IkuuuSigner:
             
             if response.status_code == 200:
                 try:
-                    result = response.json()
-                    logger.info(f"签到响应: {result}")
+                    result = ql_parse.loads(response)
+                    ql_log.verbose("签到响应: {}", result)
                     
                     msg = result.get('msg', '签到完成')
                     
@@ -183,7 +276,7 @@ class IkuuuSigner:
                         return False, f"签到失败: {msg}"
                         
                 except json.JSONDecodeError:
-                    logger.error(f"签到响应格式错误: {response.text[:200]}")
+                    logger.error(f"签到响应格式错误: {ql_parse.text(response)[:200]}")
                     return False, "签到响应格式错误"
             else:
                 error_msg = f"签到请求失败，状态码: {response.status_code}"
@@ -191,13 +284,17 @@ class IkuuuSigner:
                 return False, error_msg
                 
         except requests.exceptions.Timeout:
+            self.network_error = True
             error_msg = "签到请求超时"
             logger.error(error_msg)
             return False, error_msg
         except requests.exceptions.ConnectionError:
+            self.network_error = True
             error_msg = "网络连接错误"
             logger.error(error_msg)
             return False, error_msg
+        except ql_net.DeferredError:
+            raise
         except Exception as e:
             error_msg = f"签到异常: {str(e)}"
             logger.error(error_msg)
@@ -242,12 +339,14 @@ class IkuuuSigner:
             logger.warning(f"提取流量奖励异常: {e}")
             return None
 
-    def main(self):
+    def main(self) -> ql_result.Result:
         """主执行函数"""
-        logger.info(f"==== ikuuu账号{self.index} 开始签到 ====")
+        ql_log.verbose("==== ikuuu账号{} 开始签到 ====", self.index)
+        started = ql_clock.monotonic()
+        retries = ql_net.retries()
         
         if not self.email.strip() or not self.passwd.strip():
-            error_msg = """账号配置错误
+            error_msg = f"""账号配置错误
 
 ❌ 错误原因: 邮箱或密码为空
 
@@ -258,38 +357,38 @@ class IkuuuSigner:
 4. 密码顺序要与邮箱顺序对应
 
 💡 提示: 请确保邮箱和密码正确且一一对应
-🌐 当前域名: ikuuu.de"""
+🌐 当前域名: {ql_net.host_of(BASE_URL)}"""
             
             logger.error(error_msg)
-            return error_msg, False
+            return ql_result.Result("ikuuu", self.email, ql_result.INVALID, detail=error_msg)
 
-        # 1. 登录
-        login_success, login_msg = self.login()
-        if not login_success:
-            return f"登录失败: {login_msg}", False
-        
-        # 2. 随机等待
-        time.sleep(random.uniform(1, 3))
+        # 1. 登录（预检阶段已登录的签到器直接签到）
+        if not self.logged_in:
+            login_success, login_msg = self.login()
+            if not login_success:
+                # 只有站点明确拒绝邮箱或密码才算凭据失效，超时、连接错误等记为失败
+                status = ql_result.INVALID if self.rejected else ql_result.FAILED
+                return ql_result.Result("ikuuu", self.email, status, latency=ql_clock.monotonic() - started,
+                                        attempts=1 + ql_net.retries() - retries, detail=f"登录失败: {login_msg}")
+            
+            # 2. 随机等待
+            ql_clock.sleep(random.uniform(1, 3), "登录后等待")
         
         # 3. 执行签到
         checkin_success, checkin_msg = self.checkin()
         
-        # 4. 组合结果消息
-        final_msg = f"""🌟 ikuuu签到结果
-
-👤 账号: {self.email}
-🌐 域名: ikuuu.de
-
-📝 签到: {checkin_msg}
-⏰ 时间: {datetime.now().strftime('%m-%d %H:%M')}"""
-        
+        # 4. 结果消息在发送通知时才生成
         logger.info("任务完成" if checkin_success else "任务失败")
-        return final_msg, checkin_success
+        return ql_result.Result(
+            "ikuuu", self.email, ql_result.SUCCESS if checkin_success else ql_result.FAILED,
+            latency=ql_clock.monotonic() - started, attempts=1 + ql_net.retries() - retries, detail=checkin_msg,
+            fields=(("👤 账号", self.email), ("🌐 域名", ql_net.host_of(BASE_URL)), ("📝 签到", checkin_msg)),
+            title="🌟 ikuuu签到结果",
+        )
 
 def main():
     """主程序入口"""
-    logger.info(f"==== ikuuu签到开始 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
-    logger.info(f"当前域名: {BASE_URL}")
+    logger.info(f"==== ikuuu签到开始 - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
     
     # 获取账号配置
     emails = IKUUU_EMAIL.split(',') if IKUUU_EMAIL else []
@@ -299,7 +398,7 @@ def main():
     emails = [email.strip() for email in emails if email.strip()]
     passwords = [passwd.strip() for passwd in passwords if passwd.strip()]
     
-    if not emails or not passwords:
+    if not IKUUU_ACCOUNTS_FILE and (not emails or not passwords):
         error_msg = """❌ 未找到IKUUU_EMAIL或IKUUU_PASSWD环境变量
 
 🔧 配置方法:
@@ -311,14 +410,13 @@ def main():
 IKUUU_EMAIL=user1@example.com,user2@example.com
 IKUUU_PASSWD=password1,password2
 
-💡 提示: 请确保邮箱和密码数量一致且顺序对应
-🌐 当前域名: ikuuu.de"""
+💡 提示: 请确保邮箱和密码数量一致且顺序对应"""
         
         logger.error(error_msg)
         notify_user("ikuuu签到失败", error_msg)
         return
     
-    if len(emails) != len(passwords):
+    if not IKUUU_ACCOUNTS_FILE and len(emails) != len(passwords):
         error_msg = f"""❌ 邮箱和密码数量不匹配
 
 📊 当前配置:
@@ -326,76 +424,149 @@ IKUUU_PASSWD=password1,password2
 - 密码数量: {len(passwords)}
 
 🔧 解决方法:
-请确保IKUUU_EMAIL和IKUUU_PASSWD环境变量中的账号数量一致
-🌐 当前域名: ikuuu.de"""
+请确保IKUUU_EMAIL和IKUUU_PASSWD环境变量中的账号数量一致"""
         
         logger.error(error_msg)
         notify_user("ikuuu签到失败", error_msg)
         return
     
-    logger.info(f"共发现 {len(emails)} 个账号")
+    accounts = ql_accounts.source(IKUUU_ACCOUNTS_FILE, 'email',
+                                  ({'email': e, 'passwd': p} for e, p in zip(emails, passwords)))
+    logger.info(f"共发现 {len(accounts)} 个账号（来源: {accounts.describe()}）")
+
+    # 有多个镜像时竞速选出本次使用的域名（胜者按 IKUUU_MIRROR_TTL 缓存）
+    select_mirror()
+    logger.info(f"当前域名: {BASE_URL}")
+    failed_mirrors = set()
     
-    success_count = 0
-    total_count = len(emails)
-    results = []
+    total_count = len(accounts)
+    # 逐个累计计数；账号不超过 5 个时汇总里列出每个账号的结果
+    summary = ql_result.Summary("ikuuu", keep=5 if total_count <= 5 else 0)
+    host = ql_net.host_of(BASE_URL)
+    limiter = ql_net.get_limiter(host, initial=10, floor=2, ceiling=120)
+
+    history = ql_accounts.History("ikuuu")
+
+    # 并发预检：登录就是 ikuuu 最便宜的凭据校验，登录成功的签到器留给签到阶段直接签到；
+    # 连接失败时立即切换镜像再登录，后续账号都走新域名
+    mirror_lock = threading.Lock()
+
+    def check(index, account):
+        email, passwd = account.get('email', ''), account.get('passwd', '')
+        if not email.strip() or not passwd.strip():
+            return False, "邮箱或密码为空", None
+        while True:
+            base = BASE_URL
+            signer = IkuuuSigner(email, passwd, index + 1)
+            ok, msg = signer.login()
+            if ok:
+                return True, "", signer
+            signer.close()
+            if not signer.network_error:
+                return (False if signer.rejected else None), msg, None
+            with mirror_lock:
+                if BASE_URL == base and not failover(failed_mirrors):
+                    return None, msg, None
+
+    checked = ql_accounts.preflight(accounts, check, "ikuuu", limiter)
+    host = ql_net.host_of(BASE_URL)
+    limiter = ql_net.get_limiter(host, initial=10, floor=2, ceiling=120)
+    for index, account, reason in checked.invalid:
+        email = account.get('email', '')
+        result = summary.add(ql_result.Result("ikuuu", email, ql_result.INVALID, detail=reason))
+        logger.error(f"账号{index + 1}({email}): {reason}")
+        notify_user(f"ikuuu账号{index + 1}签到失败", result.render)
+        ql_capture.flush(email)
+        history.record(email, result)
+    # 按历史耗时与失败情况安排顺序，上次失效的账号排在最后
+    checked = ql_accounts.order(checked, history, 'email', interval=limiter.interval)
     
-    for index, (email, passwd) in enumerate(zip(emails, passwords)):
+    for index, account in checked:
+        ql_clock.begin(f"账号{index + 1}")
+        ql_log.begin("ikuuu")
+        email, passwd = account.get('email', ''), account.get('passwd', '')
+        # 当前域名熔断时先尝试切换镜像
+        if ql_net.is_open(host) and failover(failed_mirrors):
+            host = ql_net.host_of(BASE_URL)
+            limiter = ql_net.get_limiter(host, initial=10, floor=2, ceiling=120)
+        # 站点熔断或剩余运行时间不足时，剩余账号直接延后，不再逐个等待超时
+        reason = ql_net.defer_reason(host)
+        if reason:
+            logger.warning(f"账号{index + 1}({email}): {reason}，延后到下次运行")
+            summary.add(ql_result.Result("ikuuu", email, ql_result.DEFERRED, detail=reason))
+            continue
+
         try:
-            # 账号间随机等待
-            if index > 0:
-                delay = random.uniform(5, 15)
+            # 账号间自适应等待
+            if index != checked.start:
+                delay = limiter.next_delay()
                 logger.info(f"随机等待 {delay:.1f} 秒后处理下一个账号...")
-                time.sleep(delay)
-            
-            # 执行签到
-            signer = IkuuuSigner(email, passwd, index + 1)
-            result_msg, is_success = signer.main()
+                ql_clock.sleep(delay, "账号间等待")
             
-            if is_success:
-                success_count += 1
-            
-            results.append({
-                'index': index + 1,
-                'success': is_success,
-                'message': result_msg,
-                'email': email
-            })
+            # 执行签到；连接失败或超时时切换到其它可用镜像并重试本账号
+            while True:
+                with checked.carry.pop(index, None) or IkuuuSigner(email, passwd, index + 1) as signer:
+                    result = signer.main()
+                if not (signer.network_error and failover(failed_mirrors)):
+                    break
+                host = ql_net.host_of(BASE_URL)
+                limiter = ql_net.get_limiter(host, initial=10, floor=2, ceiling=120)
+            summary.add(result)
+            history.record(email, result)
             
             # 发送单个账号通知
-            status = "成功" if is_success else "失败"
+            status = "成功" if result.ok else "失败"
             title = f"ikuuu账号{index + 1}签到{status}"
-            notify_user(title, result_msg)
+            notify_user(title, result.render)
+            if not result.ok:
+                ql_capture.flush(email)
             
+        except ql_net.DeferredError as e:
+            logger.warning(f"账号{index + 1}({email}): {e}，延后到下次运行")
+            summary.add(ql_result.Result("ikuuu", email, ql_result.DEFERRED, detail=str(e)))
         except Exception as e:
             error_msg = f"账号{index + 1}({email}): 执行异常 - {str(e)}"
             logger.error(error_msg)
+            summary.add(ql_result.Result("ikuuu", email, ql_result.FAILED, detail=error_msg))
             notify_user(f"ikuuu账号{index + 1}签到失败", error_msg)
     
+    accounts.close()
+    history.save()
+    # 延后的账号在预检阶段留下的已登录会话
+    for signer in checked.carry.values():
+        signer.close()
+
     # 发送汇总通知
     if total_count > 1:
-        summary_msg = f"""📊 ikuuu签到汇总
+        def summary_msg() -> str:
+            # 账号文件中无法解析的行没有结果记录，按失败计
+            msg = f"""📊 ikuuu签到汇总
 
 📈 总计: {total_count}个账号
-✅ 成功: {success_count}个
-❌ 失败: {total_count - success_count}个
-📊 成功率: {success_count/total_count*100:.1f}%
-🌐 域名: ikuuu.de
-⏰ 完成时间: {datetime.now().strftime('%m-%d %H:%M')}"""
-        
-        # 添加详细结果（最多显示5个账号的详情）
-        if len(results) <= 5:
-            summary_msg += "\n\n📋 详细结果:"
-            for result in results:
-                status_icon = "✅" if result['success'] else "❌"
-                summary_msg += f"\n{status_icon} {result['email']}"
+✅ 成功: {summary.ok}个
+❌ 失败: {total_count - summary.ok - summary.deferred}个
+⏸️ 延后: {summary.deferred}个
+📊 成功率: {summary.ok/total_count*100:.1f}%
+🌐 域名: {ql_net.host_of(BASE_URL)}
+⏰ 完成时间: {ql_clock.now().strftime('%m-%d %H:%M')}"""
+            
+            # 添加详细结果（最多显示5个账号的详情）
+            if summary.details:
+                msg += "\n\n📋 详细结果:"
+                for result in summary.details:
+                    msg += f"\n{result.line()}"
+            return msg
         
         notify_user("ikuuu签到汇总", summary_msg)
     
-    logger.info(f"==== ikuuu签到完成 - 成功{success_count}/{total_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    summary.log()
+    logger.info(f"==== ikuuu签到完成 - 成功{summary.ok}/{total_count} - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
 
 def handler(event, context):
     """云函数入口"""
-    main()
+    ql_log.setup()
+    ql_profile.run("ikuuu", main)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ql_log.setup()
+    ql_profile.run("ikuuu", main)
\ No newline at end of file
@@ -6,10 +6,21 @@ new Env('leaflow签到')
 import os    
 import re    
 import sys    
-import time    
 import random    
-from datetime import datetime, timedelta    
+from typing import Optional
 from loguru import logger
+
+import ql_accounts
+import ql_cache
+import ql_capture
+import ql_clock
+import ql_log
+import ql_net
+import ql_parse
+import ql_profile
+import ql_proxy
+import ql_result
+import ql_session
   
   
 try:    
@@ -47,8 +58,14 @@ TIMEOUT = int(os.getenv("TIMEOUT", "60"))
 RETRY_TIMES = int(os.getenv("RETRY_TIMES", "3"))    
 RETRY_DELAY = int(os.getenv("RETRY_DELAY", "5"))
 MAX_RANDOM_DELAY = int(os.getenv("MAX_RANDOM_DELAY", "3600"))    
+# 账号很多时改用 JSON Lines 账号文件，每行 {"cookie": "..."} 或一行 Cookie
+LEAFLOW_ACCOUNTS_FILE = os.getenv("LEAFLOW_ACCOUNTS_FILE")
+SHUFFLE_BUFFER = int(os.getenv("LEAFLOW_SHUFFLE_BUFFER", "64"))  # 随机执行顺序的打乱缓冲大小
 NOTIFY_ON_ALREADY = os.getenv("NOTIFY_ON_ALREADY", "true").lower() == "true"  # 已签到是否通知
 DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"  # 🆕 调试模式
+if DEBUG_MODE:
+    # 调试模式下抓取每个账号最近的请求/响应，失败或退出时压缩落盘（见 ql_capture）
+    ql_capture.enable()
   
   
 HTTP_PROXY = os.getenv("HTTP_PROXY") or os.getenv("http_proxy")    
@@ -58,15 +75,19 @@ if HTTP_PROXY or HTTPS_PROXY:
     PROXIES = {"http": HTTP_PROXY or HTTPS_PROXY, "https": HTTPS_PROXY or HTTP_PROXY}    
   
   
+# curl_cffi 预热请求需与正式请求使用相同的指纹，才能复用同一连接
+WARM_KWARGS = {"impersonate": "chrome120"} if USE_CURL_CFFI else None
+
+
 UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"    
   
   
 def now_sh():    
-    return datetime.now(tz=SH_TZ) if SH_TZ else datetime.now()    
+    return ql_clock.now(SH_TZ)    
   
   
 def build_session(cookie: str):    
-    s = requests.Session()    
+    s = ql_session.configure(requests.Session())    
     s.headers.update({    
         "User-Agent": UA,    
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",    
@@ -76,7 +97,8 @@ def build_session(cookie: str):
     })    
     if PROXIES:    
         s.proxies.update(PROXIES)    
-    return s    
+    # 配置了代理池（QL_PROXIES）时改走该账号固定的代理；调试模式下请求记入该账号的抓包缓冲
+    return ql_capture.attach(ql_proxy.bind(s, cookie), "leaflow", cookie)
   
   
 def extract_csrf(html: str) -> dict:    
@@ -116,7 +138,7 @@ def extract_reward(html: str) -> float:
     )
     
     if DEBUG_MODE:
-        logger.debug(f"[DEBUG] 清理后的HTML片段: {text_cleaned[:300]}...")
+        logger.opt(lazy=True).debug("[DEBUG] 清理后的HTML片段: {}...", lambda: text_cleaned[:300])
     
     # 🆕 优先级1：明确匹配"今日/今天/本次/签到成功"相关的奖励
     priority_patterns = [
@@ -136,7 +158,7 @@ def extract_reward(html: str) -> float:
                 amount = float(match.group(1))
                 if 0.01 <= amount <= 10:
                     if DEBUG_MODE:
-                        logger.debug(f"[DEBUG] 优先级匹配成功: {pattern} -> {amount} 元")
+                        logger.debug("[DEBUG] 优先级匹配成功: {} -> {} 元", pattern, amount)
                     return amount
             except (ValueError, IndexError):
                 continue
@@ -157,7 +179,7 @@ def extract_reward(html: str) -> float:
                 amount = float(match.group(1))
                 if 0.01 <= amount <= 10:
                     if DEBUG_MODE:
-                        logger.debug(f"[DEBUG] 通用模式匹配: {pattern} -> {amount} 元")
+                        logger.debug("[DEBUG] 通用模式匹配: {} -> {} 元", pattern, amount)
                     return amount
             except (ValueError, IndexError):
                 continue
@@ -218,15 +240,28 @@ def parse_result(html: str) -> tuple[str, str, float]:
     return "unknown", "未识别到明确状态", 0    
   
   
-def sign_once_impl(cookie: str) -> tuple[str, str, float]:    
-    s = build_session(cookie)    
+def inspect_home(content: bytes, encoding: str) -> tuple[bool, dict]:
+    """解析首页：返回 (是否提示未登录, 签到表单隐藏字段)；只依赖正文与编码，可在解析进程中执行"""
+    html = content.decode(encoding, errors="replace")
+    if any(x in html for x in ["请登录", "未登录"]):
+        return True, {}
+    return False, extract_csrf(html)
+
+
+def parse_page(content: bytes, encoding: str) -> tuple[str, str, float]:
+    """解码并识别签到结果页，可在解析进程中执行"""
+    return parse_result(content.decode(encoding, errors="replace"))
+
+
+def sign_once_impl(cookie: str, session=None) -> tuple[str, str, float]:    
+    s = session or build_session(cookie)    
         
     try:    
         kwargs = {"timeout": TIMEOUT, "allow_redirects": True}    
         if USE_CURL_CFFI:    
             kwargs["impersonate"] = "chrome120"    
             
-        r1 = s.get(f"{BASE}/", **kwargs)    
+        r1 = ql_cache.get(s, f"{BASE}/", account=cookie, policy=ql_net.NO_RETRY, **kwargs)    
             
         if "login" in r1.url.lower():    
             return "invalid", "被重定向到登录页，Cookie 已失效", 0    
@@ -237,13 +272,14 @@ def sign_once_impl(cookie: str) -> tuple[str, str, float]:
         if r1.status_code != 200:    
             return "error", f"首页返回 {r1.status_code}", 0    
             
-        html1 = r1.text or ""    
+        # 开启 QL_PARSE_WORKERS 时首页与结果页在解析进程中处理，不占用发请求的线程
+        logged_out, csrf = ql_parse.offload(inspect_home, r1.content, ql_parse.encoding_of(r1))
             
-        if any(x in html1 for x in ["请登录", "未登录"]):    
+        if logged_out:    
             return "invalid", "页面提示未登录", 0    
             
         form_data = {"checkin": ""}    
-        form_data.update(extract_csrf(html1))    
+        form_data.update(csrf)    
             
         headers_post = {    
             "Content-Type": "application/x-www-form-urlencoded",    
@@ -251,54 +287,86 @@ def sign_once_impl(cookie: str) -> tuple[str, str, float]:
             "Referer": f"{BASE}/",    
         }    
             
-        r2 = s.post(f"{BASE}/index.php", data=form_data, headers=headers_post, **kwargs)    
+        r2 = ql_net.request(s, "POST", f"{BASE}/index.php", policy=ql_net.NO_RETRY, data=form_data, headers=headers_post, **kwargs)    
             
         if r2.status_code == 403:    
             return "error", "POST 被拒绝 403", 0    
             
-        html2 = r2.text or ""
-        
-        if DEBUG_MODE:
-            # 保存HTML到临时文件用于调试
-            debug_file = f"debug_response_{int(time.time())}.html"
-            with open(debug_file, "w", encoding="utf-8") as f:
-                f.write(html2)
-            logger.debug(f"[DEBUG] 响应已保存到: {debug_file}")
-        
-        status, msg, amount = parse_result(html2)    
+        status, msg, amount = ql_parse.offload(parse_page, r2.content, ql_parse.encoding_of(r2))
             
         if status == "unknown" or (status == "success" and amount == 0):    
-            time.sleep(1)    
-            r3 = s.get(f"{BASE}/", **kwargs)    
-            status2, msg2, amount2 = parse_result(r3.text or "")    
+            ql_clock.sleep(1, "结果复查")    
+            r3 = ql_cache.get(s, f"{BASE}/", account=cookie, policy=ql_net.NO_RETRY, hedge=True, **kwargs)    
+            status2, msg2, amount2 = ql_parse.offload(parse_page, r3.content, ql_parse.encoding_of(r3))
             if status2 != "unknown":    
                 return status2, msg2, amount2    
             
         return status, msg, amount    
             
+    except ql_net.DeferredError as e:
+        return "deferred", f"已延后: {e}", 0
     except requests.exceptions.Timeout:    
         return "error", f"请求超时（{TIMEOUT}秒）", 0    
     except requests.exceptions.ConnectionError as e:    
         return "error", f"连接失败: {str(e)[:80]}", 0    
     except Exception as e:    
         return "error", f"{e.__class__.__name__}: {str(e)[:100]}", 0    
-  
-  
-def sign_with_retry(cookie: str, account_name: str) -> tuple[str, str, float]:    
+    finally:
+        # 本次临时建的会话用完即关；传入的会话由调用方负责关闭
+        if session is None:
+            s.close()
+  
+  
+def check_cookie(cookie: str) -> tuple[Optional[bool], str]:
+    """预检：HEAD 首页且不跟随跳转，被重定向到登录页即 Cookie 失效，不下载首页正文；无法判定时返回 None"""
+    if not cookie.strip():
+        return False, "Cookie 为空"
+    session = ql_session.lease(f"leaflow:{cookie}", lambda: build_session(cookie))
+    try:
+        kwargs = {"timeout": TIMEOUT, "allow_redirects": False}
+        if USE_CURL_CFFI:
+            kwargs["impersonate"] = "chrome120"
+        r = ql_net.request(session, "HEAD", f"{BASE}/", **kwargs)
+    finally:
+        ql_session.release(session)
+    if 300 <= r.status_code < 400:
+        if "login" in (r.headers.get("Location") or "").lower():
+            return False, "被重定向到登录页，Cookie 已失效"
+        return None, f"首页跳转到 {r.headers.get('Location')}"
+    if r.status_code == 200:
+        return True, ""
+    return None, f"首页返回 {r.status_code}"
+
+
+def sign_with_retry(cookie: str, account_name: str, session=None) -> ql_result.Result:    
+    # 账号级重试：RETRY_DELAY 作为指数退避基数，站点熔断或预算不足时立即停止
+    policy = ql_net.RetryPolicy(attempts=RETRY_TIMES, base=RETRY_DELAY)
+    started = ql_clock.monotonic()
+    retries = ql_net.retries()
+
+    def result(status: str, msg: str, amount: float, attempts: int) -> ql_result.Result:
+        # 账号级尝试次数加上其中请求级的重试次数
+        return ql_result.Result("Leaflow", account_name, status, amount=amount, latency=ql_clock.monotonic() - started,
+                                attempts=attempts + ql_net.retries() - retries, detail=msg)
+
     for attempt in range(1, RETRY_TIMES + 1):    
         if attempt > 1:    
             logger.info(f"第 {attempt}/{RETRY_TIMES} 次重试...")    
-            time.sleep(RETRY_DELAY)    
+            ql_clock.sleep(delay, "重试等待")    
             
-        status, msg, amount = sign_once_impl(cookie)    
+        # 首次尝试使用等待期间预热好的会话，重试时重新建会话
+        status, msg, amount = sign_once_impl(cookie, session if attempt == 1 else None)    
             
-        if status in ("success", "already", "invalid"):    
-            return status, msg, amount    
+        if status in ("success", "already", "invalid", "deferred"):    
+            return result(status, msg, amount, attempt)
             
         if attempt < RETRY_TIMES:    
-            logger.warning(f"{msg}，{RETRY_DELAY}秒后重试...")    
+            delay = policy.delay(attempt)
+            if not ql_net.deadline().allows(delay):
+                return result("deferred", f"{msg}（剩余运行时间不足，未重试）", 0, attempt)
+            logger.warning(f"{msg}，{delay:.1f}秒后重试...")    
         
-    return status, f"{msg}（重试 {RETRY_TIMES} 次后失败）", 0    
+    return result(status, f"{msg}（重试 {RETRY_TIMES} 次后失败）", 0, RETRY_TIMES)
   
   
 def format_time_remaining(seconds: int) -> str:    
@@ -318,19 +386,19 @@ def wait_with_countdown(delay_seconds: int, tag: str):
     if delay_seconds <= 0:    
         return    
     logger.info(f"{tag} 需要等待 {format_time_remaining(delay_seconds)}")    
-    time.sleep(delay_seconds)    
+    ql_clock.sleep(delay_seconds, "调度等待")    
   
   
 def safe_send_notify(title, content):  
-    """安全的通知发送（带日志）"""  
+    """安全的通知发送（带日志）；content 可以是返回正文的函数，只在确实要输出时才生成"""  
     if not hadsend:  
-        logger.info(f"[通知] {title}: {content}")  
+        logger.opt(lazy=True).info("[通知] {}: {}", lambda: title, lambda: ql_result.text(content))
         logger.info("(通知模块未加载，仅控制台显示)")  
         return False  
       
     try:  
         logger.info(f"正在推送通知: {title}")  
-        send(title, content)  
+        send(title, ql_result.text(content))  
         logger.info("通知推送成功")  
         return True  
     except Exception as e:  
@@ -347,64 +415,91 @@ def main():
         logger.info("  调试模式: 已启用")
     logger.info("="*50)
     
-    cookies_env = os.getenv("LEAFLOW_COOKIE").strip()    
-    if not cookies_env:    
+    cookies_env = (os.getenv("LEAFLOW_COOKIE") or "").strip()    
+    if not cookies_env and not LEAFLOW_ACCOUNTS_FILE:    
         logger.error("未设置 LEAFFLOW_COOKIE 环境变量")    
         sys.exit(1)    
         
     raw_list = []    
     for seg in cookies_env.replace("\r", "\n").split("\n"):    
         raw_list.extend(seg.split("&"))    
-    cookie_list = [c.strip() for c in raw_list if c.strip()]
+    accounts = ql_accounts.source(LEAFLOW_ACCOUNTS_FILE, "cookie", (c.strip() for c in raw_list if c.strip()))
         
-    logger.info(f"共发现 {len(cookie_list)} 个 Cookie")       
+    logger.info(f"共发现 {len(accounts)} 个 Cookie（来源: {accounts.describe()}）")       
         
-    if len(cookie_list) == 0:    
+    if len(accounts) == 0:    
         logger.error("Cookie 列表为空")    
         sys.exit(1)    
         
-    schedule = []    
-    base_time = now_sh()    
-    for i, ck in enumerate(cookie_list, 1):    
-        delay = random.randint(0, MAX_RANDOM_DELAY)   
-        at = base_time + timedelta(seconds=delay)    
-        schedule.append({    
-            "idx": i,    
-            "cookie": ck,    
-            "delay": delay,    
-            "time": at,    
-            "name": f"账号{i}"    
-        })    
-    schedule.sort(key=lambda x: x["delay"])    
-           
-    logger.info("==== 签到执行顺序 ====")    
-    for it in schedule:    
-        logger.info(f"{it['name']}: 预计 {it['time'].strftime('%H:%M:%S')} 执行")    
+    summary = ql_result.Summary("Leaflow")
+    host = ql_net.host_of(BASE)
+    limiter = ql_net.get_limiter(host, initial=3, floor=0.5, ceiling=60)
+
+    history = ql_accounts.History("Leaflow")
+
+    # 并发预检全部 Cookie，失效的直接报告，不再下载首页、也不占用账号间等待
+    def check(index, account):
+        ok, reason = check_cookie(account.get("cookie", ""))
+        return ok, reason, None
+
+    checked = ql_accounts.preflight(accounts, check, "Leaflow", limiter)
+    for index, account, reason in checked.invalid:
+        name = f"账号{index + 1}"
+        result = summary.add(ql_result.Result("Leaflow", name, ql_result.INVALID, detail=reason))
+        logger.error(f"{name} 签到失败: {reason}")
+        safe_send_notify("Leaflow 签到失败", f"{name}：{ql_result.INVALID} - {reason}")
+        ql_capture.flush(account.get("cookie", ""))
+        history.record(account.get("cookie", ""), result)
+
+    # 执行顺序默认随机（QL_ORDER 可改为按历史耗时排序），上次失效的账号排在最后；
+    # 要求随机但账号太多、order() 未整体打乱时，边读边用有界缓冲打乱；QL_ORDER=env 时保持原顺序
+    ordered = ql_accounts.order(checked, history, "cookie", default="random", interval=limiter.interval)
+    if ordered.policy == "env" and (ql_accounts.ORDER or "random") == "random":
+        schedule = ql_accounts.shuffled(checked, SHUFFLE_BUFFER)
+        logger.info(f"==== 签到执行顺序: 随机（打乱缓冲 {SHUFFLE_BUFFER} 个账号）====")    
+    else:
+        schedule = ordered
         
     logger.info("==== 开始执行签到任务 ====")    
         
-    success_count = 0    
-    already_count = 0    
-    fail_count = 0    
-    total_amount = 0.0    
-        
-    for it in schedule:    
-        name = it["name"]    
+    done = 0
+    for index, account in schedule:    
+        name = f"账号{index + 1}"    
+        cookie = account.get("cookie", "")
+        done += 1
+        ql_clock.begin(name)
+        ql_log.begin("Leaflow")
+
+        # 站点熔断或剩余运行时间不足时，剩余账号直接延后，不再逐个重试
+        reason = ql_net.defer_reason(host)
+        if reason:
+            logger.warning(f"{name}: {reason}，延后到下次运行")
+            summary.add(ql_result.Result("Leaflow", name, ql_result.DEFERRED, detail=reason))
+            continue
             
-        if it["delay"] > 0:    
+        # 等待期间预热本账号的会话连接；常驻进程里按 Cookie 复用上一轮的会话
+        session = ql_session.lease(f"leaflow:{cookie}", lambda: build_session(cookie))
+        warm = ql_session.prewarm(session, [f"{BASE}/"], request_kwargs=WARM_KWARGS)
+
+        delay = random.randint(0, MAX_RANDOM_DELAY)
+        if delay > 0:    
             # 将调度延迟限制在 1-5 秒
-            bounded = max(1, min(2, int(it["delay"])))
+            bounded = max(1, min(2, delay))
             wait_with_countdown(bounded, name)    
+        warm.wait()
             
-        logger.info(f"==== {name} 开始签到 ====")    
-        logger.info(f"当前时间: {datetime.now().strftime('%H:%M:%S')}")    
+        ql_log.verbose("==== {} 开始签到 ====", name)    
+        ql_log.verbose("当前时间: {:%H:%M:%S}", now_sh())    
             
-        status, msg, amount = sign_with_retry(it["cookie"], name)    
+        try:
+            result = summary.add(sign_with_retry(cookie, name, session))
+        finally:
+            ql_session.release(session)
+        history.record(cookie, result)
+        status, msg, amount = result.status, result.detail, result.amount
             
         if status == "success":    
-            success_count += 1    
             if amount > 0:    
-                total_amount += amount    
                 logger.info(f"✅ {name} {msg}")    
                 logger.info(f"💰 本次获得: {amount} 元")    
             else:    
@@ -413,9 +508,7 @@ def main():
             safe_send_notify("Leaflow 签到成功", f"{name}：{msg}")  
             
         elif status == "already":    
-            already_count += 1    
             if amount > 0:    
-                total_amount += amount    
                 logger.info(f"ℹ️ {name} {msg}")    
             else:    
                 logger.info(f"ℹ️ {name} 今日已签到")    
@@ -423,31 +516,43 @@ def main():
             if NOTIFY_ON_ALREADY:  
                 safe_send_notify("Leaflow 签到提醒", f"{name}：{msg}")  
             
+        elif status == "deferred":
+            logger.warning(f"⏸️ {name} {msg}")
+
         else:    
-            fail_count += 1    
             logger.error(f"{name} 签到失败: {msg}")    
             safe_send_notify("Leaflow 签到失败", f"{name}：{status} - {msg}")  
+            ql_capture.flush(cookie)
             
-        if it["idx"] < len(cookie_list):    
-            time.sleep(random.uniform(1, 5))    
+        if done < len(checked):    
+            ql_clock.sleep(limiter.next_delay(), "账号间等待")    
         
     logger.info("="*50)    
     logger.info("  所有账号签到完成")    
-    logger.info(f" ✅ 成功: {success_count} | ℹ️ 已签: {already_count} | ❌ 失败: {fail_count}")    
+    logger.info(f" ✅ 成功: {summary.count(ql_result.SUCCESS)} | ℹ️ 已签: {summary.count(ql_result.ALREADY)} | ❌ 失败: {summary.failed} | ⏸️ 延后: {summary.deferred}")    
         
-    if total_amount > 0:    
-        logger.info(f" 💰 今日总计获得: {total_amount} 元")    
+    if summary.amount > 0:    
+        logger.info(f" 💰 今日总计获得: {summary.amount:g} 元")    
         
-    logger.info(f"  完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")    
+    logger.info(f"  完成时间: {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')}")    
     logger.info("="*50)    
+    summary.log()
         
-    if len(cookie_list) > 1:    
-        summary = f"签到完成\n成功: {success_count} | 已签: {already_count} | 失败: {fail_count}"    
-        if total_amount > 0:    
-            summary += f"\n今日共获得: {total_amount} 元"    
-        safe_send_notify("Leaflow 签到汇总", summary)  
+    accounts.close()
+    history.save()
+    if len(accounts) > 1:    
+        def summary_msg() -> str:
+            msg = (f"签到完成\n成功: {summary.count(ql_result.SUCCESS)} | 已签: {summary.count(ql_result.ALREADY)}"
+                   f" | 失败: {summary.failed}")
+            if summary.deferred:
+                msg += f" | 延后: {summary.deferred}"
+            if summary.amount > 0:
+                msg += f"\n今日共获得: {summary.amount:g} 元"
+            return msg
+        safe_send_notify("Leaflow 签到汇总", summary_msg)  
     
   
   
 if __name__ == "__main__":    
-    main()
\ No newline at end of file
+    ql_log.setup()
+    ql_profile.run("leaflow", main)
\ No newline at end of file
@@ -5,12 +5,20 @@ new Env('nodeseek签到')
 
 import os
 import random
-import time
-import json
-from datetime import datetime
+import re
 import cloudscraper
 from loguru import logger
 
+import ql_accounts
+import ql_clock
+import ql_log
+import ql_net
+import ql_parse
+import ql_profile
+import ql_proxy
+import ql_result
+import ql_session
+
 # ---------------- 通知模块动态加载 ----------------
 hadsend = False
 send = None
@@ -38,62 +46,80 @@ def wait_with_countdown(delay_seconds: float, task_name: str) -> None:
     if delay_seconds <= 0:
         return
     logger.info(f"{task_name} 需要等待 {format_time_remaining(int(delay_seconds))}")
-    time.sleep(delay_seconds)
+    ql_clock.sleep(delay_seconds, "启动延迟")
 
 
-def notify_user(title: str, content: str) -> None:
+def notify_user(title: str, content) -> None:
+    """content 可以是返回正文的函数，只在确实要输出时才生成"""
     if hadsend:
         try:
-            send(title, content)
+            send(title, ql_result.text(content))
             logger.info(f"通知发送完成: {title}")
         except Exception as e:
             logger.error(f"通知发送失败: {e}")
     else:
-        logger.info(f"{title}\n{content}")
+        logger.opt(lazy=True).info("{}\n{}", lambda: title, lambda: ql_result.text(content))
 
 
 def create_scraper():
-    return cloudscraper.create_scraper(
+    return ql_session.configure(cloudscraper.create_scraper(
         browser={
             'browser': 'chrome',
             'platform': 'windows',
             'desktop': True
         }
-    )
+    ))
 
 
-def parse_result_text(text: str) -> tuple[bool, str]:
+def parse_result(resp) -> tuple[bool, str]:
+    """直接解析响应字节；不是 JSON 时才解码正文作为消息"""
     try:
-        data = json.loads(text)
+        data = ql_parse.loads(resp)
     except Exception:
-        return False, text[:200]
+        return False, ql_parse.text(resp)[:200]
 
     success = bool(data.get("success"))
-    msg = data.get("message") or data.get("msg") or text[:200]
+    msg = data.get("message") or data.get("msg") or ql_parse.text(resp)[:200]
     return success, msg
 
 
+def parse_reward(msg: str) -> float:
+    """从签到消息中提取鸡腿数，如“签到收益 5 个鸡腿”"""
+    match = re.search(r'(\d+)\s*个?鸡腿', msg or '')
+    return float(match.group(1)) if match else 0.0
+
+
 def main():
-    logger.info(f"==== NodeSeek签到开始 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    logger.info(f"==== NodeSeek签到开始 - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
 
     # 随机延迟总开关：默认启用，只有 NODESEEK_RANDOM='false' 才关闭
     random_enabled = os.getenv('NODESEEK_RANDOM', 'true').lower() != 'false'
 
+    # 利用随机延迟的空档预热到 nodeseek 的连接；常驻进程里复用上一轮的 scraper（含 Cloudflare 放行 Cookie）。
+    # 配置了代理池时请求都走各账号分配到的代理，直连预热用不上，跳过
+    scraper = ql_session.lease('nodeseek', create_scraper)
+    targets = ["https://www.nodeseek.com/api/attendance"] if ql_proxy.get_pool() is None else []
+    warm = ql_session.prewarm(scraper, targets)
+
     # 整体短随机延迟（与其它任务一致）
     overall_delay = random.randint(1, 3) if random_enabled else 0
     if overall_delay > 0:
         logger.info(f"随机延迟: {format_time_remaining(overall_delay)}")
         wait_with_countdown(overall_delay, "NodeSeek签到")
+    warm.wait()
 
-    cookies_env = os.getenv('NODESEEK_COOKIE')
-    if not cookies_env.strip():
+    cookies_env = os.getenv('NODESEEK_COOKIE') or ''
+    # 账号很多时改用 JSON Lines 账号文件，每行 {"cookie": "..."} 或一行 Cookie
+    accounts_file = os.getenv('NODESEEK_ACCOUNTS_FILE')
+    if not cookies_env.strip() and not accounts_file:
         err = "未找到NODESEEK_COOKIE环境变量"
         logger.error(err)
         notify_user("NodeSeek 签到失败", err)
+        ql_session.release(scraper)
         return
 
-    cookie_list = [c.strip() for c in cookies_env.split('&') if c.strip()]
-    logger.info(f"共发现 {len(cookie_list)} 个账号")
+    accounts = ql_accounts.source(accounts_file, 'cookie', (c.strip() for c in cookies_env.split('&') if c.strip()))
+    logger.info(f"共发现 {len(accounts)} 个账号（来源: {accounts.describe()}）")
 
     url = f"https://www.nodeseek.com/api/attendance?random={'true' if random_enabled else 'false'}"
     headers = {
@@ -105,38 +131,55 @@ def main():
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
     }
 
-    success_count = 0
-    total_count = len(cookie_list)
-
-    scraper = create_scraper()
+    total_count = len(accounts)
+    summary = ql_result.Summary("NodeSeek")
+    host = ql_net.host_of(url)
+    limiter = ql_net.get_limiter(host, initial=10, floor=2, ceiling=120)
+    # 按历史耗时与失败情况安排顺序，上次失效的账号排在最后
+    history = ql_accounts.History("NodeSeek")
+    ordered = ql_accounts.order(accounts, history, 'cookie', interval=limiter.interval)
 
-    for idx, cookie in enumerate(cookie_list):
+    for idx, account in ordered:
         display_user = f"账号{idx + 1}"
-
-        if idx > 0:
-            delay_between = random.uniform(5, 15) if random_enabled else 0
+        cookie = account.get('cookie', '')
+        ql_clock.begin(display_user)
+        ql_log.begin("NodeSeek")
+
+        # 站点熔断或剩余运行时间不足时，剩余账号直接延后，不再逐个等待超时
+        reason = ql_net.defer_reason(host)
+        if reason:
+            logger.warning(f"{display_user}: {reason}，延后到下次运行")
+            summary.add(ql_result.Result("NodeSeek", display_user, ql_result.DEFERRED, detail=reason))
+            continue
+
+        if idx != ordered.start:
+            delay_between = limiter.next_delay() if random_enabled else 0
             if delay_between > 0:
                 logger.info(f"随机等待 {delay_between:.1f} 秒后处理下一个账号...")
-                time.sleep(delay_between)
+                ql_clock.sleep(delay_between, "账号间等待")
 
-        logger.info(f"==== {display_user} 开始签到 ====")
-        logger.info(f"当前时间: {datetime.now().strftime('%H:%M:%S')}")
+        ql_log.verbose("==== {} 开始签到 ====", display_user)
+        ql_log.verbose("当前时间: {:%H:%M:%S}", ql_clock.now())
 
         short_delay = random.uniform(0, 1) if random_enabled else 0
         if short_delay > 0:
             logger.info(f"短暂随机延迟: {short_delay:.1f} 秒")
-            time.sleep(short_delay)
+            ql_clock.sleep(short_delay, "短暂延迟")
 
+        # 所有账号共用一个 scraper，配置了代理池时切换到该账号固定的代理
+        ql_proxy.bind(scraper, cookie)
         cookie_dict = {}
         for item in cookie.split(';'):
             if '=' in item:
                 key, value = item.split('=', 1)
                 cookie_dict[key.strip()] = value.strip()
 
+        started = ql_clock.monotonic()
+        retries = ql_net.retries()
         try:
-            resp = scraper.post(url, headers=headers, cookies=cookie_dict, timeout=30)
-            ok, msg = parse_result_text(resp.text)
-            logger.debug(f"{display_user} 响应状态码: {resp.status_code}")
+            resp = ql_net.request(scraper, 'POST', url, headers=headers, cookies=cookie_dict, timeout=30)
+            ok, msg = parse_result(resp)
+            logger.debug("{} 响应状态码: {}", display_user, resp.status_code)
 
             def is_already_signed(message: str) -> bool:
                 if not isinstance(message, str):
@@ -152,33 +195,54 @@ def main():
                 )
 
             already_signed = is_already_signed(msg)
+            latency = ql_clock.monotonic() - started
+            attempts = 1 + ql_net.retries() - retries
             if already_signed or (resp.status_code == 200 and ok):
-                success_count += 1
                 if ok and not already_signed:
+                    result = summary.add(ql_result.Result("NodeSeek", display_user, ql_result.SUCCESS,
+                                                          amount=parse_reward(msg), latency=latency, attempts=attempts,
+                                                          detail=msg))
                     logger.info(f"{display_user} 签到成功: {msg}")
                     notify_user("NodeSeek 签到", f"{display_user} 签到成功：{msg}")
                 else:
+                    result = summary.add(ql_result.Result("NodeSeek", display_user, ql_result.ALREADY,
+                                                          latency=latency, attempts=attempts, detail=msg))
                     logger.info(f"{display_user} 今日已签到: {msg}")
                     notify_user("NodeSeek 签到", f"{display_user} 今日已签到：{msg}")
             else:
+                result = summary.add(ql_result.Result("NodeSeek", display_user, ql_result.FAILED,
+                                                      latency=latency, attempts=attempts, detail=msg))
                 logger.error(f"{display_user} 签到失败: {msg}")
                 notify_user("NodeSeek 签到失败", f"{display_user} 签到失败：{msg}")
+        except ql_net.DeferredError as e:
+            logger.warning(f"{display_user}: {e}，延后到下次运行")
+            result = summary.add(ql_result.Result("NodeSeek", display_user, ql_result.DEFERRED, detail=str(e)))
         except Exception as e:
+            result = summary.add(ql_result.Result("NodeSeek", display_user, ql_result.FAILED,
+                                                  latency=ql_clock.monotonic() - started,
+                                                  attempts=1 + ql_net.retries() - retries, detail=str(e)))
             logger.error(f"{display_user} 签到异常: {e}")
             notify_user("NodeSeek 签到失败", f"{display_user} 签到异常：{e}")
+        history.record(cookie, result)
 
+    accounts.close()
+    history.save()
+    ql_session.release(scraper)
     if total_count > 1:
-        summary = (
+        notify_user("NodeSeek 签到汇总", lambda: (
             f"NodeSeek签到汇总\n\n"
             f"总计: {total_count}个账号\n"
-            f"成功: {success_count}个\n"
-            f"失败: {total_count - success_count}个\n"
-            f"完成时间: {datetime.now().strftime('%m-%d %H:%M')}"
-        )
-        notify_user("NodeSeek 签到汇总", summary)
+            f"成功: {summary.ok}个\n"
+            f"失败: {total_count - summary.ok - summary.deferred}个\n"
+            f"延后: {summary.deferred}个\n"
+            + (f"鸡腿: {summary.amount:g}个\n" if summary.amount else "")
+            + f"完成时间: {ql_clock.now().strftime('%m-%d %H:%M')}"
+        ))
 
-    logger.info(f"==== NodeSeek签到完成 - 成功{success_count}/{total_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    summary.log()
+    logger.info(f"==== NodeSeek签到完成 - 成功{summary.ok}/{total_count} - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ql_log.setup()
+    ql_profile.run("nodeseek", main)
\ No newline at end of file
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共账号来源：环境变量或 JSON Lines 账号文件，按需逐个产出账号
+
+账号文件每行一个账号，可以是 JSON 对象（如 {"cookie": "...", "new_api_user": "1"}、
+{"email": "...", "passwd": "..."}），也可以是一行纯文本（视为脚本的主字段，如 Cookie）；
+空行和 # 开头的行会被忽略。文件通过 mmap 建立行偏移索引，不会整体读入内存，
+QL_SHARD / QL_ACCOUNT_RANGE 可以把同一个大文件切给多个任务分别处理。
+preflight() 在逐个签到之前并发检查全部凭据，失效的账号不再进入按节奏等待的签到阶段；
+History 记录每个账号的耗时与失败历史，order() 据此安排本次的执行顺序。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from loguru import logger
+
+import ql_cassette
+import ql_clock
+import ql_log
+import ql_net
+import ql_result
+import ql_state
+
+SHARD = os.getenv("QL_SHARD", "")  # k/n：共 n 片中的第 k 片（从 1 开始）
+ACCOUNT_RANGE = os.getenv("QL_ACCOUNT_RANGE", "")  # start:end：账号下标范围（从 0 开始，左闭右开）
+PREFLIGHT = os.getenv("QL_PREFLIGHT", "true").lower() != "false"  # 签到前并发预检凭据
+PREFLIGHT_CONCURRENCY = int(os.getenv("QL_PREFLIGHT_CONCURRENCY", "4"))
+PREFLIGHT_MAX = int(os.getenv("QL_PREFLIGHT_MAX", "500"))  # 账号数超过该值时不预检也不排序，保持逐个读取
+ORDER = os.getenv("QL_ORDER", "").lower()  # auto / lpt / spt / env / random，留空时用脚本自己的默认
+HISTORY_TTL = 30 * 86400  # 超过 30 天没出现的账号从历史中移除
+
+
+def shard_range(total: int) -> tuple[int, int]:
+    """按 QL_ACCOUNT_RANGE 或 QL_SHARD 计算本任务负责的账号下标范围"""
+    try:
+        if ACCOUNT_RANGE:
+            start, _, stop = ACCOUNT_RANGE.partition(":")
+            start = int(start) if start.strip() else 0
+            stop = int(stop) if stop.strip() else total
+            return max(0, start), min(total, stop)
+        if SHARD:
+            k, _, n = SHARD.partition("/")
+            k, n = int(k), int(n)
+            if not 1 <= k <= n:
+                raise ValueError(SHARD)
+            size = -(-total // n)
+            return min(total, (k - 1) * size), min(total, k * size)
+    except ValueError:
+        logger.warning(f"分片配置无效（QL_SHARD={SHARD!r}, QL_ACCOUNT_RANGE={ACCOUNT_RANGE!r}），处理全部账号")
+    return 0, total
+
+
+def parse_line(raw: bytes, key: str) -> dict:
+    text = raw.decode("utf-8").strip()
+    if text.startswith("{"):
+        return json.loads(text)
+    return {key: text}
+
+
+class AccountFile:
+    """JSON Lines 账号文件：建立一次行偏移索引（每个账号 8 字节），按下标随机读取"""
+
+    def __init__(self, path: str, key: str) -> None:
+        self.path = path
+        self.key = key
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.offsets = array("Q")
+        self._index(size)
+
+    def _index(self, size: int) -> None:
+        data, pos = self._map, 0
+        while pos < size:
+            end = data.find(b"\n", pos)
+            if end < 0:
+                end = size
+            line = data[pos:end].strip()
+            if line and not line.startswith(b"#"):
+                self.offsets.append(pos)
+            pos = end + 1
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> dict:
+        pos = self.offsets[index]
+        end = self._map.find(b"\n", pos)
+        return parse_line(self._map[pos:end if end >= 0 else len(self._map)], self.key)
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class AccountSource:
+    """账号来源：len() 为本分片账号数，迭代时惰性产出 (全局下标, 账号字典)"""
+
+    def __init__(self, key: str, file: Optional[AccountFile] = None, items: Optional[list] = None) -> None:
+        self.key = key
+        self.file = file
+        self.items = items or []
+        self.start, self.stop = shard_range(len(file) if file is not None else len(self.items))
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        for index in range(self.start, self.stop):
+            try:
+                account = self.file[index] if self.file is not None else self.items[index]
+            except (ValueError, UnicodeDecodeError) as e:
+                logger.error(f"账号文件第 {index + 1} 个账号解析失败，已跳过: {e}")
+                continue
+            # 账号文件里的凭据不在环境变量中，录制磁带时要单独登记才会被抹去
+            ql_cassette.add_secrets(*account.values())
+            yield index, account
+
+    def describe(self) -> str:
+        origin = f"账号文件 {self.file.path}" if self.file is not None else "环境变量"
+        total = len(self.file) if self.file is not None else len(self.items)
+        if len(self) == total:
+            return origin
+        return f"{origin}（分片 {self.start + 1}-{self.stop}/{total}）"
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+def source(path: Optional[str], key: str, items: Iterable = ()) -> AccountSource:
+    """配置了账号文件时从文件读取，否则使用环境变量解析出的 items
+
+    items 的元素可以是字符串（作为主字段 key）或字典。
+    """
+    if path and path.strip():
+        return AccountSource(key, file=AccountFile(path.strip(), key))
+    return AccountSource(key, items=[i if isinstance(i, dict) else {key: i} for i in items])
+
+
+def shuffled(iterable: Iterable, buffer_size: int = 64) -> Iterator:
+    """有界缓冲随机打乱：内存只保留 buffer_size 个元素，顺序随机但不需要先读完全部账号"""
+    it = iter(iterable)
+    buffer = list(islice(it, buffer_size))
+    for item in it:
+        pick = random.randrange(len(buffer))
+        yield buffer[pick]
+        buffer[pick] = item
+    random.shuffle(buffer)
+    yield from buffer
+
+
+class Checked:
+    """预检结果：迭代时按原顺序产出通过或无法判定的 (全局下标, 账号字典)
+
+    invalid 为确认失效的 (全局下标, 账号字典, 原因)；carry 为预检阶段留给签到阶段复用的对象
+    （如已登录的签到器），按下标索引。start 为第一个实际产出账号的下标，供“非首个账号才等待”的判断使用
+    （顺序可能被 order() 调整、开头的账号可能解析失败被跳过，应判断 index != start）；惰性产出时为 None，
+    产出第一个账号时填上。policy 为 order() 实际采用的执行顺序策略，未经 order() 时为 env。
+    """
+
+    def __init__(self, kept, size: int, start: Optional[int] = None, invalid: Optional[list] = None,
+                 carry: Optional[dict] = None, policy: str = "env") -> None:
+        self.kept = kept
+        self.size = size
+        self.start = start
+        self.invalid = invalid or []
+        self.carry = carry or {}
+        self.policy = policy
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        for item in self.kept:
+            if self.start is None:
+                self.start = item[0]
+            yield item
+
+
+def preflight(accounts: AccountSource, check, site: str, limiter: Optional[ql_net.AimdLimiter] = None) -> Checked:
+    """用每个站点最便宜的带凭据请求并发检查全部账号
+
+    check(index, account) 返回 (结论, 原因, 留给签到阶段的对象)，结论 True 为有效、False 为失效、None 为无法判定；
+    无法判定（网络错误、熔断、预算不足等）的账号照常进入签到阶段。
+    并发数不超过 QL_PREFLIGHT_CONCURRENCY；传入 limiter 时还受站点学到的并发窗口限制，站点返回 403/429 会随之收紧。
+    关闭预检、只有一个账号或账号数超过 QL_PREFLIGHT_MAX 时不预检，直接逐个产出。
+    """
+    total = len(accounts)
+    if not PREFLIGHT or total < 2 or total > PREFLIGHT_MAX:
+        return Checked(accounts, total)
+
+    def run(item):
+        index, account = item
+        ql_clock.begin(f"预检{index + 1}")
+        ql_log.begin(f"{site}预检")
+        try:
+            if limiter is None:
+                return item, check(index, account)
+            with limiter.slot():
+                return item, check(index, account)
+        except ql_net.DeferredError as e:
+            return item, (None, str(e), None)
+        except Exception as e:
+            logger.debug(f"{site} 账号{index + 1} 预检异常: {e}")
+            return item, (None, f"{e.__class__.__name__}: {e}", None)
+
+    started = ql_clock.monotonic()
+    kept, invalid, carry = [], [], {}
+    unknown = 0
+    with ThreadPoolExecutor(max_workers=max(1, PREFLIGHT_CONCURRENCY), thread_name_prefix="ql-preflight") as pool:
+        for (index, account), (verdict, reason, obj) in pool.map(run, accounts):
+            if verdict is False:
+                invalid.append((index, account, reason))
+                continue
+            unknown += verdict is None
+            kept.append((index, account))
+            if obj is not None:
+                carry[index] = obj
+    logger.info(f"{site} 预检: {total} 个账号，有效 {len(kept) - unknown}，失效 {len(invalid)}，"
+                f"未能判定 {unknown}，用时 {ql_clock.monotonic() - started:.1f}秒")
+    return Checked(kept, len(kept), kept[0][0] if kept else None, invalid, carry)
+
+
+class History:
+    """账号历史：耗时与失败率的指数滑动平均、连续失效次数，按站点保存在状态目录，凭据只以哈希形式落盘"""
+
+    def __init__(self, site: str) -> None:
+        self.site = site
+        self.name = f"history_{site.lower()}"
+        now = ql_clock.time_()
+        self.entries = {k: v for k, v in ql_state.load(self.name, {}).items() if now - v.get("t", 0) < HISTORY_TTL}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_of(credential: str) -> str:
+        return hashlib.sha256(credential.encode("utf-8")).hexdigest()[:16]
+
+    def record(self, credential: str, result: ql_result.Result) -> None:
+        """记录一个账号本次的结果；延后的账号没有实际执行，不计入"""
+        if result.status == ql_result.DEFERRED:
+            return
+        failed = result.status in (ql_result.FAILED, ql_result.INVALID)
+        with self._lock:
+            entry = self.entries.setdefault(self.key_of(credential), {"l": None, "f": 0.0, "i": 0})
+            entry["f"] = round(0.7 * entry["f"] + (0.3 if failed else 0.0), 4)
+            entry["i"] = entry["i"] + 1 if result.status == ql_result.INVALID else 0
+            if result.latency > 0:
+                latency = result.latency
+                entry["l"] = round(latency if entry["l"] is None else 0.7 * entry["l"] + 0.3 * latency, 3)
+            entry["t"] = int(ql_clock.time_())
+
+    def expected(self, key: str, fallback: float) -> float:
+        """预计耗时：平均耗时按失败率放大（失败的账号往往还要重试）"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return fallback
+        return (entry["l"] if entry["l"] is not None else fallback) * (1 + 2 * entry["f"])
+
+    def likely_invalid(self, key: str) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry["i"] > 0
+
+    def fallback(self) -> float:
+        """没有历史的账号按已知账号耗时的中位数估计"""
+        known = sorted(e["l"] for e in self.entries.values() if e["l"] is not None)
+        return known[len(known) // 2] if known else 1.0
+
+    def save(self) -> None:
+        with self._lock:
+            data = dict(self.entries)
+        ql_state.save(self.name, data)
+
+
+def order(accounts, history: History, field: str, default: str = "auto", interval: float = 0.0) -> Checked:
+    """按历史安排执行顺序，返回 Checked（保留预检结果中的 invalid 与 carry，policy 为实际采用的策略）
+
+    策略（QL_ORDER，未设置时用 default）：
+    - lpt：预计耗时长的先做（并发受限时总完成时间最短，慢账号与易失败账号也更早开始、留足重试时间）；
+    - spt：预计耗时短的先做（预算不够全部完成时，能在预算内完成的账号最多）；
+    - auto：预计总耗时（含账号间平均间隔 interval）超过剩余运行预算时用 spt，否则用 lpt；
+    - random：随机顺序；env：保持原顺序。
+    除 env 外，上次判定为失效的账号都排在最后。账号只有一个或超过 QL_PREFLIGHT_MAX 个时保持原顺序，
+    此时 policy 为 env（账号太多时如需随机，由调用方边读边打乱）。
+    """
+    policy = ORDER or default
+    total = len(accounts)
+    if policy == "env" or total < 2 or total > PREFLIGHT_MAX:
+        if isinstance(accounts, Checked):
+            return accounts
+        return Checked(accounts, total)
+
+    items = list(accounts)
+    keys = {index: history.key_of(account.get(field, "")) for index, account in items}
+    fallback = history.fallback()
+    cost = {index: history.expected(key, fallback) for index, key in keys.items()}
+    if policy == "auto":
+        needed = sum(cost.values()) + interval * (len(items) - 1)
+        policy = "spt" if needed > ql_net.deadline().remaining() else "lpt"
+    if policy == "random":
+        random.shuffle(items)
+    elif policy in ("lpt", "spt"):
+        items.sort(key=lambda item: cost[item[0]], reverse=policy == "lpt")
+    suspects = sum(history.likely_invalid(key) for key in keys.values())
+    if suspects:
+        items.sort(key=lambda item: history.likely_invalid(keys[item[0]]))  # 稳定排序，其余账号相对顺序不变
+    names = {"lpt": "预计耗时长的优先", "spt": "预计耗时短的优先", "random": "随机"}
+    logger.info(f"{history.site} 执行顺序: {names.get(policy, policy)}"
+                + (f"，{suspects} 个上次失效的账号排在最后" if suspects else ""))
+    return Checked(items, len(items), items[0][0] if items else None, getattr(accounts, "invalid", None),
+                   getattr(accounts, "carry", None), policy)
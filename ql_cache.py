@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共 HTTP 缓存：只读页面的条件请求（ETag / Last-Modified）
+
+响应体按“账号 + URL”分开存放在磁盘上，带登录态的页面不会在账号之间串用；
+超过容量上限时按最近最少使用（LRU）淘汰。命中只在内存里刷新访问时间，索引在退出或需要淘汰时
+才合并写回（加文件锁，同时运行的分片进程不会互相覆盖对方的条目）。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+
+from loguru import logger
+
+import ql_clock
+import ql_net
+import ql_state
+
+HTTP_CACHE = os.getenv("QL_HTTP_CACHE", "true").lower() != "false"
+CACHE_DIR = os.getenv("QL_HTTP_CACHE_DIR") or ql_state.path_of("http_cache")
+CACHE_MAX_BYTES = int(float(os.getenv("QL_HTTP_CACHE_MB", "20")) * 1024 * 1024)
+
+# 304 响应只带验证头，正文相关的头从缓存条目恢复
+_STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class HttpCache:
+    """磁盘 HTTP 缓存：索引存于 ql_state，正文每个条目一个文件"""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index: dict[str, dict] = ql_state.load("http_cache", {})
+        self.hits = 0
+        self.misses = 0
+        self._dirty: set[str] = set()  # 本进程新增或访问过、尚未写回的条目
+        self._removed: set[str] = set()  # 本进程发现正文丢失而删除的条目
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(account: str, url: str) -> str:
+        """账号凭据只参与哈希，不落盘"""
+        return hashlib.sha256(f"{account}\0{url}".encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.body")
+
+    def validators(self, key: str) -> dict:
+        entry = self.index.get(key)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("ETag"):
+            headers["If-None-Match"] = entry["ETag"]
+        if entry.get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["Last-Modified"]
+        return headers
+
+    def read(self, key: str):
+        """读取缓存正文并刷新访问时间，文件丢失时删除条目"""
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None, None
+            try:
+                with open(self._body_path(key), "rb") as f:
+                    body = f.read()
+            except OSError:
+                self.index.pop(key, None)
+                self._dirty.discard(key)
+                self._removed.add(key)
+                return None, None
+            entry["atime"] = ql_clock.time_()
+            self._dirty.add(key)
+            return body, entry
+
+    def store(self, key: str, resp, body: bytes) -> None:
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = f"{self._body_path(key)}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, self._body_path(key))
+            except OSError as e:
+                logger.debug(f"HTTP 缓存写入失败: {e}")
+                return
+            entry = {name: resp.headers.get(name) for name in _STORED_HEADERS if resp.headers.get(name)}
+            entry.update(size=len(body), atime=ql_clock.time_(), encoding=getattr(resp, "encoding", None))
+            self.index[key] = entry
+            self._dirty.add(key)
+            self._removed.discard(key)
+            over = sum(e.get("size", 0) for e in self.index.values()) > self.max_bytes
+        if over:
+            self.save()
+
+    def _evict(self, index: dict) -> None:
+        total = sum(entry.get("size", 0) for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k].get("atime", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key).get("size", 0)
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def save(self) -> None:
+        """把本进程的改动合并进磁盘上的索引（其他进程写入的条目保留），超出容量时淘汰"""
+        with self._lock:
+            if not self._dirty and not self._removed:
+                return
+            dirty = {key: self.index[key] for key in self._dirty if key in self.index}
+            removed = set(self._removed)
+
+            def merge(disk) -> dict:
+                merged = disk if isinstance(disk, dict) else {}
+                for key in removed:
+                    merged.pop(key, None)
+                for key, entry in dirty.items():
+                    current = merged.get(key)
+                    # 其他进程更晚访问过同一条目时保留较晚的访问时间
+                    if current is not None and current.get("atime", 0) > entry.get("atime", 0):
+                        entry = dict(entry, atime=current["atime"])
+                    merged[key] = entry
+                self._evict(merged)
+                return merged
+
+            self.index = ql_state.update("http_cache", merge, {})
+            self._dirty.clear()
+            self._removed.clear()
+
+
+def _revive(resp, body: bytes, entry: dict):
+    """把 304 响应改写为带缓存正文的 200 响应（兼容 requests 与 curl_cffi）"""
+    resp.status_code = 200
+    if hasattr(resp, "_content"):
+        resp._content = body
+    else:
+        resp.content = body
+    for name in _STORED_HEADERS:
+        if entry.get(name) and name not in resp.headers:
+            resp.headers[name] = entry[name]
+    if entry.get("encoding"):
+        resp.encoding = entry["encoding"]
+    resp.from_cache = True
+    return resp
+
+
+_cache = None
+
+
+def get_cache() -> HttpCache:
+    global _cache
+    if _cache is None:
+        _cache = HttpCache()
+        atexit.register(_cache.save)
+    return _cache
+
+
+def save() -> None:
+    """写回缓存索引（常驻进程每轮运行后调用）"""
+    if _cache is not None:
+        _cache.save()
+
+
+def get(session, url: str, *, account: str, **kwargs):
+    """带条件请求的 GET：命中 304 时返回缓存正文，其余参数同 ql_net.request"""
+    if not HTTP_CACHE:
+        return ql_net.request(session, "GET", url, **kwargs)
+
+    cache = get_cache()
+    key = cache.key(account, url)
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers.update(cache.validators(key))
+    resp = ql_net.request(session, "GET", url, headers=headers, **kwargs)
+
+    if resp.status_code == 304:
+        body, entry = cache.read(key)
+        if body is not None:
+            cache.hits += 1
+            return _revive(resp, body, entry)
+        # 缓存正文已丢失，去掉验证头重新拉取
+        for name in ("If-None-Match", "If-Modified-Since"):
+            headers.pop(name, None)
+        resp = ql_net.request(session, "GET", url, headers=headers, **kwargs)
+
+    cache.misses += 1
+    cacheable = (
+        resp.status_code == 200
+        and (resp.headers.get("ETag") or resp.headers.get("Last-Modified"))
+        and "no-store" not in (resp.headers.get("Cache-Control") or "").lower()
+        and str(resp.url) == url  # 被重定向（如跳转登录页）的结果不缓存
+    )
+    if cacheable:
+        cache.store(key, resp, resp.content)
+    return resp
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共调试抓包：每个账号只保留最近几次请求/响应，后台压缩，失败或退出时才落盘
+
+QL_CAPTURE=true（leaflow 的 DEBUG_MODE=true 也会开启）后，用 attach() 包装过的会话每完成一个请求，
+就把请求行、请求头、响应状态、响应头和（截断后的）正文交给后台线程压缩，放进该账号的环形缓冲，
+只保留最近 QL_CAPTURE_KEEP 条。账号失败时调用 flush() 写出该账号的缓冲，进程退出时写出其余账号的缓冲。
+文件为多段 gzip 拼接的 JSON Lines（可直接 zcat 查看），保存在 QL_CAPTURE_DIR（默认状态目录下的 capture/），
+只保留最新的 QL_CAPTURE_FILES 个文件。Cookie、Authorization 等请求头和表单里的密码会被打码，文件名里的账号只用哈希。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+
+from loguru import logger
+
+import ql_clock
+import ql_state
+
+ENABLED = os.getenv("QL_CAPTURE", "false").lower() == "true"
+KEEP = int(os.getenv("QL_CAPTURE_KEEP", "5"))  # 每个账号保留的最近请求数
+MAX_ACCOUNTS = 50  # 内存中最多保留多少个账号的缓冲，超出时丢弃最久未用的
+MAX_FILES = int(os.getenv("QL_CAPTURE_FILES", "100"))  # 抓包目录最多保留的文件数
+BODY_LIMIT = int(os.getenv("QL_CAPTURE_BODY_BYTES", str(256 * 1024)))  # 单个正文最多保存的字节数
+CAPTURE_DIR = os.getenv("QL_CAPTURE_DIR") or ql_state.path_of("capture")
+
+SENSITIVE_HEADERS = frozenset({"cookie", "set-cookie", "authorization", "x-api-key", "proxy-authorization"})
+_SENSITIVE_FIELDS = re.compile(r"((?:^|&)(?:passwd|password|pwd)=)[^&]*", re.I)
+
+
+def enable() -> None:
+    """在运行中开启抓包（如脚本自己的调试开关），须在 attach() 之前调用"""
+    global ENABLED
+    ENABLED = True
+
+
+def _account_id(account: str) -> str:
+    return hashlib.sha256(account.encode("utf-8")).hexdigest()[:12]
+
+
+def _headers(headers) -> dict:
+    return {k: ("***" if k.lower() in SENSITIVE_HEADERS else v) for k, v in (headers or {}).items()}
+
+
+def _text(body) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8", errors="replace")
+    if not isinstance(body, bytes):
+        return f"<{type(body).__name__}>"
+    text = body[:BODY_LIMIT].decode("utf-8", errors="replace")
+    return text + f"\n<截断，共 {len(body)} 字节>" if len(body) > BODY_LIMIT else text
+
+
+class Recorder:
+    """后台线程负责压缩与写文件；调用方只做一次入队，不在请求路径上做压缩和磁盘 IO"""
+
+    def __init__(self) -> None:
+        self.rings: "OrderedDict[str, tuple[str, deque]]" = OrderedDict()  # 账号哈希 -> (站点, 压缩后的记录)
+        self.files = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._worker, name="ql-capture", daemon=True).start()
+
+    def _worker(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                task()
+            except Exception as e:
+                logger.debug(f"抓包处理失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def record(self, site: str, account: str, entry: dict) -> None:
+        self._queue.put(lambda: self._store(site, _account_id(account), entry))
+
+    def _store(self, site: str, key: str, entry: dict) -> None:
+        blob = gzip.compress((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"), compresslevel=6)
+        with self._lock:
+            if key in self.rings:
+                self.rings.move_to_end(key)
+            else:
+                self.rings[key] = (site, deque(maxlen=KEEP))
+                if len(self.rings) > MAX_ACCOUNTS:
+                    self.rings.popitem(last=False)
+            self.rings[key][1].append(blob)
+
+    def flush(self, account: Optional[str] = None) -> None:
+        """把指定账号（None 为全部账号）的缓冲交给后台线程写出"""
+        self._queue.put(lambda: self._write(None if account is None else _account_id(account)))
+
+    def _write(self, key: Optional[str]) -> None:
+        with self._lock:
+            keys = list(self.rings) if key is None else [key] if key in self.rings else []
+            taken = [(k, *self.rings.pop(k)) for k in keys]
+        if not taken:
+            return
+        os.makedirs(CAPTURE_DIR, exist_ok=True)
+        for k, site, blobs in taken:
+            self._seq += 1
+            name = f"{site}-{k}-{ql_clock.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._seq}.jsonl.gz"
+            path = os.path.join(CAPTURE_DIR, name)
+            with open(path, "wb") as f:
+                for blob in blobs:
+                    f.write(blob)
+            self.files += 1
+            logger.debug(f"[抓包] {site} 最近 {len(blobs)} 个请求已保存到: {path}")
+        self._prune()
+
+    @staticmethod
+    def _prune() -> None:
+        try:
+            names = [n for n in os.listdir(CAPTURE_DIR) if n.endswith(".jsonl.gz")]
+        except OSError:
+            return
+        if len(names) <= MAX_FILES:
+            return
+        paths = sorted((os.path.join(CAPTURE_DIR, n) for n in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        """退出时写出剩余缓冲并等待后台线程处理完"""
+        self.flush()
+        self._queue.join()
+        if self.files:
+            logger.info(f"抓包: 写出 {self.files} 个文件到 {CAPTURE_DIR}")
+
+
+_recorder: Optional[Recorder] = None
+_recorder_lock = threading.Lock()
+
+
+def recorder() -> Optional[Recorder]:
+    """当前进程的抓包记录器；未开启抓包时返回 None"""
+    global _recorder
+    if not ENABLED:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder()
+            atexit.register(_recorder.close)
+        return _recorder
+
+
+def _wrap_request(session, rec: Recorder) -> None:
+    original = session.request
+
+    def request(method, url, *args, **kwargs):
+        started = ql_clock.monotonic()
+        entry = {"time": ql_clock.now().isoformat(timespec="seconds"), "method": method, "url": url}
+        data = kwargs.get("data")
+        if isinstance(data, dict):
+            data = "&".join(f"{k}={v}" for k, v in data.items())
+        if isinstance(data, (bytes, str)):
+            text = _text(data)
+            entry["request_body"] = _SENSITIVE_FIELDS.sub(r"\1***", text)
+        try:
+            resp = original(method, url, *args, **kwargs)
+        except Exception as e:
+            entry.update(error=f"{e.__class__.__name__}: {e}", elapsed=round(ql_clock.monotonic() - started, 3))
+            rec.record(session._ql_capture_site, session._ql_capture_account, entry)
+            raise
+        request_headers = getattr(getattr(resp, "request", None), "headers", None) or session.headers
+        entry.update(
+            elapsed=round(ql_clock.monotonic() - started, 3),
+            request_headers=_headers(request_headers),
+            status=resp.status_code,
+            response_headers=_headers(resp.headers),
+            # 流式请求的正文由调用方按需读取，这里不强行下载
+            body=None if kwargs.get("stream") else _text(resp.content),
+        )
+        rec.record(session._ql_capture_site, session._ql_capture_account, entry)
+        return resp
+
+    session.request = request
+
+
+def attach(session, site: str, account: str):
+    """让会话的请求进入该账号的抓包缓冲，返回原会话；未开启抓包时原样返回
+
+    可对同一会话重复调用（如常驻进程复用的会话），只会包装一次。
+    """
+    rec = recorder()
+    if rec is None:
+        return session
+    if getattr(session, "_ql_capture_site", None) is None:
+        _wrap_request(session, rec)
+    session._ql_capture_site = site
+    session._ql_capture_account = account
+    return session
+
+
+def flush(account: str) -> None:
+    """账号失败时写出它最近的请求记录；未开启抓包时什么也不做"""
+    rec = recorder()
+    if rec is not None:
+        rec.flush(account)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共录制/回放：把 HTTP 交互录成磁带文件，离线重放完整的 main() 流程
+
+QL_CASSETTE=record 时真实请求照常发出，同时记录每次交互；QL_CASSETTE=replay 时不联网，
+按“方法 + 路径”依次返回录制的响应。录制内容会抹去 Cookie、API 密钥、密码等敏感信息。
+磁带为 gzip 压缩的 JSON Lines，默认按脚本名保存在状态目录的 cassettes/ 下。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import base64
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from loguru import logger
+
+import ql_state
+
+MODE = os.getenv("QL_CASSETTE", "").lower()  # record / replay，留空关闭
+CASSETTE_DIR = os.getenv("QL_CASSETTE_DIR") or ql_state.path_of("cassettes")
+CASSETTE_NAME = os.getenv("QL_CASSETTE_NAME") or os.path.splitext(os.path.basename(sys.argv[0] or "session"))[0]
+
+# 账号凭据所在的环境变量，录制时其中的值一律替换；账号文件里的凭据由 ql_accounts 读取时经 add_secrets 登记
+SECRET_ENVS = ("ANYROUTER_COOKIE", "ANYROUTER_NEW_API_USER", "IKUUU_EMAIL", "IKUUU_PASSWD",
+               "LEAFLOW_COOKIE", "NODESEEK_COOKIE", "RAINYUN_API_KEY")
+SECRET_HEADERS = frozenset({"cookie", "set-cookie", "authorization", "x-api-key", "new-api-user", "x-csrf-token"})
+SECRET_FIELDS = frozenset({"passwd", "password", "email", "token", "_token", "csrf"})
+KEPT_HEADERS = ("Content-Type", "Location", "ETag", "Last-Modified", "Retry-After", "Set-Cookie")
+MASK = "***"
+
+
+class CassetteMiss(Exception):
+    """回放时磁带中没有匹配的交互"""
+
+
+def _expand(raw: str) -> set[str]:
+    """一个凭据值本身，以及按 & , ; 换行拆开的各段和 Cookie 形式 k=v 的值部分"""
+    values = set()
+    for part in raw.replace("\n", "&").replace(",", "&").replace(";", "&").split("&"):
+        part = part.strip()
+        values.add(part)
+        if "=" in part:
+            values.add(part.split("=", 1)[1].strip())
+    return values
+
+
+def _ordered(values: set[str]) -> list[str]:
+    # 先替换长的，避免短值截断长值
+    return sorted((v for v in values if len(v) >= 6), key=len, reverse=True)
+
+
+def _secret_values() -> list[str]:
+    values = set()
+    for name in SECRET_ENVS:
+        values |= _expand(os.getenv(name) or "")
+    return _ordered(values)
+
+
+def scrub_text(text: str, secrets: list[str]) -> str:
+    for value in secrets:
+        text = text.replace(value, MASK)
+    return text
+
+
+def _scrub_query(query: str) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(k, MASK if k.lower() in SECRET_FIELDS else v) for k, v in pairs])
+
+
+def match_key(method: str, url: str) -> str:
+    """回放匹配键：忽略协议、主机和端口，录制时的替身地址与回放时的地址可以不同"""
+    parts = urlsplit(url)
+    query = f"?{_scrub_query(parts.query)}" if parts.query else ""
+    return f"{method.upper()} {parts.path or '/'}{query}"
+
+
+class Cassette:
+    """一盘磁带：录制时累积交互并在退出时写盘，回放时按匹配键依次出带"""
+
+    def __init__(self, name: str = CASSETTE_NAME, mode: str = MODE, directory: str = CASSETTE_DIR) -> None:
+        self.path = os.path.join(directory, f"{name}.jsonl.gz")
+        self.mode = mode
+        self.secrets = _secret_values()
+        self._secret_set = set(self.secrets)
+        self.entries: list[dict] = []
+        self._tapes: dict[str, list[dict]] = {}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            atexit.register(self.save)
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._tapes.setdefault(entry["key"], []).append(entry)
+        except FileNotFoundError:
+            logger.error(f"回放磁带不存在: {self.path}")
+        else:
+            logger.info(f"已加载回放磁带: {self.path}（{sum(map(len, self._tapes.values()))} 条交互）")
+
+    def add_secrets(self, values) -> None:
+        added = set()
+        for value in values:
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                added |= _expand(str(value))
+        with self._lock:
+            if added <= self._secret_set:
+                return
+            self._secret_set |= added
+            self.secrets = _ordered(self._secret_set)
+
+    def record(self, method: str, url: str, status: int, headers, body: bytes, final_url: str) -> None:
+        kept = {}
+        for name in KEPT_HEADERS:
+            value = headers.get(name)
+            if value:
+                kept[name] = MASK if name.lower() in SECRET_HEADERS else scrub_text(value, self.secrets)
+        try:
+            text, b64 = scrub_text(body.decode("utf-8"), self.secrets), False
+        except UnicodeDecodeError:
+            text, b64 = base64.b64encode(body).decode("ascii"), True
+        entry = {
+            "key": match_key(method, url),
+            "status": status,
+            "headers": kept,
+            "url": urlsplit(final_url).path or "/",
+            "body": text,
+            "b64": b64,
+        }
+        with self._lock:
+            self.entries.append(entry)
+
+    def play(self, method: str, url: str) -> dict:
+        """取出下一条匹配的交互；同一请求的最后一条会被重复使用"""
+        key = match_key(method, url)
+        with self._lock:
+            tape = self._tapes.get(key)
+            if not tape:
+                raise CassetteMiss(f"磁带中没有 {key}")
+            return tape.pop(0) if len(tape) > 1 else tape[0]
+
+    def save(self) -> None:
+        if not self.entries:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        logger.info(f"已保存录制磁带: {self.path}（{len(self.entries)} 条交互）")
+
+
+def entry_body(entry: dict) -> bytes:
+    return base64.b64decode(entry["body"]) if entry["b64"] else entry["body"].encode("utf-8")
+
+
+def _requests_adapter(inner, cassette: Cassette):
+    from requests.adapters import BaseAdapter
+    from urllib3 import HTTPResponse
+
+    class CassetteAdapter(BaseAdapter):
+        """包在原传输适配器外层：录制时透传并记录，回放时直接构造响应"""
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.inner = inner
+
+        def send(self, request, **kwargs):
+            if cassette.mode == "replay":
+                entry = cassette.play(request.method, request.url)
+                raw = HTTPResponse(body=io.BytesIO(entry_body(entry)), headers=entry["headers"],
+                                   status=entry["status"], preload_content=False, decode_content=False)
+                return self.inner.build_response(request, raw)
+            resp = self.inner.send(request, **kwargs)
+            cassette.record(request.method, request.url, resp.status_code, resp.headers, resp.content, resp.url)
+            return resp
+
+        def close(self) -> None:
+            self.inner.close()
+
+    return CassetteAdapter()
+
+
+def _wrap_request(session, cassette: Cassette) -> None:
+    """curl_cffi 等没有适配器接口的会话：替换实例上的 request 方法"""
+    original = session.request
+
+    def request(method, url, *args, **kwargs):
+        if cassette.mode == "replay":
+            import requests
+
+            entry = cassette.play(method, url)
+            resp = requests.Response()
+            resp.status_code = entry["status"]
+            resp.headers.update(entry["headers"])
+            resp._content = entry_body(entry)
+            resp.encoding = "utf-8"
+            parts = urlsplit(url)
+            resp.url = f"{parts.scheme}://{parts.netloc}{entry['url']}"
+            return resp
+        resp = original(method, url, *args, **kwargs)
+        cassette.record(method, url, resp.status_code, resp.headers, resp.content, str(resp.url))
+        return resp
+
+    session.request = request
+
+
+_cassette = None
+
+
+def get_cassette():
+    """当前进程的磁带；未开启录制/回放时返回 None"""
+    global _cassette
+    if MODE not in ("record", "replay"):
+        return None
+    if _cassette is None:
+        _cassette = Cassette()
+    return _cassette
+
+
+def add_secrets(*values) -> None:
+    """登记额外的敏感值（如账号文件中的 Cookie、邮箱、密码），录制时与环境变量中的凭据一样替换；未在录制时不做任何事"""
+    if MODE != "record":
+        return
+    get_cassette().add_secrets(values)
+
+
+def install(session):
+    """对会话启用录制/回放（由 ql_session.configure 调用）"""
+    cassette = get_cassette()
+    if cassette is None or getattr(session, "_ql_cassette", False):
+        return session
+    if hasattr(session, "adapters"):
+        for prefix in ("https://", "http://"):
+            session.mount(prefix, _requests_adapter(session.get_adapter(prefix), cassette))
+    else:
+        _wrap_request(session, cassette)
+    session._ql_cassette = True
+    return session
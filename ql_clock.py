@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共时钟：所有等待都经由这里，可切换为虚拟时间
+
+QL_VIRTUAL_TIME=true 时 sleep 立即返回，只推进虚拟时间，并记录每个账号本应经历的时间线，
+用于在替身服务器或回放磁带上全速测试与基准化节奏逻辑。也可以在代码中用 install() 注入时钟。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from loguru import logger
+
+import ql_state
+
+VIRTUAL_TIME = os.getenv("QL_VIRTUAL_TIME", "false").lower() == "true"
+
+
+class RealClock:
+    """真实时钟"""
+
+    virtual = False
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def now(self, tz=None) -> datetime:
+        return datetime.now(tz=tz)
+
+    def sleep(self, seconds: float, reason: str = "") -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def begin(self, account: str) -> None:
+        pass
+
+
+class VirtualClock(RealClock):
+    """虚拟时钟：虚拟时间 = 真实流逝时间 + 已跳过的等待时间
+
+    sleep 不阻塞，只累加偏移并记录时间线（按当前线程正在处理的账号归类）。
+    """
+
+    virtual = True
+
+    def __init__(self) -> None:
+        self.skipped = 0.0
+        self.started = time.monotonic()
+        self.timeline: list[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return time.time() + self.skipped
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self.skipped
+
+    def now(self, tz=None) -> datetime:
+        return datetime.now(tz=tz) + timedelta(seconds=self.skipped)
+
+    def elapsed(self) -> float:
+        return self.monotonic() - self.started
+
+    def _record(self, event: str, duration: float = 0.0) -> None:
+        self.timeline.append({
+            "t": round(self.elapsed(), 3),
+            "account": getattr(self._local, "account", ""),
+            "event": event,
+            "duration": round(duration, 3),
+        })
+
+    def sleep(self, seconds: float, reason: str = "") -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._record(reason or "sleep", seconds)
+            self.skipped += seconds
+
+    def begin(self, account: str) -> None:
+        self._local.account = account
+        with self._lock:
+            self._record("开始")
+
+    def report(self, name: str) -> None:
+        """输出虚拟耗时并保存时间线"""
+        real = time.monotonic() - self.started
+        logger.info(f"虚拟时间: 流程耗时 {self.elapsed():.1f}秒（其中等待 {self.skipped:.1f}秒），实际仅用 {real:.2f}秒")
+        ql_state.save(f"timeline_{name}", self.timeline)
+
+
+_clock = VirtualClock() if VIRTUAL_TIME else RealClock()
+if VIRTUAL_TIME:
+    atexit.register(lambda: _clock.report(os.path.splitext(os.path.basename(sys.argv[0] or "run"))[0]))
+
+
+def install(clock) -> None:
+    """注入自定义时钟（测试、基准时使用）"""
+    global _clock
+    _clock = clock
+
+
+def get_clock():
+    return _clock
+
+
+def sleep(seconds: float, reason: str = "") -> None:
+    _clock.sleep(seconds, reason)
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def time_() -> float:
+    return _clock.time()
+
+
+def now(tz=None) -> datetime:
+    return _clock.now(tz)
+
+
+def begin(account: str) -> None:
+    """标记当前线程开始处理某个账号，之后的等待都记在该账号名下"""
+    _clock.begin(account)
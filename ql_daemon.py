@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本常驻进程：按各脚本头部的 cron 定时运行签到，运行之间保持会话与连接温热
+
+各签到脚本只导入一次；连接池、Cookie 罐、nodeseek 的 Cloudflare 放行 Cookie、雨云的 CSRF 令牌
+在运行之间保留（见 ql_session.lease），每次定时运行不再重复冷启动。
+通过本地控制套接字可以立即触发某个站点，或查询最近一次运行的结果：
+
+    python ql_daemon.py                  # 常驻运行（默认包含已配置账号的站点）
+    python ql_daemon.py status           # 查询各站点下次运行时间与最近结果
+    python ql_daemon.py run anyrouter    # 立即运行一次
+
+环境变量在导入脚本时读取，修改账号配置后需要重启常驻进程。控制套接字为 Unix 域套接字，仅限 Linux/macOS。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录，通过 nohup 或 extra.sh 启动。
+"""
+
+import importlib
+import json
+import os
+import queue
+import re
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from loguru import logger
+
+import ql_cache
+import ql_clock
+import ql_dns
+import ql_log
+import ql_net
+import ql_profile
+import ql_result
+import ql_session
+import ql_state
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SITES = ("anyrouter", "ikuuu", "leaflow", "nodeseek", "rainyun")
+# 任一变量已设置即视为该站点已配置
+SITE_ENVS = {
+    "anyrouter": ("ANYROUTER_COOKIE", "ANYROUTER_ACCOUNTS_FILE"),
+    "ikuuu": ("IKUUU_EMAIL", "IKUUU_ACCOUNTS_FILE"),
+    "leaflow": ("LEAFLOW_COOKIE", "LEAFLOW_ACCOUNTS_FILE"),
+    "nodeseek": ("NODESEEK_COOKIE", "NODESEEK_ACCOUNTS_FILE"),
+    "rainyun": ("RAINYUN_API_KEY",),
+}
+DAEMON_SITES = os.getenv("QL_DAEMON_SITES", "")  # 逗号分隔；留空为所有已配置的站点
+SOCKET_PATH = os.getenv("QL_DAEMON_SOCKET") or ql_state.path_of("daemon.sock")
+POLL_INTERVAL = 60.0  # 空闲时最长多久重新核对一次时间（应对系统休眠、校时）
+
+_CRON_LINE = re.compile(r'^\s*cron\s*:?\s*"?([^"\n]+?)"?(?:\s+script-path=.*)?\s*$', re.M)
+
+
+def read_cron(path: str) -> str:
+    """从脚本头部读取 cron 表达式，兼容 `cron: 0 6 * * *` 与 `cron "0 8 * * *" script-path=...` 两种写法"""
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1024)
+    match = _CRON_LINE.search(head)
+    if not match:
+        raise ValueError(f"{os.path.basename(path)} 头部没有 cron 声明")
+    return match.group(1).strip()
+
+
+class CronSpec:
+    """五段式 cron（分 时 日 月 周），支持 * , - / ；六段式（青龙的秒级 cron）忽略秒位"""
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expr: str) -> None:
+        fields = expr.split()
+        if len(fields) == 6:
+            fields = fields[1:]
+        if len(fields) != 5:
+            raise ValueError(f"无法解析的 cron: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, lo, hi) for field, (lo, hi) in zip(fields, self._RANGES))
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> frozenset:
+        values = set()
+        for part in field.split(","):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, stop = lo, hi
+            elif "-" in part:
+                start, stop = (int(x) for x in part.split("-", 1))
+            else:
+                start = int(part)
+                stop = hi if step else start
+            values.update(range(start, stop + 1, int(step) if step else 1))
+        if hi == 6:
+            values = {0 if v == 7 else v for v in values}  # 周日可写作 0 或 7
+        if not values or min(values) < lo or max(values) > hi:
+            raise ValueError(f"cron 字段超出范围: {field!r}")
+        return frozenset(values)
+
+    def _day_matches(self, t: datetime) -> bool:
+        in_days = t.day in self.days
+        in_weekdays = t.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays  # 日与周都指定时满足其一即可（与 crontab 一致）
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后（不含）最近一次触发时间"""
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 4)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron 在四年内不会触发: {self.expr!r}")
+
+
+class Job:
+    """一个站点：脚本模块、cron 与下次运行时间"""
+
+    def __init__(self, site: str, module, cron: CronSpec) -> None:
+        self.site = site
+        self.module = module
+        self.cron = cron
+        self.next_run = cron.next_after(ql_clock.now())
+
+
+class Daemon:
+    """串行执行各站点的运行：到点的和手动触发的都进入同一个队列"""
+
+    def __init__(self, sites) -> None:
+        self.jobs: dict[str, Job] = {}
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.pending: set[str] = set()
+        self.running: Optional[str] = None
+        self.history: dict = ql_state.load("daemon", {})
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._server: Optional[socketserver.BaseServer] = None
+        for site in sites:
+            try:
+                cron = CronSpec(read_cron(os.path.join(HERE, f"{site}.py")))
+                self.jobs[site] = Job(site, importlib.import_module(site), cron)
+                logger.info(f"常驻: {site} 已加载（cron {cron.expr}），下次运行 {self.jobs[site].next_run:%m-%d %H:%M}")
+            except Exception as e:
+                logger.error(f"常驻: {site} 加载失败: {e}")
+
+    def trigger(self, site: str) -> bool:
+        """加入运行队列；已在队列中则忽略"""
+        with self._lock:
+            if site not in self.jobs or site in self.pending:
+                return False
+            self.pending.add(site)
+        self.queue.put(site)
+        return True
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "queued": sorted(self.pending),
+                "sites": {site: {"cron": job.cron.expr,
+                                 "next_run": job.next_run.strftime("%Y-%m-%d %H:%M"),
+                                 "last": self.history.get(site)}
+                          for site, job in self.jobs.items()},
+            }
+
+    def run_site(self, site: str) -> None:
+        job = self.jobs[site]
+        with self._lock:
+            self.pending.discard(site)
+            self.running = site
+        logger.info(f"常驻: 开始运行 {site}")
+        ql_net.start_run()
+        before = ql_result.last_summary()
+        started_at = ql_clock.now()
+        started = ql_clock.monotonic()
+        error = None
+        try:
+            ql_profile.run(site, job.module.main)
+        except SystemExit as e:
+            error = f"脚本退出（{e.code}）" if e.code else None
+        except Exception as e:
+            logger.exception(f"常驻: {site} 运行异常")
+            error = f"{e.__class__.__name__}: {e}"
+        finally:
+            # 常驻进程不会频繁退出，学到的速率、耗时样本、HTTP 缓存索引和 DNS 解析结果每轮运行后就保存
+            ql_net.save_limiters()
+            ql_net.save_windows()
+            ql_cache.save()
+            ql_dns.save()
+        summary = ql_result.last_summary()
+        record = {
+            "started": started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration": round(ql_clock.monotonic() - started, 1),
+            "summary": summary.as_dict() if summary is not None and summary is not before else None,
+            "error": error,
+        }
+        with self._lock:
+            self.running = None
+            self.history[site] = record
+            history = dict(self.history)
+        ql_state.save("daemon", history)
+        logger.info(f"常驻: {site} 运行结束，用时 {record['duration']}秒，下次运行 {job.next_run:%m-%d %H:%M}")
+
+    def _enqueue_due(self) -> Optional[datetime]:
+        """把到点的站点放入队列，返回最早的下次运行时间"""
+        now = ql_clock.now()
+        for job in self.jobs.values():
+            if job.next_run <= now:
+                job.next_run = job.cron.next_after(now)
+                self.trigger(job.site)
+        return min((job.next_run for job in self.jobs.values()), default=None)
+
+    def serve_forever(self) -> None:
+        self._start_control()
+        try:
+            while not self._stopping.is_set():
+                upcoming = self._enqueue_due()
+                wait = POLL_INTERVAL
+                if upcoming is not None:
+                    wait = min(wait, max(0.0, (upcoming - ql_clock.now()).total_seconds()))
+                if ql_clock.VIRTUAL_TIME and self.queue.empty():
+                    ql_clock.sleep(wait, "调度等待")  # 虚拟时间下直接跳到下一个时间点
+                    continue
+                try:
+                    site = self.queue.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if site is None:
+                    break
+                self.run_site(site)
+        finally:
+            self._stop_control()
+            ql_session.close_resident()
+
+    def stop(self, *args) -> None:
+        self._stopping.set()
+        self.queue.put(None)
+
+    def _start_control(self) -> None:
+        daemon = self
+
+        class ControlHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                command = self.rfile.readline().decode("utf-8").split()
+                if command[:1] == ["status"]:
+                    reply = daemon.status()
+                elif command[:1] == ["run"] and len(command) == 2:
+                    reply = {"queued": daemon.trigger(command[1]), "site": command[1]}
+                else:
+                    reply = {"error": "支持的命令: status / run <站点>"}
+                self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        if not hasattr(socket, "AF_UNIX"):
+            logger.warning("常驻: 当前系统不支持 Unix 域套接字，控制命令不可用")
+            return
+        os.makedirs(os.path.dirname(SOCKET_PATH) or ".", exist_ok=True)
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)  # 上次未正常退出留下的套接字文件
+        self._server = socketserver.ThreadingUnixStreamServer(SOCKET_PATH, ControlHandler)
+        self._server.daemon_threads = True
+        os.chmod(SOCKET_PATH, 0o600)
+        threading.Thread(target=self._server.serve_forever, name="ql-daemon-control", daemon=True).start()
+        logger.info(f"常驻: 控制套接字 {SOCKET_PATH}")
+
+    def _stop_control(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            try:
+                os.unlink(SOCKET_PATH)
+            except OSError:
+                pass
+
+
+def configured_sites() -> list[str]:
+    if DAEMON_SITES.strip():
+        return [s.strip() for s in DAEMON_SITES.split(",") if s.strip()]
+    return [site for site in SITES if any(os.getenv(name) for name in SITE_ENVS[site])]
+
+
+def send_command(*command: str) -> dict:
+    """向运行中的常驻进程发送控制命令"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET_PATH)
+        sock.sendall(" ".join(command).encode("utf-8") + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        try:
+            print(json.dumps(send_command(*sys.argv[1:]), ensure_ascii=False, indent=2))
+        except OSError as e:
+            print(f"无法连接常驻进程（{SOCKET_PATH}）: {e}")
+            sys.exit(1)
+        return
+
+    ql_log.setup()
+    sites = configured_sites()
+    if not sites:
+        logger.error("没有已配置账号的站点，可用 QL_DAEMON_SITES 指定")
+        sys.exit(1)
+    ql_session.keep_resident()
+    daemon = Daemon(sites)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
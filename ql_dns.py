@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共 DNS 缓存：各脚本的传输共用一份域名解析结果，保存在状态目录里跨运行复用
+
+ql_session.configure() 处理会话时安装：
+- requests / cloudscraper 经 urllib3 调用 socket.getaddrinfo 建立连接，安装后由本模块的缓存应答；
+- curl_cffi 由 libcurl 自行解析，请求前把缓存的地址通过 CURLOPT_RESOLVE 交给 libcurl（走代理时不处理）。
+解析结果在 QL_DNS_TTL 秒内直接使用；过期后 QL_DNS_STALE 秒内先返回旧地址，同时在后台重新解析
+（stale-while-revalidate），慢的系统解析器不再卡在请求路径上；后台解析失败时继续使用旧地址。
+连接某个主机失败（连不上、连接超时）时 ql_net 调用 forget() 丢弃它的缓存，下次请求重新解析，
+主机换了地址时不会一直连旧地址。
+同一域名同时只发起一次解析，其他线程等待同一结果。getaddrinfo 拿不到记录本身的 TTL，因此按固定 TTL 缓存。
+QL_DNS_CACHE=false 关闭，IP 地址直连不经过缓存。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import ipaddress
+import os
+import socket
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+import ql_clock
+import ql_state
+
+ENABLED = os.getenv("QL_DNS_CACHE", "true").lower() != "false"
+TTL = float(os.getenv("QL_DNS_TTL", "300"))  # 解析结果视为新鲜的时长（秒）
+STALE = float(os.getenv("QL_DNS_STALE", "600"))  # 过期后仍可先用旧结果、后台刷新的时长（秒）
+WAIT = 10.0  # 等待其他线程完成同一解析的最长时间（秒）
+DRAIN = 3.0  # 退出时等待后台刷新的最长时间（秒）
+
+_original_getaddrinfo = socket.getaddrinfo
+
+
+def _cacheable(host) -> bool:
+    if isinstance(host, bytes):
+        host = host.decode("ascii", errors="ignore")
+    if not isinstance(host, str) or not host:
+        return False
+    try:
+        ipaddress.ip_address(host.strip("[]").split("%")[0])
+        return False
+    except ValueError:
+        return True
+
+
+def _dump(addrs: list) -> list:
+    return [[int(family), int(kind), proto, canonname, list(sockaddr)]
+            for family, kind, proto, canonname, sockaddr in addrs]
+
+
+def _load(raw: list) -> list:
+    return [(socket.AddressFamily(family), socket.SocketKind(kind), proto, canonname, tuple(sockaddr))
+            for family, kind, proto, canonname, sockaddr in raw]
+
+
+def _with_port(addrs: list, port) -> list:
+    if not isinstance(port, int):
+        return addrs
+    return [(family, kind, proto, canonname, (sockaddr[0], port) + tuple(sockaddr[2:]))
+            for family, kind, proto, canonname, sockaddr in addrs]
+
+
+class Resolver:
+    """解析结果缓存：键为 getaddrinfo 的参数，值为 (地址列表, 过期时间)
+
+    端口不影响解析结果，数字端口不计入键（同一域名的 80/443 共用一条），返回时换成调用方的端口。
+    """
+
+    def __init__(self) -> None:
+        now = ql_clock.time_()
+        self.entries: dict[str, tuple[list, float]] = {}
+        for key, (raw, expires) in ql_state.load("dns", {}).items():
+            if now < expires + STALE:
+                try:
+                    self.entries[key] = (_load(raw), expires)
+                except (TypeError, ValueError):
+                    pass
+        self.hits = self.stale = self.lookups = self.failed_refreshes = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._inflight: dict[str, threading.Event] = {}
+
+    def resolve(self, host, port, family=0, kind=0, proto=0, flags=0) -> list:
+        return _with_port(self._resolve(host, port, family, kind, proto, flags), port)
+
+    def _resolve(self, host, port, family, kind, proto, flags) -> list:
+        key = f"{host}|{'*' if isinstance(port, int) else port}|{int(family)}|{int(kind)}|{proto}|{flags}"
+        args = (host, port, family, kind, proto, flags)
+        now = ql_clock.time_()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and now < entry[1]:
+                self.hits += 1
+                return entry[0]
+            if entry is not None and now < entry[1] + STALE:
+                self.stale += 1
+                if key not in self._inflight:
+                    self._inflight[key] = threading.Event()
+                    threading.Thread(target=self._refresh, args=(key, args), name="ql-dns", daemon=True).start()
+                return entry[0]
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            event.wait(WAIT)
+            with self._lock:
+                entry = self.entries.get(key)
+            if entry is not None:
+                return entry[0]
+            return _original_getaddrinfo(*args)  # 其他线程解析失败，自己再试一次并照常抛出错误
+        try:
+            return self._lookup(key, args)
+        finally:
+            self._done(key)
+
+    def _lookup(self, key: str, args: tuple) -> list:
+        addrs = _original_getaddrinfo(*args)
+        with self._lock:
+            self.lookups += 1
+            self.entries[key] = (addrs, ql_clock.time_() + TTL)
+            self._dirty = True
+        return addrs
+
+    def _refresh(self, key: str, args: tuple) -> None:
+        try:
+            self._lookup(key, args)
+        except OSError as e:
+            with self._lock:
+                self.failed_refreshes += 1
+            logger.debug(f"DNS 后台刷新 {args[0]} 失败，继续使用旧地址: {e}")
+        finally:
+            self._done(key)
+
+    def _done(self, key: str) -> None:
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def forget(self, host: str) -> int:
+        """丢弃某个域名的全部缓存（各端口、地址族），返回丢弃的条数"""
+        prefix = f"{host.lower()}|"
+        with self._lock:
+            keys = [key for key in self.entries if key.lower().startswith(prefix)]
+            for key in keys:
+                del self.entries[key]
+            if keys:
+                self._dirty = True
+        return len(keys)
+
+    def drain(self, timeout: float) -> None:
+        """等待进行中的后台刷新（退出前调用，免得短命进程每次都只用旧地址、刷新结果来不及保存）"""
+        with self._lock:
+            events = list(self._inflight.values())
+        for event in events:
+            event.wait(timeout)
+
+    def save(self) -> None:
+        now = ql_clock.time_()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: [_dump(addrs), expires] for key, (addrs, expires) in self.entries.items()
+                    if now < expires + STALE}
+            self._dirty = False
+        ql_state.save("dns", data)
+
+    def report(self) -> None:
+        if self.hits or self.stale or self.lookups:
+            failed = f"，后台刷新失败 {self.failed_refreshes} 次" if self.failed_refreshes else ""
+            logger.info(f"DNS 缓存: 命中 {self.hits} 次，先用旧地址 {self.stale} 次，实际解析 {self.lookups} 次{failed}")
+
+
+_resolver: Optional[Resolver] = None
+_resolver_lock = threading.Lock()
+
+
+def _getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    if not _cacheable(host):
+        return _original_getaddrinfo(host, port, family, type, proto, flags)
+    return list(_resolver.resolve(host, port, family, type, proto, flags))
+
+
+def _exit() -> None:
+    _resolver.drain(DRAIN)
+    _resolver.save()
+    _resolver.report()
+
+
+def install() -> Optional[Resolver]:
+    """接管本进程的 socket.getaddrinfo 并返回缓存；关闭时返回 None，重复调用无效果"""
+    global _resolver
+    if not ENABLED:
+        return None
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = Resolver()
+            socket.getaddrinfo = _getaddrinfo
+            atexit.register(_exit)
+        return _resolver
+
+
+def save() -> None:
+    """保存解析结果（常驻进程每轮运行后调用）"""
+    if _resolver is not None:
+        _resolver.save()
+
+
+def forget(host: str) -> None:
+    """连接失败后丢弃该域名的缓存地址，下次请求同步重新解析（由 ql_net.request 调用）"""
+    if _resolver is not None and _cacheable(host) and _resolver.forget(host):
+        logger.debug(f"DNS 缓存: 连接 {host} 失败，已丢弃缓存地址")
+
+
+def _resolve_entry(url: str) -> Optional[str]:
+    """CURLOPT_RESOLVE 格式的条目：host:port:addr1,addr2"""
+    parts = urlsplit(url)
+    if not _cacheable(parts.hostname):
+        return None
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        addrs = _resolver.resolve(parts.hostname, port, 0, socket.SOCK_STREAM)
+    except OSError:
+        return None  # 交给 libcurl 自己解析并报告错误
+    ips = []
+    for family, _, _, _, sockaddr in addrs:
+        ip = f"[{sockaddr[0]}]" if family == socket.AF_INET6 else sockaddr[0]
+        if ip not in ips:
+            ips.append(ip)
+    return f"{parts.hostname}:{port}:{','.join(ips)}" if ips else None
+
+
+def _wrap_curl(session) -> None:
+    """curl_cffi 会话不经过 socket.getaddrinfo：每个请求前把缓存地址写进会话的 CURLOPT_RESOLVE
+
+    curl_cffi 会话不跨线程并发使用，改写会话级的 curl_options 不会影响别的请求。
+    """
+    from curl_cffi import CurlOpt
+
+    original = session.request
+
+    def request(method, url, *args, **kwargs):
+        # 走代理时由代理解析目标域名
+        entry = None if (kwargs.get("proxies") or session.proxies) else _resolve_entry(url)
+        if entry is not None:
+            session.curl_options[CurlOpt.RESOLVE] = [entry]
+        else:
+            session.curl_options.pop(CurlOpt.RESOLVE, None)
+        return original(method, url, *args, **kwargs)
+
+    session.request = request
+
+
+def attach(session):
+    """让会话使用共享 DNS 缓存，返回原会话；未开启缓存时原样返回（由 ql_session.configure 调用）"""
+    if install() is None:
+        return session
+    if not hasattr(session, "get_adapter") and hasattr(session, "curl_options") \
+            and not getattr(session, "_ql_dns", False):
+        _wrap_curl(session)
+        session._ql_dns = True
+    return session
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共日志：队列化的非阻塞输出、可选 JSON 结构化日志、按站点采样的详细日志
+
+setup() 由各脚本的入口调用（直接运行或云函数入口），作为依赖被导入时不改动已有的日志配置：
+- 日志先进入队列，由后台线程写到 stderr，发请求的线程不再等待终端/文件写入（QL_LOG_ENQUEUE=false 关闭）；
+- QL_LOG_JSON=true 时每行输出一个 JSON 对象（含时间、级别、模块、函数、行号和绑定字段），便于日志平台检索；
+- QL_LOG_LEVEL 设定最低级别（默认 DEBUG，与原来一致），低于该级别的消息按模板延迟格式化，不产生格式化开销。
+
+账号很多时，每个账号的横幅、响应内容等详细日志用 begin()/verbose() 输出：每个站点前 QL_LOG_SAMPLE_FIRST 个账号完整输出，
+之后每 QL_LOG_SAMPLE_EVERY 个账号输出一个；签到结果、警告和错误照常逐条输出。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import os
+import sys
+import threading
+from contextvars import ContextVar
+
+from loguru import logger
+
+LEVEL = os.getenv("QL_LOG_LEVEL", "DEBUG").upper()
+JSON = os.getenv("QL_LOG_JSON", "false").lower() == "true"
+ENQUEUE = os.getenv("QL_LOG_ENQUEUE", "true").lower() != "false"
+SAMPLE_FIRST = int(os.getenv("QL_LOG_SAMPLE_FIRST", "20"))  # 每个站点完整输出详细日志的账号数
+SAMPLE_EVERY = int(os.getenv("QL_LOG_SAMPLE_EVERY", "10"))  # 之后每多少个账号输出一个，1 表示不采样
+
+_configured = False
+_verbose: ContextVar[bool] = ContextVar("ql_log_verbose", default=True)
+_counts: dict[str, list[int]] = {}  # 站点 -> [账号数, 省略详细日志的账号数]
+_lock = threading.Lock()
+
+
+def setup() -> None:
+    """替换 loguru 默认的同步 stderr 输出；重复调用无效果"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    logger.remove()
+    logger.add(sys.stderr, level=LEVEL, enqueue=ENQUEUE, serialize=JSON, backtrace=False, diagnose=False)
+    atexit.register(_report)
+
+
+def begin(site: str) -> bool:
+    """开始处理该站点的下一个账号，决定本账号的详细日志是否输出（在当前线程内生效）"""
+    with _lock:
+        counts = _counts.setdefault(site, [0, 0])
+        counts[0] += 1
+        n = counts[0]
+        keep = n <= SAMPLE_FIRST or SAMPLE_EVERY <= 1 or (n - SAMPLE_FIRST) % SAMPLE_EVERY == 0
+        if not keep:
+            counts[1] += 1
+    _verbose.set(keep)
+    return keep
+
+
+def verbose(message: str, *args, **kwargs) -> None:
+    """输出详细日志（INFO 级别）：用 {} 模板传参，未被采样或级别关闭时既不格式化也不输出"""
+    if _verbose.get():
+        logger.opt(depth=1).info(message, *args, **kwargs)
+
+
+def _report() -> None:
+    for site, (total, skipped) in _counts.items():
+        if skipped:
+            logger.info(f"{site}: {total} 个账号中 {skipped} 个的详细日志按采样省略"
+                        f"（前 {SAMPLE_FIRST} 个完整输出，之后每 {SAMPLE_EVERY} 个输出一个）")
@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共网络模块：指数退避重试、按主机熔断、AIMD 自适应限速、运行时间预算、只读请求对冲
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import math
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+import ql_clock
+import ql_dns
+import ql_state
+
+# ---------------- 配置项 ----------------
+RETRY_TIMES = int(os.getenv("QL_RETRY_TIMES", "3"))  # 单个请求最多尝试次数（含首次）
+RETRY_BASE = float(os.getenv("QL_RETRY_BASE", "1"))  # 退避基数（秒）
+RETRY_CAP = float(os.getenv("QL_RETRY_CAP", "30"))  # 单次退避上限（秒）
+BREAKER_THRESHOLD = int(os.getenv("QL_BREAKER_THRESHOLD", "3"))  # 连续失败多少次后熔断
+BREAKER_COOLDOWN = float(os.getenv("QL_BREAKER_COOLDOWN", "300"))  # 熔断持续时间（秒）
+MAX_CONCURRENCY = int(os.getenv("QL_MAX_CONCURRENCY", "8"))  # 单主机并发上限
+RATE_STATE_TTL = 7 * 86400  # 学到的速率超过 7 天未更新则作废
+RUN_BUDGET = float(os.getenv("QL_RUN_BUDGET", "3300"))  # 整次运行的时间预算（秒），0 表示不限
+MIN_REQUEST_TIME = 3.0  # 剩余预算低于该值时不再发起新请求
+HEDGE = os.getenv("QL_HEDGE", "false").lower() == "true"  # 只读请求超过 p95 仍未返回时补发一次
+HEDGE_WINDOW = 64  # 每个接口保留最近多少次耗时
+HEDGE_MIN_SAMPLES = 10  # 样本不足时不对冲
+HEDGE_FLOOR = 0.05  # 对冲等待下限（秒），避免极快的接口被成倍请求
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = frozenset({502, 503, 504})
+THROTTLE_STATUSES = frozenset({403, 429})
+
+# requests / curl_cffi / cloudscraper 的异常类名不同源，按类名识别
+_TRANSIENT_NAMES = frozenset({"Timeout", "ConnectTimeout", "ReadTimeout", "ConnectionError"})
+_BEFORE_SEND_HINTS = ("NewConnectionError", "NameResolution", "Failed to resolve",
+                      "Connection refused", "Could not resolve", "Failed to connect")
+
+
+class DeferredError(Exception):
+    """本次运行内无法完成，应记为延后而非失败"""
+
+
+class CircuitOpenError(DeferredError):
+    """主机处于熔断状态，请求被快速失败"""
+
+    def __init__(self, host: str, retry_in: float) -> None:
+        super().__init__(f"{host} 已熔断，{retry_in:.0f}秒后再试")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(DeferredError):
+    """运行时间预算已用尽"""
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def is_transient(exc: BaseException) -> bool:
+    """连接失败或超时，视为可重试且计入熔断"""
+    if isinstance(exc, DeferredError):
+        return False
+    return any(cls.__name__ in _TRANSIENT_NAMES for cls in type(exc).__mro__)
+
+
+def failed_before_send(exc: BaseException) -> bool:
+    """请求是否确定没有发到服务器（非幂等请求只在这种情况下重试）"""
+    if any(cls.__name__ == "ConnectTimeout" for cls in type(exc).__mro__):
+        return True
+    text = str(exc)
+    return any(hint in text for hint in _BEFORE_SEND_HINTS)
+
+
+class RetryPolicy:
+    """指数退避 + 抖动的重试策略"""
+
+    def __init__(self, attempts: int = RETRY_TIMES, base: float = RETRY_BASE, cap: float = RETRY_CAP) -> None:
+        self.attempts = max(1, attempts)
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：一半固定、一半随机，避免多账号同时重试"""
+        ceiling = min(self.cap, self.base * (2 ** (attempt - 1)))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def should_retry(self, method: str, attempt: int, exc: Optional[BaseException] = None,
+                     status: Optional[int] = None) -> bool:
+        if attempt >= self.attempts:
+            return False
+        if exc is not None:
+            return method in IDEMPOTENT_METHODS or failed_before_send(exc)
+        return status in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+
+
+DEFAULT_POLICY = RetryPolicy()
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker:
+    """单个主机的熔断器：closed -> open -> half_open -> closed"""
+
+    def __init__(self, host: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN) -> None:
+        self.host = host
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if ql_clock.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def before_call(self) -> None:
+        """请求前调用；熔断中直接抛出 CircuitOpenError"""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probing):
+                retry_in = self.cooldown - (ql_clock.monotonic() - self.opened_at)
+                raise CircuitOpenError(self.host, max(0.0, retry_in))
+            if state == "half_open":
+                self._probing = True  # 冷却结束后只放行一个探测请求
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.host} 熔断恢复")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = ql_clock.monotonic()
+                logger.warning(f"{self.host} 连续失败 {self.failures} 次，熔断 {self.cooldown:.0f} 秒")
+            self._probing = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def is_open(host: str) -> bool:
+    """该主机当前是否熔断（用于在处理账号前快速跳过）"""
+    return get_breaker(host).is_open
+
+
+class Deadline:
+    """整次运行的时间预算，剩余时间会压缩到每个请求的超时和重试决策中"""
+
+    def __init__(self, budget: float = RUN_BUDGET) -> None:
+        self.budget = budget
+        self.started = ql_clock.monotonic()
+        self.account_estimate = 0.0  # 单个账号耗时的滑动平均
+        self._last_admit: Optional[float] = None
+
+    def remaining(self) -> float:
+        if self.budget <= 0:
+            return float("inf")
+        return self.budget - (ql_clock.monotonic() - self.started)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() < MIN_REQUEST_TIME
+
+    def allows(self, seconds: float) -> bool:
+        """等待 seconds 秒后是否还来得及再发一个请求"""
+        return self.remaining() - seconds >= MIN_REQUEST_TIME
+
+    def clip(self, delay: float) -> float:
+        """把等待时间限制在剩余预算内"""
+        return max(0.0, min(delay, self.remaining() - MIN_REQUEST_TIME))
+
+    def check(self) -> None:
+        if self.expired:
+            raise DeadlineExceeded(f"运行时间预算 {self.budget:.0f} 秒已用尽")
+
+    def timeout(self, timeout):
+        """按剩余预算收紧 requests 风格的 timeout（数值或 (connect, read) 元组）"""
+        remaining = self.remaining()
+        if remaining == float("inf") or timeout is None:
+            return timeout
+        if isinstance(timeout, (tuple, list)):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        return (min(connect, remaining), min(read, remaining))
+
+    def admit(self) -> bool:
+        """处理下一个账号前调用：按已观察到的单账号耗时判断剩余预算是否够用"""
+        now = ql_clock.monotonic()
+        if self._last_admit is not None:
+            spent = now - self._last_admit
+            self.account_estimate = spent if not self.account_estimate else 0.7 * self.account_estimate + 0.3 * spent
+        self._last_admit = now
+        return self.remaining() >= max(MIN_REQUEST_TIME, self.account_estimate)
+
+
+_deadline = Deadline()
+
+
+def start_run(budget: float = RUN_BUDGET) -> Deadline:
+    """开始新一轮运行并重置时间预算（脚本导入时已自动开始一轮）"""
+    global _deadline
+    _deadline = Deadline(budget)
+    return _deadline
+
+
+def deadline() -> Deadline:
+    return _deadline
+
+
+def defer_reason(host: str) -> Optional[str]:
+    """处理账号前调用；站点熔断或剩余预算不足以完成一个账号时返回延后原因"""
+    if is_open(host):
+        return f"{host} 熔断中"
+    if not _deadline.admit():
+        return "剩余运行时间不足"
+    return None
+
+
+def parse_retry_after(value) -> float:
+    """解析 Retry-After（秒数或 HTTP 日期），无法解析返回 0"""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - ql_clock.time_())
+    except Exception:
+        return 0.0
+
+
+class AimdLimiter:
+    """按主机的 AIMD 自适应限速
+
+    成功时速率加性上升、并发按 1/n 增长；遇到 403/429 时速率与并发减半，并遵守 Retry-After。
+    interval 为账号之间的平均间隔（秒），限定在 [floor, ceiling] 之间。
+    """
+
+    def __init__(self, host: str, interval: float, floor: float, ceiling: float,
+                 concurrency: float = 1.0, max_concurrency: int = MAX_CONCURRENCY) -> None:
+        self.host = host
+        self.floor = floor
+        self.ceiling = ceiling
+        self.interval = min(ceiling, max(floor, interval))
+        self.step = 0.1 / self.interval  # 每次成功增加的速率（次/秒）
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = min(self.max_concurrency, max(1.0, concurrency))
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def on_success(self) -> None:
+        with self._cond:
+            rate = 1 / self.interval + self.step
+            self.interval = max(self.floor, 1 / rate)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+    def on_throttle(self, status: int, retry_after: float = 0.0) -> None:
+        with self._cond:
+            before = self.interval
+            self.interval = min(self.ceiling, self.interval * 2)
+            self.concurrency = max(1.0, self.concurrency / 2)
+            if retry_after > 0:
+                self.blocked_until = max(self.blocked_until, ql_clock.monotonic() + retry_after)
+        logger.warning(f"{self.host} 返回 {status}，限速收紧: 间隔 {before:.1f}→{self.interval:.1f}秒"
+                       + (f"，Retry-After {retry_after:.0f}秒" if retry_after > 0 else ""))
+
+    def next_delay(self) -> float:
+        """下一个账号开始前应等待的秒数（带 ±25% 抖动，不早于 Retry-After，不超过剩余预算）"""
+        with self._cond:
+            delay = self.interval * random.uniform(0.75, 1.25)
+            delay = max(delay, self.blocked_until - ql_clock.monotonic())
+        return _deadline.clip(delay)
+
+    @contextmanager
+    def slot(self):
+        """并发执行时占用一个并发名额，超出当前并发窗口则等待"""
+        with self._cond:
+            while self.in_flight >= int(self.concurrency):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def feedback(self, resp) -> None:
+        status = resp.status_code
+        if status in THROTTLE_STATUSES:
+            self.on_throttle(status, parse_retry_after(resp.headers.get("Retry-After")))
+        elif status < 400:
+            self.on_success()
+
+
+_limiters: dict[str, AimdLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host: str, initial: float, floor: float, ceiling: float) -> AimdLimiter:
+    """获取主机限速器；首次创建时从上次运行学到的速率起步"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            if not _limiters:
+                atexit.register(save_limiters)
+            saved = ql_state.load("ratelimit", {}).get(host) or {}
+            if ql_clock.time_() - saved.get("updated", 0) < RATE_STATE_TTL:
+                limiter = AimdLimiter(host, saved.get("interval", initial), floor, ceiling,
+                                      concurrency=saved.get("concurrency", 1.0))
+                logger.info(f"{host} 沿用上次学到的速率: 间隔 {limiter.interval:.1f}秒")
+            else:
+                limiter = AimdLimiter(host, initial, floor, ceiling)
+            _limiters[host] = limiter
+        return limiter
+
+
+def save_limiters() -> None:
+    """保存学到的速率，供下次运行起步"""
+    with _limiters_lock:
+        if not _limiters:
+            return
+        data = ql_state.load("ratelimit", {})
+        for host, limiter in _limiters.items():
+            data[host] = {"interval": round(limiter.interval, 3),
+                          "concurrency": round(limiter.concurrency, 3),
+                          "updated": int(ql_clock.time_())}
+    ql_state.save("ratelimit", data)
+
+
+class LatencyWindow:
+    """单个接口最近若干次请求的耗时，用于估计 p95"""
+
+    def __init__(self, samples=()) -> None:
+        self.samples: deque[float] = deque(samples, maxlen=HEDGE_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+
+_windows: dict[str, LatencyWindow] = {}
+_windows_lock = threading.Lock()
+_hedge_counts = {"sent": 0, "won": 0}
+_hedge_lock = threading.Lock()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+def hedge_stats() -> dict:
+    """本次运行的对冲计数：sent 为补发次数，won 为补发请求先于原请求返回的次数"""
+    with _hedge_lock:
+        return dict(_hedge_counts)
+
+
+def _endpoint(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{(parts.hostname or '').lower()}{parts.path or '/'}"
+
+
+def get_window(endpoint: str) -> LatencyWindow:
+    """获取接口耗时窗口；首次创建时载入上次运行保存的样本"""
+    with _windows_lock:
+        window = _windows.get(endpoint)
+        if window is None:
+            if not _windows:
+                atexit.register(save_windows)
+            saved = ql_state.load("latency", {}).get(endpoint) or {}
+            fresh = ql_clock.time_() - saved.get("updated", 0) < RATE_STATE_TTL
+            window = _windows[endpoint] = LatencyWindow(saved.get("samples", []) if fresh else ())
+        return window
+
+
+def save_windows() -> None:
+    """保存各接口的耗时样本，下次运行一开始就能按 p95 对冲；同时输出对冲计数"""
+    stats = hedge_stats()
+    if stats["sent"]:
+        logger.info(f"请求对冲: 补发 {stats['sent']} 次，其中 {stats['won']} 次先返回")
+    with _windows_lock:
+        if not _windows:
+            return
+        data = ql_state.load("latency", {})
+        for endpoint, window in _windows.items():
+            with window._lock:
+                samples = [round(s, 3) for s in window.samples]
+            data[endpoint] = {"samples": samples, "updated": int(ql_clock.time_())}
+    ql_state.save("latency", data)
+
+
+def _hedgeable(session, method: str) -> bool:
+    """只对冲 requests 系会话（含 cloudscraper 与 requests 模块本身）的幂等请求
+
+    curl_cffi 会话不保证可以跨线程同时使用，因此不参与对冲。
+    """
+    if method not in IDEMPOTENT_METHODS:
+        return False
+    return hasattr(session, "get_adapter") or getattr(session, "__name__", "") == "requests"
+
+
+def _timed(window: LatencyWindow, session, method: str, url: str, kwargs: dict):
+    started = ql_clock.monotonic()
+    resp = session.request(method, url, **kwargs)
+    window.add(ql_clock.monotonic() - started)
+    return resp
+
+
+def _discard(future) -> None:
+    """落败的请求返回后释放连接"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _send_hedged(session, method: str, url: str, kwargs: dict):
+    """发出请求，超过该接口的 p95 仍未返回时用同样的参数补发一次，取先成功返回的响应"""
+    global _hedge_pool
+    window = get_window(_endpoint(url))
+    delay = window.p95()
+    if delay is None:
+        return _timed(window, session, method, url, kwargs)
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=2 * MAX_CONCURRENCY, thread_name_prefix="ql-hedge")
+        pool = _hedge_pool
+    primary = pool.submit(_timed, window, session, method, url, kwargs)
+    done, _ = wait([primary], timeout=max(HEDGE_FLOOR, delay))
+    if done or _deadline.expired:
+        return primary.result()
+    with _hedge_lock:
+        _hedge_counts["sent"] += 1
+    logger.debug(f"{_endpoint(url)} 超过 p95 {delay:.2f}秒未返回，补发对冲请求")
+    backup = pool.submit(_timed, window, session, method, url, dict(kwargs))
+    pending = {primary, backup}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is backup:
+                    with _hedge_lock:
+                        _hedge_counts["won"] += 1
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return future.result()
+    return primary.result()  # 两个都失败，按原请求的异常处理
+
+
+def race(candidates, probe, stagger: float = 0.25) -> Optional[tuple]:
+    """happy-eyeballs 式竞速：按顺序每隔 stagger 秒启动一个 probe(candidate)，返回最先成功的 (candidate, 耗时)
+
+    前一个探测很快失败时立即启动下一个，不必等满 stagger；probe 返回假值或抛出异常都算失败，全部失败返回 None。
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return None
+
+    def timed(candidate):
+        started = ql_clock.monotonic()
+        return probe(candidate), ql_clock.monotonic() - started
+
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="ql-race")
+    pending: dict = {}
+    try:
+        while candidates or pending:
+            if candidates:
+                candidate = candidates.pop(0)
+                pending[pool.submit(timed, candidate)] = candidate
+            done, _ = wait(pending, timeout=stagger if candidates else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate = pending.pop(future)
+                if future.exception() is not None:
+                    logger.debug(f"{candidate} 探测失败: {future.exception()}")
+                    continue
+                healthy, elapsed = future.result()
+                if healthy:
+                    return candidate, elapsed
+        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+_retries = threading.local()
+
+
+def retries() -> int:
+    """当前线程至今由 request() 发起的重试次数；账号开始时记下，结束时相减即为该账号的请求重试次数"""
+    return getattr(_retries, "count", 0)
+
+
+def _count_retry() -> None:
+    _retries.count = retries() + 1
+
+
+def request(session, method: str, url: str, *, policy: Optional[RetryPolicy] = None, hedge: bool = False,
+            **kwargs):
+    """带退避重试与熔断的请求
+
+    session 可以是 requests / cloudscraper / curl_cffi 的 Session，也可以直接传 requests 模块。
+    幂等请求在连接失败、超时和 502/503/504 时重试；POST 等只在确认未发出时重试。
+    若该主机注册了限速器，响应状态会反馈给它（403/429 收紧，成功放宽）。
+    超时按运行剩余预算收紧，预算不够时不再重试；预算用尽则抛出 DeadlineExceeded。
+    hedge=True 且开启 QL_HEDGE 时，幂等请求超过该接口观察到的 p95 耗时仍未返回会补发一次，取先返回者；
+    只用于没有副作用的只读请求，签到等 POST 即使传入也不会对冲。
+    """
+    method = method.upper()
+    hedge = HEDGE and hedge and _hedgeable(session, method)
+    policy = policy or DEFAULT_POLICY
+    host = host_of(url)
+    breaker = get_breaker(host)
+    budget = _deadline
+    timeout = kwargs.pop("timeout", None)
+    attempt = 0
+    while True:
+        attempt += 1
+        budget.check()
+        breaker.before_call()
+        if timeout is not None:
+            kwargs["timeout"] = budget.timeout(timeout)
+        try:
+            if hedge:
+                resp = _send_hedged(session, method, url, kwargs)
+            else:
+                resp = session.request(method, url, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            breaker.record_failure()
+            if failed_before_send(e):
+                ql_dns.forget(host)  # 缓存的地址可能已失效，重试时重新解析
+            delay = policy.delay(attempt)
+            if not policy.should_retry(method, attempt, exc=e) or not budget.allows(delay):
+                raise
+            logger.warning(f"{host} 请求失败({e.__class__.__name__})，{delay:.1f}秒后第{attempt + 1}次尝试")
+            _count_retry()
+            ql_clock.sleep(delay, "请求重试")
+            continue
+
+        breaker.record_success()
+        limiter = _limiters.get(host)
+        if limiter is not None:
+            limiter.feedback(resp)
+        delay = policy.delay(attempt)
+        if policy.should_retry(method, attempt, status=resp.status_code) and budget.allows(delay):
+            logger.warning(f"{host} 返回 {resp.status_code}，{delay:.1f}秒后第{attempt + 1}次尝试")
+            resp.close()  # 丢弃的响应及时归还连接，免得重试时连接池被占满
+            _count_retry()
+            ql_clock.sleep(delay, "请求重试")
+            continue
+        return resp
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共解析：直接在响应字节上解析，跳过字符集探测
+
+响应未声明 charset 时，requests 的 resp.text 会先对整个正文做字符集探测再解码出第二份字符串。
+这里按 Content-Type → BOM → HTML <meta> → UTF-8 的顺序确定编码，
+JSON 直接交给 json.loads(bytes)，HTML 直接交给 lxml，只在确实需要字符串时才解码一次。
+
+QL_PARSE_WORKERS 大于 0 时，offload()/submit() 把页面解析交给进程池，解析期间的 CPU 不再占用发请求的线程
+（并发运行时其它账号的请求不会被卡住）；小正文攒批一起发送以摊薄进程间通信开销。默认 0，即在当前线程直接解析。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import atexit
+import codecs
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from loguru import logger
+
+PARSE_WORKERS = int(os.getenv("QL_PARSE_WORKERS", "0"))  # 解析进程数，0 表示在当前线程解析
+PARSE_BATCH = 16  # 一批最多合并的解析任务数
+PARSE_BATCH_BYTES = 32 * 1024  # 正文不超过该大小才合批，更大的单独发送
+PARSE_LINGER = 0.002  # 凑批最多等待的秒数
+
+_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+         (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+_UTF8 = frozenset({"utf-8", "utf8", "utf_8"})
+
+
+def _declared(resp) -> Optional[str]:
+    match = _CHARSET.search(resp.headers.get("Content-Type") or "")
+    return match.group(1).lower() if match else None
+
+
+def encoding_of(resp) -> str:
+    """确定响应编码（不做统计探测），并写回 resp.encoding，之后访问 resp.text 也不再探测"""
+    encoding = _declared(resp)
+    if encoding is None:
+        head = resp.content[:1024]
+        encoding = next((name for bom, name in _BOMS if head.startswith(bom)), None)
+        if encoding is None:
+            match = _META_CHARSET.search(head)
+            encoding = match.group(1).decode("ascii").lower() if match else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    try:
+        resp.encoding = encoding
+    except AttributeError:
+        pass
+    return encoding
+
+
+def text(resp) -> str:
+    """按确定的编码解码一次正文"""
+    return resp.content.decode(encoding_of(resp), errors="replace")
+
+
+def loads(resp):
+    """解析 JSON 响应：UTF-8/16/32 直接解析字节，其它声明的编码才先解码"""
+    encoding = _declared(resp)
+    if encoding and encoding not in _UTF8:
+        return json.loads(resp.content.decode(encoding, errors="replace"))
+    return json.loads(resp.content)
+
+
+def html(resp):
+    """用 lxml 直接解析字节，返回文档根节点"""
+    return html_bytes(resp.content, encoding_of(resp))
+
+
+def html_bytes(content: bytes, encoding: str):
+    """按给定编码用 lxml 解析字节（解析进程里没有响应对象，只拿到正文与编码）"""
+    from lxml import html as lxml_html  # 延迟导入，启动延迟期间由预热线程提前加载
+
+    parser = lxml_html.HTMLParser(encoding=encoding)
+    return lxml_html.document_fromstring(content, parser=parser)
+
+
+def class_texts(root, classes: str, limit: Optional[int] = None) -> list[str]:
+    """按 CSS 类名组合（如 "text-xs text-gray-500"）取元素文本，等价于 select('div.text-xs.text-gray-500')"""
+    conditions = " and ".join(
+        f'contains(concat(" ", normalize-space(@class), " "), " {name} ")' for name in classes.split())
+    nodes = root.xpath(f"//div[{conditions}]")
+    return [node.text_content().strip() for node in nodes[:limit]]
+
+
+def search(pattern: bytes, resp, flags: int = 0) -> Optional[re.Match]:
+    """在原始字节上做正则匹配，适合只需从页面中取少量 ASCII 字段的场景"""
+    return re.search(pattern, resp.content, flags)
+
+
+def _run_batch(jobs: list) -> list:
+    """在解析进程中依次执行一批任务，逐个返回 (是否成功, 结果或异常)"""
+    results = []
+    for fn, args in jobs:
+        try:
+            results.append((True, fn(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class ParseExecutor:
+    """解析进程池：大正文单独发送，小正文在 PARSE_LINGER 内攒够 PARSE_BATCH 个或到时再一起发送
+
+    解析函数与参数需能被 pickle（模块级函数、bytes/str 参数）；进程池不可用或无法 pickle 时退回当前线程解析。
+    """
+
+    def __init__(self, workers: int) -> None:
+        # spawn 启动的子进程不继承父进程的线程与锁，多线程运行时比 fork 安全
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.pending: list = []
+        self.batches = 0
+        self.jobs = 0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._flusher, name="ql-parse-batch", daemon=True).start()
+
+    def submit(self, fn, args: tuple) -> Future:
+        future = Future()
+        size = sum(len(a) for a in args if isinstance(a, (bytes, str)))
+        if size > PARSE_BATCH_BYTES:
+            self._send([(fn, args, future)])
+            return future
+        with self._cond:
+            self.pending.append((fn, args, future))
+            self._cond.notify()
+        return future
+
+    def _flusher(self) -> None:
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + PARSE_LINGER
+                while len(self.pending) < PARSE_BATCH:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                batch, self.pending = self.pending[:PARSE_BATCH], self.pending[PARSE_BATCH:]
+            self._send(batch)
+
+    def _send(self, batch: list) -> None:
+        self.batches += 1
+        self.jobs += len(batch)
+        try:
+            remote = self.pool.submit(_run_batch, [(fn, args) for fn, args, _ in batch])
+        except Exception as e:  # 进程池已关闭或损坏
+            self._inline(batch, e)
+            return
+
+        def done(remote) -> None:
+            try:
+                results = remote.result()
+            except Exception as e:  # 子进程崩溃或任务无法 pickle
+                self._inline(batch, e)
+                return
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+        remote.add_done_callback(done)
+
+    @staticmethod
+    def _inline(batch: list, error: Exception) -> None:
+        logger.debug(f"解析进程不可用，改在当前进程解析: {error}")
+        for fn, args, future in batch:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.jobs:
+            logger.info(f"解析进程池: {self.jobs} 个解析任务，分 {self.batches} 批发送")
+
+
+_executor: Optional[ParseExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def executor() -> Optional[ParseExecutor]:
+    """当前进程的解析进程池；未开启（QL_PARSE_WORKERS=0）时返回 None"""
+    global _executor
+    if PARSE_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ParseExecutor(PARSE_WORKERS)
+            atexit.register(_executor.close)
+        return _executor
+
+
+def submit(fn, *args) -> Future:
+    """提交解析任务，返回 Future；异步代码可用 asyncio.wrap_future() 等待。未开启进程池时直接解析并返回已完成的 Future"""
+    pool = executor()
+    if pool is not None:
+        return pool.submit(fn, args)
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def offload(fn, *args):
+    """在解析进程中执行 fn(*args) 并等待结果（等待期间释放 GIL）；未开启进程池时直接调用"""
+    if executor() is None:
+        return fn(*args)
+    return submit(fn, *args).result()
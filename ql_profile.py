@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共性能剖析：用环境变量为各站点的 main() 开启剖析，按站点输出剖析文件并打印最热函数表
+
+QL_PROFILE 选择方式（默认关闭）：
+- cprofile：确定性剖析（cProfile），记录调用线程里每个函数的调用次数、自身耗时与累计耗时，
+  输出 <站点>-<时间>.pstats（可用 python -m pstats 或 snakeviz 查看）；
+- sample：采样剖析，后台线程每 QL_PROFILE_INTERVAL 秒记录一次所有工作线程的调用栈，开销小，
+  能看到预检、对冲请求等线程池里的耗时，以及 sleep、等锁等不占 CPU 的等待。
+两种方式都会输出 <站点>-<时间>.collapsed（折叠调用栈，可直接交给 flamegraph.pl 或 speedscope 生成火焰图），
+并在运行结束时打印前 QL_PROFILE_TOP 个最热函数。cprofile 的折叠栈由调用关系近似还原（每个函数取耗时最多的调用方）。
+文件保存在 QL_PROFILE_DIR（默认状态目录下的 profile/），只保留最新的 QL_PROFILE_FILES 个文件。
+交给 ql_parse 解析进程池的解析不在本进程内执行，剖析结果里只看到等待结果的时间。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from loguru import logger
+
+import ql_clock
+import ql_state
+
+MODE = os.getenv("QL_PROFILE", "").lower()
+TOP = int(os.getenv("QL_PROFILE_TOP", "15"))  # 运行结束时打印的最热函数数
+INTERVAL = float(os.getenv("QL_PROFILE_INTERVAL", "0.005"))  # 采样间隔（秒）
+MAX_FILES = int(os.getenv("QL_PROFILE_FILES", "50"))  # 剖析目录最多保留的文件数
+PROFILE_DIR = os.getenv("QL_PROFILE_DIR") or ql_state.path_of("profile")
+
+# 这些后台线程绝大部分时间在等队列，采样时跳过，免得等待函数挤满最热函数表
+IDLE_THREADS = ("ql-capture", "ql-parse-batch", "ql-daemon-control", "ql-profile", "loguru-writer")
+MAX_DEPTH = 128  # 单个调用栈最多记录的层数
+
+
+def mode() -> Optional[str]:
+    """当前的剖析方式：cprofile、sample 或 None（关闭）"""
+    if MODE in ("cprofile", "true", "1"):
+        return "cprofile"
+    if MODE == "sample":
+        return "sample"
+    return None
+
+
+def _label(filename: str, lineno: int, name: str) -> str:
+    if filename == "~":  # cProfile 里的内置函数
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def _output_path(site: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{site}-{ql_clock.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{suffix}")
+
+
+def _write_collapsed(site: str, stacks: Counter) -> str:
+    path = _output_path(site, ".collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, weight in stacks.most_common():
+            if weight > 0:
+                f.write(f"{stack} {weight}\n")
+    return path
+
+
+def _prune() -> None:
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith((".pstats", ".collapsed"))]
+    except OSError:
+        return
+    if len(names) <= MAX_FILES:
+        return
+    paths = sorted((os.path.join(PROFILE_DIR, n) for n in names), key=os.path.getmtime)
+    for path in paths[:len(paths) - MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class Sampler:
+    """采样剖析：后台线程定时读取各线程的当前调用栈，累计折叠栈和每个函数的自身/包含样本数"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ql-profile", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        # 采样节奏按真实时间走，与 QL_VIRTUAL_TIME 无关
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "")
+                if ident == me or name.startswith(IDLE_THREADS):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(_label(code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                # 线程池里的线程按池名合并（ql-hedge_0、ql-hedge_1 -> ql-hedge）
+                stack.append(re.sub(r"_\d+$", "", name) or "thread")
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def hot(self) -> list[tuple[str, int, int]]:
+        """[(函数, 自身样本数, 包含样本数)]，按自身样本数从多到少"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(f, n, total[f]) for f, n in own.most_common()]
+
+
+def _collapse_pstats(stats: dict) -> Counter:
+    """由 cProfile 的调用关系近似还原折叠栈：每个函数的自身耗时（微秒）挂在“耗时最多的调用方”链上"""
+    stacks: Counter = Counter()
+    for func, (_, _, tottime, _, _) in stats.items():
+        weight = int(tottime * 1_000_000)
+        if weight <= 0:
+            continue
+        chain = [func]
+        seen = {func}
+        current = func
+        while len(chain) < MAX_DEPTH:
+            callers = stats.get(current, (0, 0, 0, 0, {}))[4]
+            candidates = [c for c in callers if c in stats and c not in seen]
+            if not candidates:
+                break
+            current = max(candidates, key=lambda c: callers[c][3])
+            seen.add(current)
+            chain.append(current)
+        stacks[";".join(_label(*f) for f in reversed(chain))] += weight
+    return stacks
+
+
+def _report_table(site: str, title: str, rows: list[str]) -> None:
+    logger.info(f"[剖析] {site} {title}\n" + "\n".join(rows))
+
+
+def _run_cprofile(site: str, fn: Callable, args, kwargs):
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:  # 已有其他剖析器在运行（如外层手动开启的 cProfile）
+        logger.warning(f"[剖析] {site} 无法开启 cProfile: {e}")
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        try:
+            path = _output_path(site, ".pstats")
+            profiler.dump_stats(path)
+            stats = pstats.Stats(profiler)
+            collapsed = _write_collapsed(site, _collapse_pstats(stats.stats))
+            _prune()
+            rows = [f"{'自身(s)':>9} {'累计(s)':>9} {'调用次数':>9}  函数"]
+            hot = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP]
+            for func, (_, calls, tottime, cumtime, _) in hot:
+                rows.append(f"{tottime:>9.3f} {cumtime:>9.3f} {calls:>9}  {_label(*func)}")
+            _report_table(site, f"cProfile 共 {stats.total_tt:.2f}s，前 {len(hot)} 个最热函数（按自身耗时）：", rows)
+            logger.info(f"[剖析] {site} 已保存: {path}、{collapsed}")
+        except Exception as e:
+            logger.warning(f"[剖析] {site} 剖析结果保存失败: {e}")
+
+
+def _run_sample(site: str, fn: Callable, args, kwargs):
+    sampler = Sampler(INTERVAL)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        try:
+            collapsed = _write_collapsed(site, sampler.stacks)
+            _prune()
+            hits = max(1, sum(sampler.stacks.values()))
+            hot = sampler.hot()[:TOP]
+            rows = [f"{'自身':>7} {'包含':>7} {'样本数':>7}  函数"]
+            for func, own, total in hot:
+                rows.append(f"{own / hits * 100:>6.1f}% {total / hits * 100:>6.1f}% {own:>7}  {func}")
+            _report_table(site, f"采样 {sampler.samples} 次（{elapsed:.2f}s，间隔 {INTERVAL * 1000:.0f}ms），"
+                                f"前 {len(hot)} 个最热函数（按自身样本，占所有线程样本的比例）：", rows)
+            logger.info(f"[剖析] {site} 已保存: {collapsed}")
+        except Exception as e:
+            logger.warning(f"[剖析] {site} 剖析结果保存失败: {e}")
+
+
+def run(site: str, fn: Callable, *args, **kwargs):
+    """运行 fn（一般是站点的 main）并按 QL_PROFILE 剖析，返回 fn 的返回值；未开启剖析时直接调用
+
+    fn 抛出异常（包括 SystemExit）时照样保存剖析结果，再把异常原样抛出。
+    """
+    how = mode()
+    if how == "cprofile":
+        return _run_cprofile(site, fn, args, kwargs)
+    if how == "sample":
+        return _run_sample(site, fn, args, kwargs)
+    return fn(*args, **kwargs)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共签到结果：紧凑的单账号结果记录与流式汇总
+
+Result 只保存原始字段，通知/日志用的多行文本在真正需要输出时才生成；
+Summary 逐条累计计数、金额和耗时分布（对数分桶直方图），不保存结果列表。
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import math
+from typing import Optional
+
+from loguru import logger
+
+import ql_clock
+
+SUCCESS = "success"
+ALREADY = "already"
+FAILED = "failed"
+INVALID = "invalid"
+DEFERRED = "deferred"
+
+ICONS = {SUCCESS: "✅", ALREADY: "ℹ️", DEFERRED: "⏸️"}
+
+# 耗时直方图：1ms 起每桶放大 10%，约 170 个桶覆盖到 10 分钟
+_BUCKET_BASE = 0.001
+_BUCKET_RATIO = 1.1
+_BUCKETS = 170
+
+_last: Optional["Summary"] = None  # 最近一次输出的汇总，供常驻进程查询
+
+
+class Result:
+    """单个账号的签到结果
+
+    fields 为按顺序展示的 (标签, 值) 对，例如 (("📝 签到", msg), ("📊 信息", info))；
+    为空时 render() 直接返回 detail（用于配置错误等自带完整说明的消息）。title 为通知首行，默认“<站点>签到结果”。
+    attempts 为尝试次数：1 加上本账号期间的重试次数（ql_net.request 的请求重试与脚本自己的账号级重试）。
+    """
+
+    __slots__ = ("site", "account", "status", "amount", "latency", "attempts", "detail", "fields", "title")
+
+    def __init__(self, site: str, account: str, status: str, amount: float = 0.0, latency: float = 0.0,
+                 attempts: int = 1, detail: str = "", fields: tuple = (), title: str = "") -> None:
+        self.site = site
+        self.account = account
+        self.status = status
+        self.amount = amount
+        self.latency = latency
+        self.attempts = attempts
+        self.detail = detail
+        self.fields = fields
+        self.title = title
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (SUCCESS, ALREADY)
+
+    @property
+    def icon(self) -> str:
+        return ICONS.get(self.status, "❌")
+
+    def line(self) -> str:
+        """汇总明细用的一行"""
+        return f"{self.icon} {self.account}"
+
+    def render(self) -> str:
+        """通知正文"""
+        if not self.fields:
+            return self.detail
+        body = "\n".join(f"{label}: {value}" for label, value in self.fields)
+        if self.attempts > 1:
+            body += f"\n🔁 重试: {self.attempts - 1} 次"
+        return f"{self.title or self.site + '签到结果'}\n\n{body}\n⏰ 时间: {ql_clock.now().strftime('%m-%d %H:%M')}"
+
+    def __repr__(self) -> str:
+        return (f"Result({self.site!r}, {self.account!r}, {self.status!r}, amount={self.amount}, "
+                f"latency={self.latency:.3f}, attempts={self.attempts})")
+
+
+def last_summary() -> Optional["Summary"]:
+    """最近一次调用 Summary.log() 的汇总；还没有时返回 None"""
+    return _last
+
+
+def text(content) -> str:
+    """通知内容可以是字符串，也可以是 Result.render 之类返回字符串的函数"""
+    return content() if callable(content) else str(content)
+
+
+class Summary:
+    """流式汇总：内存占用与账号数无关
+
+    keep 为保留明细的账号数上限（汇总里逐个列出），超过后只计数。
+    """
+
+    __slots__ = ("site", "keep", "total", "counts", "amount", "attempts", "latency_max", "_buckets", "details")
+
+    def __init__(self, site: str, keep: int = 0) -> None:
+        self.site = site
+        self.keep = keep
+        self.total = 0
+        self.counts: dict[str, int] = {}
+        self.amount = 0.0
+        self.attempts = 0
+        self.latency_max = 0.0
+        self._buckets = [0] * _BUCKETS
+        self.details: list[Result] = []
+
+    def add(self, result: Result) -> Result:
+        self.total += 1
+        self.counts[result.status] = self.counts.get(result.status, 0) + 1
+        self.amount += result.amount
+        self.attempts += result.attempts
+        if result.status != DEFERRED:
+            self.latency_max = max(self.latency_max, result.latency)
+            self._buckets[self._bucket(result.latency)] += 1
+        if len(self.details) < self.keep:
+            self.details.append(result)
+        return result
+
+    @staticmethod
+    def _bucket(latency: float) -> int:
+        if latency <= _BUCKET_BASE:
+            return 0
+        return min(_BUCKETS - 1, int(math.log(latency / _BUCKET_BASE, _BUCKET_RATIO)) + 1)
+
+    def count(self, *statuses: str) -> int:
+        return sum(self.counts.get(status, 0) for status in statuses)
+
+    @property
+    def ok(self) -> int:
+        return self.count(SUCCESS, ALREADY)
+
+    @property
+    def deferred(self) -> int:
+        return self.count(DEFERRED)
+
+    @property
+    def failed(self) -> int:
+        return self.total - self.ok - self.deferred
+
+    def percentile(self, q: float) -> Optional[float]:
+        """耗时分位数（秒，取所在桶的上界，误差不超过 10%）；没有数据时返回 None"""
+        n = sum(self._buckets)
+        if not n:
+            return None
+        rank = max(1, math.ceil(q / 100 * n))
+        seen = 0
+        for i, c in enumerate(self._buckets):
+            seen += c
+            if seen >= rank:
+                return min(self.latency_max, _BUCKET_BASE * _BUCKET_RATIO ** i)
+        return self.latency_max
+
+    def as_dict(self) -> dict:
+        """汇总计数的字典形式（用于状态查询和保存）"""
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {"site": self.site, "total": self.total, "ok": self.ok, "failed": self.failed,
+                "deferred": self.deferred, "amount": self.amount, "retries": self.attempts - self.total,
+                "p50": round(p50, 3) if p50 is not None else None,
+                "p95": round(p95, 3) if p95 is not None else None}
+
+    def log(self) -> None:
+        global _last
+        _last = self
+        p50, p95 = self.percentile(50), self.percentile(95)
+        latency = f"，耗时 p50 {p50:.2f}秒 / p95 {p95:.2f}秒" if p50 is not None else ""
+        retries = f"，重试 {self.attempts - self.total} 次" if self.attempts > self.total else ""
+        logger.info(f"{self.site} 汇总: 成功 {self.ok} / 失败 {self.failed} / 延后 {self.deferred}"
+                    f"（共 {self.total}）{latency}{retries}")
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共会话模块：连接预热、多账号共享连接池、响应压缩协商、常驻进程的会话保留、可选的 HTTP/2 传输
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import asyncio
+import importlib
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+import ql_cassette
+import ql_dns
+
+# 留空按本机可用的解码器自动协商；可设为 gzip / identity 等固定值用于对比
+ACCEPT_ENCODING = os.getenv("QL_ACCEPT_ENCODING", "")
+RESIDENT_MAX = 64  # 常驻进程最多保留多少个会话/连接池，超出的按普通运行处理（用完即关）
+# 逐跳请求头在 HTTP/2 中不允许出现，转交 httpx 前去掉
+_HOP_BY_HOP = frozenset({"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"})
+
+# 常驻进程（ql_daemon）里跨运行保留的会话与连接池；普通运行为 None
+_resident: Optional[dict] = None
+_resident_lock = threading.Lock()
+
+
+def accept_encoding() -> str:
+    """按 urllib3 可流式解码的格式协商压缩：zstd、br 优先，gzip/deflate 兜底
+
+    zstd 需要 backports.zstd（Python 3.14 起内置），br 需要 brotli 或 brotlicffi。
+    """
+    if ACCEPT_ENCODING:
+        return ACCEPT_ENCODING
+    from urllib3.util.request import ACCEPT_ENCODING as supported
+
+    preferred = [enc for enc in ("zstd", "br") if enc in supported.split(",")]
+    return ", ".join(preferred + ["gzip", "deflate"])
+
+
+def configure(session):
+    """对脚本新建的会话统一应用公共设置，返回原会话
+
+    curl_cffi 会话由 libcurl 按浏览器指纹协商并解码 br/zstd，手动设置 Accept-Encoding 反而会关闭自动解码，
+    因此压缩协商只处理 requests 系会话（含 cloudscraper）。域名解析走共享的 DNS 缓存（见 ql_dns）。
+    开启录制/回放时在最外层挂上磁带。
+    """
+    if hasattr(session, "get_adapter"):
+        session.headers["Accept-Encoding"] = accept_encoding()
+    return ql_cassette.install(ql_dns.attach(session))
+
+
+def keep_resident() -> None:
+    """进入常驻模式：之后 lease() 取得的对象在 release() 时不关闭，下一轮运行直接复用"""
+    global _resident
+    with _resident_lock:
+        if _resident is None:
+            _resident = {}
+
+
+def lease(key: str, factory):
+    """取得按 key 标识的会话或连接池
+
+    常驻模式下复用上一轮留下的对象（热连接、Cookie 罐、Cloudflare 放行 Cookie 都还在），
+    普通运行每次调用 factory 新建。key 应能区分账号，避免不同账号共用 Cookie 罐。
+    """
+    with _resident_lock:
+        if _resident is None:
+            return factory()
+        obj = _resident.get(key)
+        if obj is not None:
+            return obj
+        obj = factory()
+        if len(_resident) < RESIDENT_MAX:
+            _resident[key] = obj
+        return obj
+
+
+def release(obj) -> None:
+    """用完后调用：常驻模式下保留 lease() 登记的对象，其余直接关闭"""
+    with _resident_lock:
+        if _resident is not None and any(obj is kept for kept in _resident.values()):
+            return
+    obj.close()
+
+
+def close_resident() -> None:
+    """常驻进程退出时关闭所有保留的对象"""
+    global _resident
+    with _resident_lock:
+        kept, _resident = _resident or {}, None
+    for obj in kept.values():
+        try:
+            obj.close()
+        except Exception as e:
+            logger.debug(f"关闭常驻会话失败: {e}")
+
+
+def _new_requests_adapter(pool_maxsize: int = 4):
+    from requests.adapters import HTTPAdapter
+
+    class _SharedAdapter(HTTPAdapter):
+        """账号会话关闭时不清空共享连接池，由 SharedPool.close() 统一释放"""
+
+        def close(self) -> None:
+            pass
+
+        def release(self) -> None:
+            super().close()
+
+    return _SharedAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+
+
+class SharedPool:
+    """多个账号共用一组 keep-alive 连接
+
+    每个账号仍拿到独立的 requests.Session（Cookie 罐、请求头互不影响），只是挂载同一个传输适配器，
+    因此同一主机的 TCP+TLS 连接在账号之间复用。
+    """
+
+    def __init__(self, pool_maxsize: int = 4) -> None:
+        self.adapter = _new_requests_adapter(pool_maxsize)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def session(self):
+        import requests
+
+        s = requests.Session()
+        s.mount("https://", self.adapter)
+        s.mount("http://", self.adapter)
+        configure(s)
+        s.hooks["response"].append(self._count)
+        return s
+
+    def _count(self, resp, *args, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return resp
+
+    @property
+    def connections(self) -> int:
+        """实际新建的连接数（含预热连接）"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    @property
+    def handshakes_saved(self) -> int:
+        return max(0, self.requests - self.connections)
+
+    def report(self, site: str) -> None:
+        logger.info(f"{site} 连接复用: {self.requests} 个请求共新建 {self.connections} 个连接，"
+                    f"节省 {self.handshakes_saved} 次握手")
+
+    def close(self) -> None:
+        self.adapter.release()
+
+    def __enter__(self) -> "SharedPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def http2_available() -> bool:
+    """HTTP/2 传输需要可选依赖 httpx[http2]（httpx + h2）"""
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _new_http2_adapter(pool_maxsize: int):
+    import httpx
+    import requests
+    from requests.adapters import BaseAdapter, HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers, select_proxy
+
+    try:
+        from httpx._decoders import SUPPORTED_DECODERS
+        decoders = frozenset(SUPPORTED_DECODERS)
+    except ImportError:
+        decoders = frozenset({"gzip", "deflate", "identity"})
+
+    class Http2Adapter(BaseAdapter):
+        """用 httpx 发送请求的 requests 传输适配器：同一主机的并发请求在一个 HTTP/2 连接上多路复用
+
+        请求都交给适配器自己的事件循环线程，由 httpx.AsyncClient 发出：httpx 的同步客户端在多线程共用一个 HTTP/2 连接时
+        分配流 ID 与发送请求头不是原子的，并发请求可能乱序发出流 ID 被服务器断开，事件循环里没有这个问题。
+        服务器在 TLS 协商（ALPN）时不支持 h2 的，该主机之后的请求改走普通的 requests 连接池（每个主机最多 pool_maxsize 个连接）；
+        连接出现 HTTP/2 协议错误后，所有请求都改走 requests 连接池。走代理或带客户端证书的请求也交给 requests 处理。
+        """
+
+        multiplexed = True  # 没有按连接预热的接口，预热只做域名解析
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.fallback = HTTPAdapter(pool_maxsize=pool_maxsize)
+            self.clients: dict = {}
+            self.broken = False
+            self.http1_hosts: set = set()  # 协商为 HTTP/1.1 的主机
+            self.requests = 0
+            self.http2 = 0
+            self._loop = None
+            self._lock = threading.Lock()
+
+        def _event_loop(self):
+            with self._lock:
+                if self._loop is None:
+                    self._loop = asyncio.new_event_loop()
+                    threading.Thread(target=self._loop.run_forever, name="ql-http2", daemon=True).start()
+                return self._loop
+
+        def _client(self, verify):
+            """在事件循环线程内调用"""
+            key = verify if isinstance(verify, str) else bool(verify)
+            client = self.clients.get(key)
+            if client is None:
+                # HTTP/2 时同一主机只建一个连接；上限只在协商为 HTTP/1.1 时起作用
+                limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+                # requests 的 verify 可以是 CA 证书文件或目录，httpx 需要 SSLContext
+                context = ssl.create_default_context(**{"capath" if os.path.isdir(key) else "cafile": key}) \
+                    if isinstance(key, str) else key
+                # 代理与环境变量已由 requests 处理，这里不再读取
+                client = self.clients[key] = httpx.AsyncClient(http2=True, verify=context, limits=limits,
+                                                               trust_env=False, follow_redirects=False)
+            return client
+
+        async def _request(self, verify, method: str, url: str, headers: dict, body, timeout):
+            return await self._client(verify).request(method, url, headers=headers, content=body, timeout=timeout)
+
+        @staticmethod
+        def _headers(request) -> dict:
+            headers = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_BY_HOP}
+            for key in [k for k in headers if k.lower() == "accept-encoding"]:
+                # 只声明 httpx 能解码的压缩格式（其解码器与 urllib3 的可选依赖不完全相同）
+                accepted = [enc.strip() for enc in headers[key].split(",") if enc.strip() in decoders]
+                headers[key] = ", ".join(accepted) or "identity"
+            return headers
+
+        @staticmethod
+        def _timeout(timeout):
+            if isinstance(timeout, tuple):
+                connect, read = timeout
+                return httpx.Timeout(read, connect=connect)
+            return httpx.Timeout(timeout)
+
+        def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+            host = urlsplit(request.url).netloc
+            if self.broken or host in self.http1_hosts or cert or select_proxy(request.url, proxies or {}):
+                return self.fallback.send(request, stream=stream, timeout=timeout, verify=verify,
+                                          cert=cert, proxies=proxies)
+            job = self._request(verify, request.method, request.url, self._headers(request), request.body,
+                                self._timeout(timeout))
+            try:
+                resp = asyncio.run_coroutine_threadsafe(job, self._event_loop()).result()
+            except httpx.ConnectTimeout as e:
+                raise requests.exceptions.ConnectTimeout(e, request=request)
+            except httpx.TimeoutException as e:
+                raise requests.exceptions.ReadTimeout(e, request=request)
+            except httpx.ProtocolError as e:
+                if not self.broken:
+                    self.broken = True
+                    logger.warning(f"HTTP/2 连接出错，之后的请求改用 HTTP/1.1: {e}")
+                raise requests.exceptions.ConnectionError(e, request=request)
+            except httpx.TransportError as e:
+                raise requests.exceptions.ConnectionError(e, request=request)
+            with self._lock:
+                self.requests += 1
+                if resp.http_version == "HTTP/2":
+                    self.http2 += 1
+                elif host not in self.http1_hosts:
+                    self.http1_hosts.add(host)
+                    logger.info(f"{host} 未协商 HTTP/2，之后的请求改用 HTTP/1.1 连接池")
+            return self._build(request, resp)
+
+        def _build(self, request, resp):
+            response = requests.Response()
+            response.status_code = resp.status_code
+            response.headers = CaseInsensitiveDict(resp.headers)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.reason = resp.reason_phrase
+            response.url = request.url
+            response.request = request
+            response.connection = self
+            # httpx 已读完并解压正文，直接交给 Response，stream=True 时也从内存里迭代
+            response._content = resp.content
+            response._content_consumed = True
+            response.http_version = resp.http_version
+            return response
+
+        def build_response(self, req, resp):
+            """由 urllib3 响应构造 Response（录制/回放的磁带用）"""
+            return self.fallback.build_response(req, resp)
+
+        async def _close_clients(self) -> None:
+            clients, self.clients = list(self.clients.values()), {}
+            for client in clients:
+                await client.aclose()
+
+        def close(self) -> None:
+            with self._lock:
+                loop, self._loop = self._loop, None
+            if loop is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._close_clients(), loop).result(5)
+                except Exception as e:
+                    logger.debug(f"关闭 HTTP/2 连接失败: {e}")
+                loop.call_soon_threadsafe(loop.stop)
+            self.fallback.close()
+            if self.http2:
+                logger.info(f"HTTP/2: {self.http2} 个请求经 HTTP/2 多路复用")
+
+    return Http2Adapter()
+
+
+def mount_http2(session, pool_maxsize: int = 10) -> bool:
+    """让 requests 会话的 https 请求走 HTTP/2，须在 configure() 之前调用
+
+    pool_maxsize 为服务器不支持 HTTP/2 时每个主机最多的 HTTP/1.1 连接数（与 requests 默认值相同）。
+    未安装 httpx[http2] 时保持 HTTP/1.1 并返回 False。
+    """
+    if not http2_available():
+        logger.info("未安装 httpx[http2]，继续使用 HTTP/1.1")
+        return False
+    session.mount("https://", _new_http2_adapter(pool_maxsize))
+    return True
+
+
+def _open_pooled_connection(session, url: str, verify) -> None:
+    """在 requests 系会话的连接池里建立一条已完成 TCP+TLS 握手的空闲连接"""
+    import requests
+
+    req = requests.Request("GET", url).prepare()
+    adapter = session.get_adapter(url)
+    # 与 Session.request 相同的方式合并环境变量（代理、CA 证书），否则会落到另一个连接池
+    settings = session.merge_environment_settings(url, {}, None, verify, None)
+    if hasattr(adapter, "get_connection_with_tls_context"):
+        # requests>=2.32 按 verify/cert 区分连接池，必须与真实请求使用相同参数
+        pool = adapter.get_connection_with_tls_context(
+            req, settings["verify"], proxies=settings["proxies"], cert=settings["cert"])
+    else:
+        pool = adapter.get_connection(url, settings["proxies"])
+    conn = pool._get_conn()
+    if getattr(conn, "sock", None) is not None:
+        pool._put_conn(conn)  # 同一连接池已有热连接
+        return
+    try:
+        conn.connect()
+    except Exception:
+        conn.close()
+        raise
+    pool._put_conn(conn)
+
+
+class Prewarm(threading.Thread):
+    """后台预热：解析域名、建立连接池连接、导入延迟加载的解析器
+
+    在脚本的随机延迟期间运行，延迟结束后调用 wait()，首个真实请求即可复用热连接。
+    targets 的元素可以是 URL，也可以是 (URL, verify) 元组（requests 按 verify 分池）。
+    """
+
+    def __init__(self, session, targets, modules=(), request_kwargs=None) -> None:
+        super().__init__(name="ql-prewarm", daemon=True)
+        self.session = session
+        self.targets = [t if isinstance(t, tuple) else (t, True) for t in targets]
+        self.modules = modules
+        self.request_kwargs = request_kwargs or {}
+        self.warmed = 0
+        self.elapsed = 0.0
+
+    def _warm(self, url: str, verify) -> None:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        if hasattr(self.session, "get_adapter"):
+            if getattr(self.session.get_adapter(url), "multiplexed", False):
+                return  # HTTP/2 连接在首个请求时建立
+            _open_pooled_connection(self.session, url, verify)
+        else:
+            # curl_cffi 等没有连接池接口的会话，用一个 HEAD 请求建立并缓存连接
+            self.session.request("HEAD", url, verify=verify, timeout=10, **self.request_kwargs)
+
+    def run(self) -> None:
+        if ql_cassette.MODE == "replay":
+            return  # 回放不联网
+        started = time.monotonic()
+        for name in self.modules:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.debug(f"预热导入 {name} 失败: {e}")
+        for url, verify in self.targets:
+            try:
+                self._warm(url, verify)
+                self.warmed += 1
+            except Exception as e:
+                logger.debug(f"预热 {url} 失败，首个请求将重新建连: {e}")
+        self.elapsed = time.monotonic() - started
+
+    def wait(self, timeout: float = 5.0) -> None:
+        """等待预热结束（超时不影响后续请求，只是连接可能仍是冷的）"""
+        self.join(timeout)
+        if self.is_alive():
+            logger.debug("预热未在延迟内完成，继续执行")
+        elif self.warmed:
+            logger.info(f"连接预热完成: {self.warmed}/{len(self.targets)} 个目标，用时 {self.elapsed:.2f}秒")
+
+
+def prewarm(session, targets, modules=(), request_kwargs=None) -> Prewarm:
+    """启动后台预热并返回句柄"""
+    warm = Prewarm(session, targets, modules, request_kwargs)
+    warm.start()
+    return warm
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+青龙脚本公共状态存储：跨运行保存的小型 JSON 数据（限速、缓存索引等）
+
+本文件不含 cron 头，在青龙中请作为依赖文件与各签到脚本放在同一目录。
+"""
+
+import json
+import os
+import threading
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，update() 只在进程内互斥
+    fcntl = None
+
+STATE_DIR = os.getenv("QL_STATE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ql_state")
+
+_lock = threading.Lock()
+_update_lock = threading.Lock()
+
+
+def path_of(name: str) -> str:
+    return os.path.join(STATE_DIR, name)
+
+
+def load(name: str, default=None):
+    """读取状态文件，不存在或损坏时返回 default"""
+    try:
+        with open(path_of(f"{name}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        logger.warning(f"状态文件 {name} 读取失败，忽略: {e}")
+        return default
+
+
+def save(name: str, data) -> None:
+    """原子写入状态文件（先写临时文件再替换）"""
+    with _lock:
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            target = path_of(f"{name}.json")
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, target)
+        except Exception as e:
+            logger.warning(f"状态文件 {name} 保存失败: {e}")
+
+
+def update(name: str, merge, default=None):
+    """在文件锁内读取、合并并保存状态，返回保存的内容
+
+    merge(当前内容) 返回要保存的新内容。同时运行的多个进程（如分片任务）依次读改写，不会互相覆盖。
+    """
+    with _update_lock:
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            handle = open(path_of(f"{name}.lock"), "a")
+        except OSError as e:
+            logger.debug(f"状态文件 {name} 加锁失败，不加锁保存: {e}")
+            data = merge(load(name, default))
+            save(name, data)
+            return data
+        with handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)  # 关闭文件时释放
+            data = merge(load(name, default))
+            save(name, data)
+            return data
@@ -6,15 +6,23 @@ new Env('雨云签到')
 """
 
 import os
-import time
 import random
 import json
-from datetime import datetime
 from typing import Dict, Any, Optional
 
 import requests
 from loguru import logger
 
+import ql_cache
+import ql_clock
+import ql_log
+import ql_net
+import ql_parse
+import ql_profile
+import ql_proxy
+import ql_result
+import ql_session
+
 # ---------------- 通知模块动态加载 ----------------
 hadsend = False
 send = None
@@ -27,6 +35,24 @@ except ImportError:
 
 # ---------------- 配置项 ----------------
 RAINYUN_API_KEY = os.environ.get('RAINYUN_API_KEY')
+API_BASE = "https://api.v2.rainyun.com"
+# CSRF 令牌缓存时间（秒）：一次签到要用三次，常驻进程里临时触发的运行也能直接复用，0 表示每次重新获取
+CSRF_TTL = float(os.environ.get('RAINYUN_CSRF_TTL', '300'))
+# 令牌失效时接口返回的状态码，遇到后丢弃缓存
+CSRF_REJECTED = frozenset({401, 403, 419})
+# 所有接口都在同一个 API 主机上：开启后请求（含对冲补发）在一个 HTTP/2 连接上多路复用，需安装 httpx[http2]
+HTTP2 = os.environ.get('RAINYUN_HTTP2', 'false').lower() == 'true'
+
+
+def new_session() -> requests.Session:
+    session = requests.Session()
+    if HTTP2:
+        ql_session.mount_http2(session)
+    return ql_session.configure(session)
+
+
+# 所有接口共用一个会话，复用到 API 主机的 keep-alive 连接（常驻进程里跨运行保留）
+SESSION = ql_session.lease("rainyun", new_session)
 
 # 公共请求头
 COMMON_HEADERS = {
@@ -92,20 +118,43 @@ config = Config()
 # 合并配置中的headers，就像原始仓库一样
 COMMON_HEADERS = COMMON_HEADERS | config.get('headers', {})
 
-# 获取CSRF token的函数
+_csrf_cache = {"token": None, "expires": 0.0}
+
+
+def forget_csrf_token(response) -> None:
+    """接口拒绝令牌时丢弃缓存，下次重新获取"""
+    if response.status_code in CSRF_REJECTED:
+        _csrf_cache["token"] = None
+
+
+# 获取CSRF token的函数：返回 (令牌, cookies, HTTP 状态码)，网络错误或使用缓存时状态码为 None
 def get_csrf_token():
     cookies = config.load_cookies_auth()
-    url = "https://api.v2.rainyun.com/user/csrf"
+    if _csrf_cache["token"] and ql_clock.monotonic() < _csrf_cache["expires"]:
+        return _csrf_cache["token"], cookies, None
+    url = f"{API_BASE}/user/csrf"
 
     try:
-        response = requests.get(url, headers=config.load_header_auth(COMMON_HEADERS), cookies=cookies, timeout=10)
+        response = ql_net.request(SESSION, "GET", url, headers=config.load_header_auth(COMMON_HEADERS), cookies=cookies, timeout=10,
+                                   hedge=True)
         cookies = config.update_cookies_from_response(response, cookies)
 
         if response.status_code == 200:
-            return response.json().get('data'), cookies
-        return None, cookies
-    except requests.exceptions.RequestException:
-        return None, cookies
+            token = ql_parse.loads(response).get('data')
+            if token and CSRF_TTL > 0:
+                _csrf_cache.update(token=token, expires=ql_clock.monotonic() + CSRF_TTL)
+            return token, cookies, response.status_code
+        return None, cookies, response.status_code
+    except (requests.exceptions.RequestException, ql_net.DeferredError):
+        return None, cookies, None
+
+
+def csrf_error(status) -> dict:
+    """获取令牌失败时的错误信息；接口有应答时带上状态码，便于区分密钥失效与网络问题"""
+    error = {'error': '无法获取 CSRF 令牌。可能已经退出登录。'}
+    if status is not None:
+        error['code'] = status
+    return error
 
 
 def check_in(data):
@@ -121,9 +170,9 @@ def check_in(data):
         }
 
     # 获取CSRF token并更新cookies
-    csrf_token, cookies = get_csrf_token()
+    csrf_token, cookies, status = get_csrf_token()
     if csrf_token is None:
-        return {'error': '无法获取 CSRF 令牌。可能已经退出登录。'}
+        return csrf_error(status)
 
     # 准备请求头
     headers = config.load_header_auth(COMMON_HEADERS)
@@ -134,8 +183,9 @@ def check_in(data):
 
     try:
         # 转发请求到目标API
-        response = requests.post(
-            "https://api.v2.rainyun.com/user/reward/tasks",
+        response = ql_net.request(
+            SESSION, "POST",
+            f"{API_BASE}/user/reward/tasks",
             headers=headers,
             cookies=cookies,
             json=data,
@@ -144,18 +194,19 @@ def check_in(data):
 
         # 更新cookie
         config.update_cookies_from_response(response, cookies)
+        forget_csrf_token(response)
 
         # 返回API的响应
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return ql_parse.loads(response)
+    except (requests.exceptions.RequestException, ql_net.DeferredError) as e:
         return {'error': str(e)}
 
 
 def get_check_in_status():
     # 获取CSRF token并更新cookies
-    csrf_token, cookies = get_csrf_token()
+    csrf_token, cookies, status = get_csrf_token()
     if csrf_token is None:
-        return {'error': '无法获取 CSRF 令牌。可能已经退出登录。'}
+        return csrf_error(status)
 
     # 准备请求头
     headers = config.load_header_auth(COMMON_HEADERS)
@@ -165,33 +216,37 @@ def get_check_in_status():
 
     try:
         # 获取任务列表
-        response = requests.get(
-            "https://api.v2.rainyun.com/user/reward/tasks",
+        response = ql_cache.get(
+            SESSION,
+            f"{API_BASE}/user/reward/tasks",
+            account=RAINYUN_API_KEY or "",
             headers=headers,
             cookies=cookies,
-            timeout=10
+            timeout=10,
+            hedge=True
         )
 
         # 更新cookie
         config.update_cookies_from_response(response, cookies)
+        forget_csrf_token(response)
 
         if response.status_code == 200:
-            data = response.json()
+            data = ql_parse.loads(response)
             tasks = data.get('data', [])
             for task in tasks:
                 if task.get('Name') == '每日签到' and task.get('Status') == 2:
                     return {'check_in': True}
             return {'check_in': False}
         return {'error': 'Failed to get tasks', 'code': response.status_code}
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ql_net.DeferredError) as e:
         return {'error': str(e)}
 
 
 def get_user_info():
     """获取用户信息"""
-    csrf_token, cookies = get_csrf_token()
+    csrf_token, cookies, status = get_csrf_token()
     if csrf_token is None:
-        return {'error': '无法获取 CSRF 令牌。可能已经退出登录。'}
+        return csrf_error(status)
 
     headers = config.load_header_auth(COMMON_HEADERS)
     headers.update({
@@ -199,19 +254,23 @@ def get_user_info():
     })
 
     try:
-        response = requests.get(
-            "https://api.v2.rainyun.com/user",
+        response = ql_cache.get(
+            SESSION,
+            f"{API_BASE}/user",
+            account=RAINYUN_API_KEY or "",
             headers=headers,
             cookies=cookies,
-            timeout=10
+            timeout=10,
+            hedge=True
         )
 
         config.update_cookies_from_response(response, cookies)
+        forget_csrf_token(response)
 
         if response.status_code == 200:
-            return response.json()
+            return ql_parse.loads(response)
         return {'error': 'Failed to get user info', 'code': response.status_code}
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ql_net.DeferredError) as e:
         return {'error': str(e)}
 
 
@@ -221,14 +280,15 @@ class RainyunSigner:
     def __init__(self, index: int = 1) -> None:
         self.index = index
 
-    def check_auth_status(self) -> bool:
-        """检查认证状态"""
+    def check_auth_status(self) -> Optional[bool]:
+        """检查认证状态：通过为 True，接口拒绝密钥为 False，超时、网络错误等无法判断时为 None"""
         try:
             logger.info("检查认证状态...")
             user_info = get_user_info()
             if 'error' in user_info:
                 logger.warning(f"认证失败: {user_info['error']}")
-                return False
+                # 接口（含获取 CSRF 令牌）以 401/403/419 拒绝时才是密钥失效，其余错误（超时、连接失败、5xx）不判定
+                return False if user_info.get('code') in CSRF_REJECTED else None
 
             if user_info.get('code') == 200:
                 logger.info("认证成功")
@@ -238,7 +298,7 @@ class RainyunSigner:
                 return False
         except Exception as e:
             logger.error(f"检查认证状态失败: {e}")
-            return False
+            return None
 
     def get_checkin_status(self) -> tuple[bool, str]:
         """获取签到状态"""
@@ -302,13 +362,18 @@ class RainyunSigner:
         except Exception as e:
             return False, f"获取积分信息时出现异常: {e}"
 
-    def main(self) -> tuple[str, bool]:
+    def main(self) -> ql_result.Result:
         """主执行函数"""
-        logger.info(f"==== 雨云账号{self.index} 开始签到 ====")
+        ql_log.verbose("==== 雨云账号{} 开始签到 ====", self.index)
+        account = f"账号{self.index}"
+        started = ql_clock.monotonic()
+        retries = ql_net.retries()
         
-        # 检查认证状态
-        if not self.check_auth_status():
-            return "认证失败", False
+        # 检查认证状态：只有接口明确拒绝时记为凭据失效，网络问题记为失败
+        auth = self.check_auth_status()
+        if not auth:
+            return ql_result.Result("雨云", account, ql_result.INVALID if auth is False else ql_result.FAILED,
+                                    latency=ql_clock.monotonic() - started, attempts=1 + ql_net.retries() - retries, detail="认证失败")
         
         # 执行签到
         sign_success, sign_message = self.sign_in()
@@ -316,36 +381,36 @@ class RainyunSigner:
         # 获取积分信息
         points_success, points_message = self.get_points()
 
-        # 构建最终消息
-        final_msg = f"""雨云签到结果
-📝 签到: {sign_message}
-📊 积分: {points_message}
-⏰ 时间: {datetime.now().strftime('%m-%d %H:%M')}"""
-        
+        # 结果消息在发送通知时才生成
+        if not sign_success:
+            status = ql_result.FAILED
+        else:
+            status = ql_result.ALREADY if "已签到" in sign_message else ql_result.SUCCESS
         logger.info(f"{'任务完成' if sign_success else '任务失败'}")
-        return final_msg, sign_success
+        return ql_result.Result("雨云", account, status, latency=ql_clock.monotonic() - started,
+                                attempts=1 + ql_net.retries() - retries, detail=sign_message, fields=(("📝 签到", sign_message), ("📊 积分", points_message)))
 
 
 def wait_with_countdown(delay_seconds, task_name):
     """带倒计时的等待函数"""
     logger.info(f"{task_name} 需要等待 {delay_seconds}秒")
-    time.sleep(delay_seconds)
+    ql_clock.sleep(delay_seconds, "启动延迟")
 
 
 def notify_user(title, content):
-    """统一通知函数"""
+    """统一通知函数；content 可以是返回正文的函数，只在确实要输出时才生成"""
     if hadsend:
         try:
-            send(title, content)
+            send(title, ql_result.text(content))
             logger.info(f"通知发送完成: {title}")
         except Exception as e:
             logger.error(f"通知发送失败: {e}")
     else:
-        logger.info(f"{title}\n{content}")
+        logger.opt(lazy=True).info("{}\n{}", lambda: title, lambda: ql_result.text(content))
 
 def main():
     """主函数"""
-    logger.info("==== 雨云签到开始 - {} ====".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    logger.info("==== 雨云签到开始 - {} ====".format(ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')))
     
     # 检查认证配置
     if not RAINYUN_API_KEY:
@@ -360,38 +425,41 @@ API密钥：登录雨云 → 总览 → 用户 → 账户设置 → API密钥
         notify_user("雨云签到失败", error_msg)
         return
     
+    # 配置了代理池时固定走该密钥对应的代理；利用随机延迟的空档预热到 API 主机的连接
+    ql_proxy.bind(SESSION, RAINYUN_API_KEY)
+    warm = ql_session.prewarm(SESSION, [f"{API_BASE}/user/csrf"])
+
     # 随机延迟
     delay = random.randint(1, 5)
     logger.info(f"随机延迟: {delay}秒")
     wait_with_countdown(delay, "雨云签到")
+    warm.wait()
     
     logger.info("开始执行雨云签到")
     
-    success_count = 0
     total_count = 1  # API方式只支持单个账号
-    results = []
+    summary = ql_result.Summary("雨云")
     
     try:
         # 执行签到
         signer = RainyunSigner(1)  # API方式不需要用户名密码
-        result_msg, is_success = signer.main()
-        
-        if is_success:
-            success_count += 1
-        
-        results.append({'index': 1, 'success': is_success, 'message': result_msg})
+        result = summary.add(signer.main())
         
-        status = "成功" if is_success else "失败"
+        status = "成功" if result.ok else "失败"
         title = f"雨云签到{status}"
-        notify_user(title, result_msg)
+        notify_user(title, result.render)
             
     except Exception as e:
         error_msg = f"执行异常 - {str(e)}"
         logger.error(error_msg)
+        summary.add(ql_result.Result("雨云", "账号1", ql_result.FAILED, detail=error_msg))
         notify_user("雨云签到失败", error_msg)
     
-    logger.info(f"==== 雨云签到完成 - 成功{success_count}/{total_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
+    ql_session.release(SESSION)
+    summary.log()
+    logger.info(f"==== 雨云签到完成 - 成功{summary.ok}/{total_count} - {ql_clock.now().strftime('%Y-%m-%d %H:%M:%S')} ====")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ql_log.setup()
+    ql_profile.run("rainyun", main)
\ No newline at end of file